@@ -1,4 +1,4 @@
-from spectran.api import API_Connection
+from spectran.client import API_Connection
 from spectran import ureg
 import logging
 logging.basicConfig(
@@ -46,4 +46,9 @@ if __name__ == "__main__":
         # save the measured data to a file
         # api.save_file(f"data_{i}.txt")
     
-    
\ No newline at end of file
+    # the same as a sweep, which runs on the server without round trips
+    # and saves each step while the next one is measured
+    sweep_id = api.sweep([dict(sample_rate=500_000*i * ureg.Hz) for i in range(1, 8)],
+                         directory="data", file_name="data_{step}.h5")
+    summary = api.wait_for_sweep(sweep_id)
+    print([result["file_path"] for result in summary["results"]])
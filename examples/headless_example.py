@@ -0,0 +1,33 @@
+"""Runs a measurement without the GUI and saves the data."""
+import logging
+
+from spectran import ureg
+from spectran.daq import DummyDAQ
+from spectran.data_handler import SAVING_MODES
+from spectran.engine import MeasurementEngine
+from spectran.settings import DEFAULT_VALUES
+
+logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s  %(levelname)-10s %(name)s: %(message)s",
+)
+
+CONFIG = DEFAULT_VALUES.copy()
+CONFIG.update({
+    "input_channel": "ai1",
+    "sample_rate": 50_000 * ureg.Hz,
+    "duration": 0.05 * ureg.second,
+    "averages": 4,
+    "signal_range_min": -3 * ureg.volt, 
+    "signal_range_max":  3 * ureg.volt,
+})
+
+if __name__ == "__main__":
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+
+    engine = MeasurementEngine()
+    engine.subscribe("status", print)
+    engine.run(driver, CONFIG)
+    
+    engine.data_handler.save_file("data.h5", mode=SAVING_MODES.HDF5)
@@ -3,18 +3,67 @@ spectran_path = Path(__file__).parent
 
 # Logger
 import logging
+import threading
 log = logging.getLogger(__name__)
 
-# Units
-from pint import UnitRegistry
-ureg = UnitRegistry()
-
-# Versions
+# Versions, _version.py is generated by setuptools_scm and not tracked
 try:
     from ._version import version as __version__
     from ._version import version_tuple
 except ImportError:
-    __version__ = "unknown version"
-    version_tuple = (0, 0, "unknown version")
+    from importlib.metadata import version, PackageNotFoundError
+    try:
+        __version__ = version(__name__)
+        version_tuple = tuple(int(part) if part.isdigit() else part 
+                              for part in __version__.replace("+", ".").split("."))
+    except PackageNotFoundError:
+        __version__ = "unknown version"
+        version_tuple = (0, 0, "unknown version")
+    del version, PackageNotFoundError
+
+
+class LazyUnitRegistry():
+    """Stands in for the pint UnitRegistry, which is created when one of its attributes 
+    is used first, so that modules can import ureg without importing pint. 
+    The GUI creates it in the background with preload during the startup,
+    attributes that are used meanwhile wait for it."""
+
+    def __init__(self) -> None:
+        self._registry = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        with self._lock:
+            if self._registry is None:
+                # Units, the parsed definitions are cached in the user cache directory
+                from pint import UnitRegistry
+                try:
+                    self._registry = UnitRegistry(cache_folder=":auto:")
+                except Exception:
+                    log.exception("Loading the cached unit definitions failed")
+                    self._registry = UnitRegistry()
+            return self._registry
+
+    def preload(self) -> threading.Thread:
+        """Creates the registry in a background thread."""
+        thread = threading.Thread(target=self._get, name="unit registry", daemon=True)
+        thread.start()
+        return thread
+
+    def __getattr__(self, name:str):
+        return getattr(self._get(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._get()(*args, **kwargs)
+
+
+ureg = LazyUnitRegistry()
+
 
-from .app import run
\ No newline at end of file
+def __getattr__(name:str):
+    """Imports the GUI only when it is used first (PEP 562),
+    so that e.g. spectran.client can be imported without it."""
+    if name == "run":
+        from .app import run
+        return run
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
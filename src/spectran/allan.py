@@ -0,0 +1,120 @@
+"""This module contains the overlapping and modified Allan deviation (ADEV, MDEV)
+of the records, which characterize the stability of a sensor over averaging times tau.
+
+The records are treated as frequency data y sampled at the sample rate. For each
+record, the phase x = cumsum(y) / sample_rate is calculated once and the sums of the
+squared second differences x[i+2m] - 2 x[i+m] + x[i] are accumulated for log-spaced
+averaging factors m in O(samples) per factor. As the records are not contiguous,
+the sums are accumulated over the records, which is equivalent to estimating the
+deviations from all records with the same weight per difference.
+"""
+
+import numpy as np
+
+
+def averaging_factors(samples:int, points_per_decade:int=10) -> np.ndarray:
+    """Log-spaced averaging factors m from 1 to samples // 4."""
+    m_max = max(samples // 4, 1)
+    points = int(np.log10(m_max) * points_per_decade) + 1
+    return np.unique(np.round(np.logspace(0, np.log10(m_max), points)).astype(int))
+
+
+class AllanDeviation():
+    """Overlapping Allan deviation and modified Allan deviation accumulated over records.
+
+    Args:
+        sample_rate (float): sample rate of the records in Hz
+        samples (int): number of samples per record
+        points_per_decade (int, optional): averaging times per decade. Defaults to 10.
+    """
+
+    def __init__(self, sample_rate:float, samples:int, points_per_decade:int=10) -> None:
+        self.sample_rate = sample_rate
+        self.samples = samples
+        self.factors = averaging_factors(samples, points_per_decade)
+        # sums of the squared differences and their number per factor
+        self.adev_sums = np.zeros(len(self.factors))
+        self.adev_counts = np.zeros(len(self.factors))
+        self.mdev_sums = np.zeros(len(self.factors))
+        self.mdev_counts = np.zeros(len(self.factors))
+        self.done = set() # indices of records that have been processed
+
+    @classmethod
+    def from_hdf5(cls, group):
+        """Restores the accumulated sums that were stored with to_hdf5."""
+        allan = cls.__new__(cls)
+        allan.sample_rate = float(group.attrs["sample_rate"])
+        allan.samples = int(group.attrs["samples"])
+        allan.factors = group["factors"][:]
+        for name in ("adev_sums", "adev_counts", "mdev_sums", "mdev_counts"):
+            setattr(allan, name, group[name][:])
+        allan.done = set(range(int(group.attrs["records"])))
+        return allan
+
+    def to_hdf5(self, group):
+        """Writes the deviations and the accumulated sums into an HDF5 group."""
+        group.attrs["sample_rate"] = self.sample_rate
+        group.attrs["samples"] = self.samples
+        group.attrs["records"] = len(self.done)
+        for name in ("factors", "taus", "adev", "mdev",
+                     "adev_sums", "adev_counts", "mdev_sums", "mdev_counts"):
+            group.create_dataset(name, data=getattr(self, name))
+
+    @property
+    def taus(self) -> np.ndarray:
+        """Averaging times in seconds."""
+        return self.factors / self.sample_rate
+
+    @property
+    def adev(self) -> np.ndarray:
+        """Overlapping Allan deviation at taus, NaN before the first record."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(self.adev_sums / (2 * self.taus**2 * self.adev_counts))
+
+    @property
+    def mdev(self) -> np.ndarray:
+        """Modified Allan deviation at taus, NaN before the first record."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(self.mdev_sums
+                           / (2 * self.factors**2 * self.taus**2 * self.mdev_counts))
+
+    def update(self, index:int, record:np.ndarray):
+        """Adds a record in O(samples) per averaging factor. Records that have
+        been added before are skipped.
+
+        Args:
+            index (int): index of the record
+            record (np.ndarray): samples of the record
+        """
+        if index in self.done:
+            return
+        record = np.asarray(record, dtype=float)
+        # the mean only adds a linear phase, which cancels in the second differences,
+        # removing it keeps the cumulative sum small and precise
+        phase = np.zeros(len(record) + 1)
+        np.cumsum(record - record.mean(), out=phase[1:])
+        phase /= self.sample_rate
+        length = len(phase)
+        # the buffers are reused for all factors
+        buffer = np.empty(length)
+        cumulative = np.zeros(length + 1)
+        window_buffer = np.empty(length)
+        for i, m in enumerate(self.factors):
+            if length - 2*m < 1:
+                break
+            differences = buffer[:length-2*m]
+            np.subtract(phase[2*m:], phase[m:length-m], out=differences)
+            differences -= phase[m:length-m]
+            differences += phase[:length-2*m]
+            self.adev_sums[i] += differences @ differences
+            self.adev_counts[i] += len(differences)
+            if len(differences) < m:
+                continue
+            # sums over m consecutive differences from their cumulative sum
+            np.cumsum(differences, out=cumulative[1:len(differences)+1])
+            window_sums = window_buffer[:len(differences)-m+1]
+            np.subtract(cumulative[m:len(differences)+1], cumulative[:len(differences)-m+1],
+                        out=window_sums)
+            self.mdev_sums[i] += window_sums @ window_sums
+            self.mdev_counts[i] += len(window_sums)
+        self.done.add(index)
@@ -1,28 +1,52 @@
 from PySide6.QtCore import QThread
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, status, Request, WebSocket
 from fastapi.security import OAuth2PasswordBearer
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse, StreamingResponse
 import uvicorn
-import requests
-from time import sleep
-from pathlib import Path
+import numpy as np
+import io
+import asyncio
+from collections import OrderedDict
+from time import perf_counter
 from . import log, ureg, spectran_path
+from .metrics import REGISTRY, API_REQUEST_SECONDS, STREAM_FRAMES_SENT
+from .stream import LiveStream
+from .measurement import Dispatcher
+from .sweep import Sweep
+from .jobs import Job, JobQueue
+from .settings import DEFAULT_VALUES
+from .data_handler import SAVING_MODES
+# the clients are part of the API, see spectran.client
+from .client import DEFAULT_API_KEY, API_Connection, AsyncAPIConnection
 
-DEFAULT_API_KEY = "12345678910111213"
+MAX_SWEEPS = 100 # number of done sweeps that are remembered
 
 class FastAPIServer(QThread):
+    """Serves the API with uvicorn. The endpoints run on the event loop of the server,
+    functions of the GUI are called on the GUI thread via self.dispatcher and 
+    blocking functions (e.g. saving) on worker threads, so no endpoint blocks the event loop.
+    """
     
     def __init__(self, main_window, api_key=DEFAULT_API_KEY, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.main_window = main_window
+        # created on the GUI thread together with the server
+        self.dispatcher = Dispatcher()
         self.api_key = api_key
         self.host = self.main_window.settings.value("api/host")
         self.port = self.main_window.settings.value("api/port")
+        self.live_stream = None
+        self.sweeps = OrderedDict() # Sweep by id in the order of start
+        self.job_queue = None
     
     def run(self):
+        uvicorn.run(self.create_app(), host=self.host, port=self.port)
+
+    def create_app(self) -> FastAPI:
         
         oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
         app = FastAPI()
+        self.job_queue = JobQueue(self.main_window.engine)
         
         async def api_key_auth(api_key: str = Depends(oauth2_scheme)):
             if api_key != self.api_key:
@@ -30,210 +54,464 @@ class FastAPIServer(QThread):
                     status_code=status.HTTP_401_UNAUTHORIZED, 
                     detail="Could not validate credentials"
                 )
+
+        @app.middleware("http")
+        async def record_duration(request: Request, call_next):
+            start_time = perf_counter()
+            response = await call_next(request)
+            # use the route template as label to keep the number of series bounded
+            route = request.scope.get("route")
+            API_REQUEST_SECONDS.labels(method=request.method,
+                                       path=route.path if route is not None else "unmatched"
+                                       ).observe(perf_counter() - start_time)
+            return response
                 
+        async def gui(function, *args):
+            """Calls function on the GUI thread."""
+            try:
+                return await self.dispatcher.run(function, *args)
+            except (RuntimeError, ValueError) as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
         @app.get("/ping")
-        def ping():
+        async def ping():
             return {"message": "pong"}
         
         @app.get("/favicon.ico")
         @app.get("/osci_128.ico")
-        def return_logo():
+        async def return_logo():
             return FileResponse(spectran_path / "data/osci_128.ico")
 
         @app.get("/", response_class=HTMLResponse)
-        def homepage():
+        async def homepage():
             return FileResponse(spectran_path / "data/api.html")
 
         @app.get("/alive")
-        def alive():
+        async def alive():
             return {"message": "API Server Running"}
 
+        @app.get("/metrics", response_class=PlainTextResponse, 
+                 dependencies=[Depends(api_key_auth)])
+        async def metrics():
+            """Performance metrics in the Prometheus text format."""
+            return PlainTextResponse(REGISTRY.render(), 
+                                     media_type="text/plain; version=0.0.4")
+
         @app.post("/start_measurement", dependencies=[Depends(api_key_auth)])
-        def start_measurement():
-            status = self.main_window.main_ui.start_measurement()
+        async def start_measurement():
+            status = await gui(self.main_window.main_ui.start_measurement)
             if status is None:
                 return {"message": "Measurement started"}
             else:
                 return {"message": f"Measurement failed: {status}"}
             
         @app.post("/stop_measurement", dependencies=[Depends(api_key_auth)])
-        def stop_measurement():
-            self.main_window.main_ui.stop_measurement()
+        async def stop_measurement():
+            await gui(self.main_window.main_ui.stop_measurement)
             return {"message": "Measurement stopped"}
             
         @app.post("/config", dependencies=[Depends(api_key_auth)])
-        def set_config(config:dict):
-
-            def serial_dict_to_config(d):
-                """Convert dictionary with magnitude and unit to pint quantities."""
-                def convert_value(v):
-                    if isinstance(v, dict):
-                        return ureg.Quantity(v["magnitude"], v["unit"])
-                    return v
-                
-                return {k: convert_value(v) for k, v in d.items()}
-            
+        async def set_config(config:dict):
             config = serial_dict_to_config(config)
-            self.main_window.main_ui.set_config(config)
+            await gui(self.main_window.main_ui.set_config, config)
             return {"message": f"Configuration {config}"}
         
         @app.post("/save_file", dependencies=[Depends(api_key_auth)])
-        def save_file(json:dict):
-            self.main_window.data_handler.save_file(json["file_path"]) 
+        async def save_file(json:dict):
+            """Saves to file_path with the optional mode (name of SAVING_MODES) 
+            and flags of DataHandler.save_file, e.g. save_allan."""
+            save_kwargs = {key: json[key] for key in ("save_psds", "save_time_line", 
+                                                      "save_envelope", "save_allan") if key in json}
+            try:
+                if "mode" in json:
+                    save_kwargs["mode"] = SAVING_MODES[json["mode"]]
+                await asyncio.to_thread(self.main_window.data_handler.save_file, json["file_path"],
+                                        **save_kwargs)
+            except KeyError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown mode {e}")
+            except (RuntimeError, ValueError) as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
             return {"message": f"File saved to {json['file_path']}"}
           
+        @app.post("/load_file", dependencies=[Depends(api_key_auth)])
+        async def load_file(json:dict):
+            try:
+                file_path = await asyncio.to_thread(self.main_window.data_handler.load_file,
+                    json["file_path"], recalculate_psd=json.get("recalculate_psd", False))
+            except FileNotFoundError as e:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+            except KeyError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Missing key {e}")
+            except (RuntimeError, TypeError, ValueError) as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            return {"message": f"File loaded from {file_path}"}
+        
+        @app.post("/recalculate_psd", dependencies=[Depends(api_key_auth)])
+        async def recalculate_psd(json:dict):
+            try:
+                await asyncio.to_thread(self.main_window.data_handler.recalculate_psd, **json)
+            except (KeyError, TypeError, ValueError) as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            return {"message": f"PSD recalculated with {json}"}
+          
+        def get_catalog():
+            catalog = self.main_window.data_handler.catalog
+            if catalog is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                    detail="No catalog configured")
+            return catalog
+        
+        @app.get("/catalog", dependencies=[Depends(api_key_auth)])
+        async def query_catalog(driver:str = None, device:str = None, input_channel:str = None,
+                                min_sample_rate:float = None, max_sample_rate:float = None,
+                                since:str = None, until:str = None, path:str = None, limit:int = None):
+            return {"message": await asyncio.to_thread(get_catalog().query, driver=driver, device=device, 
+                                                   input_channel=input_channel,
+                                                   min_sample_rate=min_sample_rate, 
+                                                   max_sample_rate=max_sample_rate,
+                                                   since=since, until=until, 
+                                                   path=path, limit=limit)}
+        
+        @app.post("/catalog/rescan", dependencies=[Depends(api_key_auth)])
+        async def rescan_catalog(json:dict):
+            catalog = get_catalog()
+            if "directory" not in json:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing key 'directory'")
+            count = await asyncio.to_thread(catalog.rescan, json["directory"], 
+                                            compute_psd=json.get("compute_psd", True))
+            return {"message": f"Registered {count} measurements"}
+          
         @app.post("/running", dependencies=[Depends(api_key_auth)])
-        def running():
+        async def running():
             return {"message": not self.main_window.measurement_stopped}
+
+        @app.get("/wait", dependencies=[Depends(api_key_auth)])
+        async def wait(timeout:float = 30):
+            """Returns as soon as no measurement is running, at the latest after timeout seconds.
+            The message contains running and the result of the last measurement (see MeasurementEngine.wait)."""
+            engine = self.main_window.engine
+            loop = asyncio.get_running_loop()
+            done = asyncio.Event()
+            def notify(*args):
+                loop.call_soon_threadsafe(done.set)
+            
+            events = ("finished", "aborted", "failed")
+            for event in events:
+                engine.subscribe(event, notify)
+            try:
+                # subscribed before the check, so the end of the measurement cannot be missed
+                if engine.running:
+                    await asyncio.wait_for(done.wait(), timeout)
+            except asyncio.TimeoutError:
+                # not a subclass of TimeoutError before Python 3.11
+                pass
+            finally:
+                for event in events:
+                    engine.unsubscribe(event, notify)
+            return {"message": {"running": engine.running, **(engine.result or {})}}
         
         @app.post("/connect_device", dependencies=[Depends(api_key_auth)])
-        def connect_device(json:dict):
+        async def connect_device(json:dict):
             driver = json["driver"]
             device = json["device"]
-            self.main_window.main_ui.connect_device_manual(driver, device)
+            await gui(self.main_window.main_ui.connect_device_manual, driver, device)
             return {"message": f"Connected to {driver} on {device}"}
          
         @app.post("/enable_plotting", dependencies=[Depends(api_key_auth)])
-        def enable_plotting(json:dict):
+        async def enable_plotting(json:dict):
             signal_enable = json["signal"]
             spectrum_enable = json["spectrum"]
-            self.main_window.main_ui.enable_plotting(signal_enable, spectrum_enable)
-            return {"message": f"Plotting set to signal:{signal_enable} and spectrum:{spectrum_enable}"}
-        
-        uvicorn.run(app, host=self.host, port=self.port)
-        
+            allan_enable = json.get("allan")
+            await gui(self.main_window.main_ui.enable_plotting, signal_enable, spectrum_enable, allan_enable)
+            return {"message": f"Plotting set to signal:{signal_enable}, spectrum:{spectrum_enable} "
+                               f"and allan:{allan_enable}"}
 
-class API_Connection():
-    """This class handles the connection to the API Server.
+        @app.post("/sweep", dependencies=[Depends(api_key_auth)])
+        async def start_sweep(json:dict):
+            """Runs a measurement for each of json["steps"] with the configuration of the GUI 
+            updated by the step. Optional keys: directory, file_name, mode and save_kwargs,
+            see spectran.sweep.Sweep. Returns the id of the sweep."""
+            main_ui = self.main_window.main_ui
+            if not self.main_window.measurement_stopped:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail="Measurement already running")
+            if main_ui.driver_instance is None or main_ui.driver_instance.connected_device is None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail="No device connected")
+            try:
+                sweep = Sweep(self.main_window.engine, main_ui.driver_instance, await gui(main_ui.read_config),
+                              [serial_dict_to_config(step) for step in json["steps"]],
+                              directory=json.get("directory"), file_name=json.get("file_name"),
+                              mode=saving_mode(json.get("mode", "HDF5")),
+                              save_kwargs=json.get("save_kwargs"))
+            except KeyError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Missing key {e}")
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            self.sweeps[sweep.id] = sweep
+            # forget the oldest done sweeps
+            done = [sweep_id for sweep_id, other in self.sweeps.items() if other.done]
+            for sweep_id in done[:max(len(self.sweeps) - MAX_SWEEPS, 0)]:
+                del self.sweeps[sweep_id]
+            sweep.start()
+            return {"message": sweep.id}
 
-    Raises:
-        ConnectionError: If the connection to the API Server fails
-    """
-       
-    def __init__(self, 
-                 host:str = "127.0.0.1",
-                 port: int = 8111,
-                 api_key:str = DEFAULT_API_KEY):
-        self.api_key = api_key
-        self.host = host
-        self.port = port
-        self.url = f"http://{host}:{port}"
-        self.headers = {"Authorization": f"Bearer {self.api_key}"}
-        
-        self.test_connection()
-
-    @staticmethod
-    def response_handler(response:requests.Response) -> str:
-        """Handle the response from the API Server by trying to read 'message' key.
-        Otherwise raise an error.
-        """
-        if response.status_code == 200:
-            return response.json()["message"]
-        else:
-            if "detail" in response.json():
-                error = response.json()["detail"]
-            else: 
-                error = response.json()
-            log.error(error)
-            raise ConnectionError(error)
-        
-    def test_connection(self):
-        """Tests the connection to the API Server
-
-        Raises:
-            ConnectionError: If the connection to the API Server fails
-        """
-        r = requests.get(f"{self.url}/alive", 
-                                 headers=self.headers)
-        self.response_handler(r)
-        
-    def start_measurement(self):
-        """Starts the measurement with settings from the GUI.
-        """
-        r = requests.post(f"{self.url}/start_measurement", 
-                                 headers=self.headers)
-        log.info(self.response_handler(r))
+        def get_sweep(sweep_id:str) -> Sweep:
+            if sweep_id not in self.sweeps:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                    detail=f"Sweep {sweep_id} not found")
+            return self.sweeps[sweep_id]
         
-    def stop_measurement(self):
-        """Starts the measurement with settings from the GUI.
-        """
-        r = requests.post(f"{self.url}/stop_measurement", 
-                                 headers=self.headers)
-        log.info(self.response_handler(r))
+        @app.get("/sweep/{sweep_id}", dependencies=[Depends(api_key_auth)])
+        async def sweep_status(sweep_id:str, timeout:float = 0):
+            """Progress and results of the sweep. With timeout, 
+            it waits up to timeout seconds for the sweep to be done."""
+            sweep = get_sweep(sweep_id)
+            if timeout > 0 and not sweep.done:
+                await asyncio.to_thread(sweep.thread.join, timeout)
+            return {"message": sweep.summary()}
         
-    def set_config(self, config:dict):
-        """Sets GUI configuration with the given dictionary.
-
-        Args:
-            config (dict): Dictionary with configuration of GUI. See examples for details.
-        """
-        # convert pint quantities to serializable dictionary
-        def convert_config_to_serial_dict(d):
-            """Convert pint quantities to a dictionary with magnitude and unit."""
-            def convert_value(v):
-                if isinstance(v, ureg.Quantity):
-                    return {"magnitude": v.magnitude, "unit": str(v.units)}
-                return v
-            
-            return {k: convert_value(v) for k, v in d.items()}
-        
-        config_converted = convert_config_to_serial_dict(config)
-        r = requests.post(f"{self.url}/config", 
-                                 headers=self.headers,
-                                 json=config_converted)
-        message = self.response_handler(r)
-        log.info("Configured Measurements with {}".format(message))
-        
-    def save_file(self, file_path:str, **save_kwargs):
-        """Save data to a file with the given filename.
-
-        Args:
-            file_path (str): Filename where to save the data.
-        """
-        file_path = Path(file_path).resolve()
-        r = requests.post(f"{self.url}/save_file", 
-                                 headers=self.headers,
-                                 json={"file_path": str(file_path)})
-        message = self.response_handler(r)
-        log.info("Saved file to {} with {}".format(file_path, message))
+        @app.post("/sweep/{sweep_id}/cancel", dependencies=[Depends(api_key_auth)])
+        async def cancel_sweep(sweep_id:str):
+            get_sweep(sweep_id).cancel()
+            return {"message": f"Sweep {sweep_id} cancelled"}
+
+        @app.post("/jobs", dependencies=[Depends(api_key_auth)])
+        async def submit_job(json:dict):
+            """Queues a measurement. Keys: config (changes of the configuration), 
+            driver and device (default: the connected device of the GUI), 
+            directory, file_name, mode and save_kwargs (see spectran.jobs.Job).
+            Returns the id of the job."""
+            try:
+                if json.get("driver") is not None:
+                    # connecting to the hardware may take a while
+                    driver_instance = await asyncio.to_thread(self.job_queue.driver, 
+                                                              json["driver"], json["device"])
+                    config = DEFAULT_VALUES.copy()
+                else:
+                    main_ui = self.main_window.main_ui
+                    driver_instance = main_ui.driver_instance
+                    if driver_instance is None or driver_instance.connected_device is None:
+                        raise ValueError("No device connected")
+                    config = await gui(main_ui.read_config)
+            except (KeyError, ValueError) as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            mode = saving_mode(json.get("mode", "HDF5"))
+            config.update(serial_dict_to_config(json.get("config") or {}))
+            job = Job(driver_instance, config, directory=json.get("directory"), 
+                      file_name=json.get("file_name"), mode=mode,
+                      save_kwargs=json.get("save_kwargs"))
+            return {"message": self.job_queue.submit(job).id}
+
+        def get_job(job_id:str) -> Job:
+            try:
+                return self.job_queue.get(job_id)
+            except KeyError:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                    detail=f"Job {job_id} not found")
+
+        @app.get("/jobs", dependencies=[Depends(api_key_auth)])
+        async def list_jobs():
+            return {"message": self.job_queue.list()}
+
+        @app.get("/jobs/{job_id}", dependencies=[Depends(api_key_auth)])
+        async def job_status(job_id:str, timeout:float = 0):
+            """Status of the job. With timeout, it waits up to timeout seconds for the job to be done."""
+            job = get_job(job_id)
+            if timeout > 0 and not job.done:
+                await asyncio.to_thread(job.wait, timeout)
+            return {"message": job.summary()}
+
+        @app.post("/jobs/{job_id}/cancel", dependencies=[Depends(api_key_auth)])
+        async def cancel_job(job_id:str):
+            get_job(job_id)
+            self.job_queue.cancel(job_id)
+            return {"message": f"Job {job_id} cancelled"}
+
+        def get_data_handler(job_id:str|None):
+            if job_id is None:
+                return self.main_window.data_handler
+            get_job(job_id)
+            try:
+                return self.job_queue.result(job_id)
+            except KeyError:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                    detail=f"No result of job {job_id} available")
+
+        def get_array(name:str, data_handler):
+            array = getattr(data_handler, name, None)
+            if array is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                    detail=f"No {name} available")
+            return array
+
+        def frequency_slice(f_min:float|None, f_max:float|None, data_handler) -> slice:
+            frequencies = get_array("frequencies", data_handler)
+            start = np.searchsorted(frequencies, f_min, side="left") if f_min is not None else None
+            stop = np.searchsorted(frequencies, f_max, side="right") if f_max is not None else None
+            return slice(start, stop)
+
+        def allan_array(name:str, data_handler):
+            if data_handler.voltage_data is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                    detail=f"No {name} available")
+            if data_handler.engine is not None and data_handler.engine.running:
+                # the records are added by the engine, only the current state is returned
+                allan = get_array("allan", data_handler)
+                return getattr(allan, name)
+            return dict(zip(("taus", "adev", "mdev"), data_handler.allan_deviation()))[name]
+
+        def data_response(name:str, job_id:str = None, average_start:int = None, 
+                          average_stop:int = None, sample_start:int = None, sample_stop:int = None,
+                          f_min:float = None, f_max:float = None, format:str = "raw"):
+            data_handler = get_data_handler(job_id)
+            averages = slice(average_start, average_stop)
+            match name:
+                case "voltage_data":
+                    slices = (averages, slice(sample_start, sample_stop))
+                case "psds":
+                    slices = (averages, frequency_slice(f_min, f_max, data_handler))
+                case "psd" | "psd_raw" | "frequencies":
+                    slices = (frequency_slice(f_min, f_max, data_handler),)
+                case "taus" | "adev" | "mdev":
+                    return array_response(allan_array(name, data_handler), slice(None), format=format)
+                case _:
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                        detail=f"Unknown data {name}")
+            return array_response(get_array(name, data_handler), *slices, format=format)
+
+        @app.get("/data/{name}", dependencies=[Depends(api_key_auth)])
+        async def get_data(name:str, average_start:int = None, average_stop:int = None,
+                           sample_start:int = None, sample_stop:int = None,
+                           f_min:float = None, f_max:float = None, format:str = "raw"):
+            """One of voltage_data, psds, psd, psd_raw (without calibration), frequencies or the Allan deviation 
+            (taus, adev, mdev) of the current measurement. The missing records of the 
+            Allan deviation and the chunks of the response are calculated and read on a worker thread."""
+            return await asyncio.to_thread(data_response, name, None, average_start, average_stop, 
+                                           sample_start, sample_stop, f_min, f_max, format)
+
+        @app.get("/jobs/{job_id}/data/{name}", dependencies=[Depends(api_key_auth)])
+        async def get_job_data(job_id:str, name:str, average_start:int = None, average_stop:int = None,
+                               sample_start:int = None, sample_stop:int = None,
+                               f_min:float = None, f_max:float = None, format:str = "raw"):
+            """Like /data/{name} for the result of a job, which may have to be loaded from disk."""
+            return await asyncio.to_thread(data_response, name, job_id, average_start, average_stop, sample_start, 
+                                 sample_stop, f_min, f_max, format)
         
-    def enable_plotting(self, signal_enabled:bool, spectrum_enabled:bool):
-        """Enable or disable plotting of the data.
-
-        Args:
-            signal_enabled (bool): Enable plotting of the signal.
-            spectrum_enabled (bool): Enable plotting of the spectrum.
-        """
-        r = requests.post(f"{self.url}/enable_plotting", 
-                                 headers=self.headers,
-                                 json={"signal": signal_enabled,
-                                       "spectrum": spectrum_enabled})
-        message = self.response_handler(r)
-        log.info(message)
-
-    def wait_for_measurement(self, update_interval:float = 0.1):
-        """Wait for the measurement to finish."""
-        running = True
-        while running:
-            r = requests.post(f"{self.url}/running", 
-                                 headers=self.headers)
-            if r.status_code == 200:
-                # returns True if it is still runnning
-                running = self.response_handler(r)
-                
-            sleep(update_interval)
+        @app.websocket("/stream")
+        async def stream(websocket:WebSocket, decimation:int = Query(1, ge=1), 
+                         max_rate:float = Query(10, gt=0), max_points:int = Query(None, ge=1), 
+                         token:str = None):
+            """Sends a frame per processed average, see spectran.stream.
+            The API key is passed as bearer token or with the token parameter.
+            Invalid parameters close the connection with a policy violation."""
+            authorization = websocket.headers.get("authorization", "")
+            if (token or authorization.removeprefix("Bearer ")) != self.api_key:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+            await websocket.accept()
+
+            if self.live_stream is None:
+                self.live_stream = LiveStream(self.main_window.engine)
+            client = self.live_stream.connect(asyncio.get_running_loop(), decimation, max_points)
+
+            async def send_frames():
+                while True:
+                    frame = await client.get()
+                    await websocket.send_bytes(frame)
+                    STREAM_FRAMES_SENT.inc()
+                    # rate limit, newer frames replace the pending one meanwhile
+                    await asyncio.sleep(1 / max_rate)
+
+            async def wait_for_disconnect():
+                while (await websocket.receive())["type"] != "websocket.disconnect":
+                    pass
+
+            tasks = [asyncio.create_task(send_frames()), asyncio.create_task(wait_for_disconnect())]
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                self.live_stream.disconnect(client)
+
+        return app
+
+
+# size of the chunks in which arrays are streamed
+STREAM_CHUNK_BYTES = 2**20
+
+def array_response(array, *slices:slice, format:str = "raw") -> StreamingResponse:
+    """Streams a slice of an array without JSON encoding.
+    The array is read in chunks of rows, so that lazily loaded HDF5 datasets 
+    are never read completely.
+
+    Args:
+        array (np.ndarray|h5py.Dataset): one or two dimensional array
+        slices (slice): slice per dimension
+        format (str, optional): "raw" for the bytes of the array in C order, 
+            the shape and dtype are sent in the X-Shape and X-Dtype headers, 
+            or "npy" for the .npy file format. Defaults to "raw".
+    """
+    if format not in ("raw", "npy"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown format {format}, use raw or npy")
+    if len(slices) != array.ndim:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Expected {array.ndim} slices, got {len(slices)}")
+    ranges = [range(*s.indices(n)) for s, n in zip(slices, array.shape)]
+    shape = tuple(len(r) for r in ranges)
+    dtype = np.dtype(array.dtype)
+
+    def chunks():
+        if format == "npy":
+            header = io.BytesIO()
+            np.lib.format.write_array_header_1_0(header, {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                "fortran_order": False,
+                "shape": shape})
+            yield header.getvalue()
+        if 0 in shape:
+            return
+        if array.ndim == 1:
+            yield np.ascontiguousarray(array[ranges[0].start:ranges[0].stop]).data.cast("B")
+            return
+        rows, columns = ranges
+        rows_per_chunk = max(1, STREAM_CHUNK_BYTES // (len(columns) * dtype.itemsize))
+        for start in range(rows.start, rows.stop, rows_per_chunk):
+            stop = min(start + rows_per_chunk, rows.stop)
+            yield np.ascontiguousarray(array[start:stop, columns.start:columns.stop]).data.cast("B")
+
+    headers = {"X-Shape": ",".join(str(n) for n in shape), "X-Dtype": dtype.str}
+    if format == "npy":
+        headers["Content-Disposition"] = "attachment; filename=data.npy"
+    return StreamingResponse(chunks(), media_type="application/octet-stream", headers=headers)
         
-        log.info("Measurement finished")
-            
-    def connect_device(self, driver:str, device:str):
-        """Connect to the device with the given driver.
-
-        Args:
-            driver (str): Name of the driver to connect to.
-            device (str): Name of the device to connect to.
-        """
-        r = requests.post(f"{self.url}/connect_device", 
-                                 headers=self.headers,
-                                 json={"driver": driver,
-                                       "device": device})
-        log.info(self.response_handler(r))
\ No newline at end of file
+
+def saving_mode(name:str) -> SAVING_MODES:
+    """The member of SAVING_MODES with the given name.
+
+    Raises:
+        HTTPException: 400 if there is no such mode
+    """
+    try:
+        return SAVING_MODES[name]
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, 
+                            detail=f"Unknown mode {name}, use one of {[m.name for m in SAVING_MODES]}")
+
+
+def serial_dict_to_config(d:dict) -> dict:
+    """Convert dictionary with magnitude and unit to pint quantities.
+    Other dictionaries and lists, e.g. the entries "trigger" or "filters", 
+    are passed through with their quantities converted."""
+    def convert_value(v):
+        if isinstance(v, dict):
+            if v.keys() == {"magnitude", "unit"}:
+                return ureg.Quantity(v["magnitude"], v["unit"])
+            return {k: convert_value(value) for k, value in v.items()}
+        if isinstance(v, list):
+            return [convert_value(value) for value in v]
+        return v
+    
+    return {k: convert_value(v) for k, v in d.items()}
@@ -1,11 +1,36 @@
-"""This module contains functions to run the program."""
+"""This module contains functions to run the program.
+
+The startup is staged, so that the window is shown as early as possible:
+the API server (FastAPI, uvicorn) and the modules for calculating and saving
+(scipy, h5py) are loaded in the background after the window has been painted. 
+The unit registry (pint) is created in the background while the window is built.
+The duration of each phase is logged."""
+
+import time
+start_time = time.perf_counter()
 
 from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QTimer, QThreadPool
 import sys, os, warnings
 import logging
-from .api import FastAPIServer, DEFAULT_API_KEY
+from .client import DEFAULT_API_KEY
 from .main_window import MainWindow
-from . import __version__, log
+from .measurement import Worker
+from . import __version__, log, profiling, ureg
+
+
+class StartupTimer():
+    """Logs the duration of the phases of the startup."""
+
+    def __init__(self, start:float = None) -> None:
+        self.start = start if start is not None else time.perf_counter()
+        self.last = self.start
+
+    def phase(self, name:str):
+        now = time.perf_counter()
+        log.info("Startup: {} took {:.0f} ms ({:.0f} ms in total)".format(
+            name, (now - self.last) * 1e3, (now - self.start) * 1e3))
+        self.last = now
 
 
 def run(level=logging.INFO, format="%(asctime)s  %(levelname)-10s %(name)s: %(message)s", **logging_kwargs):
@@ -17,6 +42,10 @@ def run(level=logging.INFO, format="%(asctime)s  %(levelname)-10s %(name)s: %(me
             format=format,
             **logging_kwargs,
         )
+    timer = StartupTimer(start_time)
+    timer.phase("imports")
+    # pint is loaded while the window is built, see LazyUnitRegistry
+    ureg.preload()
         
     api_key = os.getenv("API_KEY",DEFAULT_API_KEY)
     log.info("API_KEY set to {}".format(api_key))
@@ -30,13 +59,41 @@ def run(level=logging.INFO, format="%(asctime)s  %(levelname)-10s %(name)s: %(me
     # This starts the application
     app = QApplication(sys.argv)
     w = MainWindow()
+    timer.phase("main window")
+    # the environment variable SPECTRAN_PROFILE overrides the setting
+    profiling.enable(os.getenv("SPECTRAN_PROFILE", w.settings.value("misc/profiling")))
     sys.excepthook = lambda *args: exception_hook(w, *args)
     warnings.showwarning = warning_handler
-    api_thread = FastAPIServer(w, api_key=api_key)
     w.show()
-    w.api_server = api_thread
-    api_thread.start()
+    # runs as soon as the event loop has painted the window
+    QTimer.singleShot(0, lambda: start_background(w, api_key, timer))
     app.exec()
+    profiling.disable()
+
+
+def start_background(main_window, api_key:str, timer:StartupTimer):
+    """Loads the API server and the modules for calculating and saving
+    in a separate thread, the server itself is started on the GUI thread."""
+    timer.phase("first paint")
+
+    def load():
+        from .data_handler import preload_modules
+        preload_modules()
+        timer.phase("scipy and h5py")
+        from .api import FastAPIServer
+        timer.phase("api modules")
+        return FastAPIServer
+
+    def start_api_server(FastAPIServer):
+        api_thread = FastAPIServer(main_window, api_key=api_key)
+        main_window.api_server = api_thread
+        api_thread.start()
+        timer.phase("api server")
+
+    worker = Worker(lambda progress_callback: load())
+    worker.signals.result.connect(start_api_server)
+    worker.signals.error.connect(lambda error: main_window.raise_error(error[1]))
+    QThreadPool.globalInstance().start(worker)
 
 
 def exception_hook(main_window, exception_type, exception_value: Exception, traceback):
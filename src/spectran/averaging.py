@@ -0,0 +1,197 @@
+"""This module contains the averaging modes of the PSD.
+
+The PSDs of the averages are combined one by one, so every mode only holds
+a few arrays of the size of the PSD. The mode is set with the config entry "averaging":
+
+- "linear" (default): mean of all averages
+- {"mode": "exponential", "time_constant": 10}: exponential moving average with
+  the time constant in seconds (or as pint quantity), each average counts with the
+  duration of its record. Alternatively, the weight of the newest average is given as "alpha".
+- "max" or "min": maximum or minimum of each bin (peak hold)
+- "median" or {"mode": "percentile", "percentile": 90}: streaming estimate of the
+  quantile of each bin with the P² algorithm (Jain and Chlamtac, 1985),
+  which is robust against transient glitches
+"""
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from . import ureg
+
+AVERAGING_MODES = ("linear", "exponential", "max", "min", "median", "percentile")
+
+
+class Averager(ABC):
+    """Combines the PSDs of the averages one by one.
+    The combined PSD is result, it is updated in place where possible."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.result = None
+
+    def update(self, psd:np.ndarray) -> np.ndarray:
+        """Adds the PSD of the next average and returns the combined PSD."""
+        psd = np.asarray(psd, dtype=float)
+        if self.count == 0:
+            self.result = psd.copy()
+        else:
+            self._update(psd)
+        self.count += 1
+        return self.result
+
+    @abstractmethod
+    def _update(self, psd:np.ndarray):
+        """Combines the PSD of the next average with result, count is the number of previous averages."""
+
+
+class LinearAverage(Averager):
+    """Mean of all averages."""
+
+    def _update(self, psd):
+        self.result += (psd - self.result) / (self.count + 1)
+
+
+class ExponentialAverage(Averager):
+    """Exponential moving average.
+
+    Args:
+        alpha (float): weight of the newest average between 0 and 1
+    """
+
+    def __init__(self, alpha:float) -> None:
+        if not 0 < alpha <= 1:
+            raise ValueError(f"The weight of the exponential average has to be in (0, 1], got {alpha}")
+        self.alpha = alpha
+        super().__init__()
+
+    def _update(self, psd):
+        self.result += self.alpha * (psd - self.result)
+
+
+class PeakHold(Averager):
+    """Maximum or minimum of each bin.
+
+    Args:
+        mode (str, optional): "max" or "min". Defaults to "max".
+    """
+
+    def __init__(self, mode:str="max") -> None:
+        self.function = np.maximum if mode == "max" else np.minimum
+        super().__init__()
+
+    def _update(self, psd):
+        self.function(self.result, psd, out=self.result)
+
+
+class StreamingQuantile(Averager):
+    """Estimates a quantile of each bin with the P² algorithm. Five markers per bin
+    follow the minimum, the quantile, the maximum and two points in between,
+    they are moved with a piecewise-parabolic interpolation for every average.
+
+    Args:
+        quantile (float): quantile between 0 and 1, e.g. 0.5 for the median
+    """
+
+    def __init__(self, quantile:float) -> None:
+        if not 0 < quantile < 1:
+            raise ValueError(f"The quantile has to be in (0, 1), got {quantile}")
+        self.quantile = quantile
+        # increments of the desired marker positions per average
+        self.increments = np.array([0, quantile / 2, quantile, (1 + quantile) / 2, 1])
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self.heights = None # (5, bins) heights of the markers
+        self.positions = None # (5, bins) positions of the markers
+        self.desired = None # (5,) desired positions, the same for all bins
+
+    def update(self, psd):
+        psd = np.asarray(psd, dtype=float)
+        if self.count == 0:
+            self.heights = np.empty((5, len(psd)))
+        if self.count < 5:
+            # the first five averages are the initial markers
+            self.heights[self.count] = psd
+            self.count += 1
+            if self.count == 5:
+                self.heights.sort(axis=0)
+                self.positions = np.tile(np.arange(5.0)[:, np.newaxis], (1, len(psd)))
+                self.desired = np.array([0, 2*self.quantile, 4*self.quantile, 2 + 2*self.quantile, 4])
+                self.result = self.heights[2]
+            else:
+                self.result = np.quantile(self.heights[:self.count], self.quantile, axis=0)
+            return self.result
+        self._update(psd)
+        self.count += 1
+        return self.result
+
+    def _update(self, psd):
+        q, n = self.heights, self.positions
+        np.minimum(q[0], psd, out=q[0])
+        np.maximum(q[4], psd, out=q[4])
+        # cell of the new value: number of inner markers below it
+        cell = (psd >= q[1:4]).sum(axis=0)
+        n[1:] += np.arange(1, 5)[:, np.newaxis] > cell
+        self.desired += self.increments
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            up = (d >= 1) & (n[i+1] - n[i] > 1)
+            down = (d <= -1) & (n[i-1] - n[i] < -1)
+            move = up | down
+            if not move.any():
+                continue
+            s = np.where(up, 1.0, -1.0)
+            parabolic = q[i] + s / (n[i+1] - n[i-1]) * (
+                (n[i] - n[i-1] + s) * (q[i+1] - q[i]) / (n[i+1] - n[i])
+                + (n[i+1] - n[i] - s) * (q[i] - q[i-1]) / (n[i] - n[i-1]))
+            # the linear interpolation is used if the parabola leaves the neighbors
+            neighbor_q = np.where(up, q[i+1], q[i-1])
+            neighbor_n = np.where(up, n[i+1], n[i-1])
+            linear = q[i] + s * (neighbor_q - q[i]) / (neighbor_n - n[i])
+            inside = (q[i-1] < parabolic) & (parabolic < q[i+1])
+            q[i] = np.where(move, np.where(inside, parabolic, linear), q[i])
+            n[i] += np.where(move, s, 0)
+
+
+def make_averager(value, record_duration:float=1.0) -> Averager:
+    """Creates the averager of the config entry "averaging", see the module docstring.
+
+    Args:
+        value (str|dict|None): config entry
+        record_duration (float, optional): duration of a record in seconds,
+            used for the time constant of the exponential average. Defaults to 1.0.
+
+    Raises:
+        ValueError: if the mode is unknown
+    """
+    if not value:
+        return LinearAverage()
+    if isinstance(value, str):
+        value = {"mode": value}
+    mode = value.get("mode", "linear")
+    match mode:
+        case "linear":
+            return LinearAverage()
+        case "exponential":
+            if "alpha" in value:
+                return ExponentialAverage(float(value["alpha"]))
+            time_constant = value.get("time_constant")
+            if time_constant is None:
+                raise ValueError("The exponential average needs a time_constant or alpha")
+            if isinstance(time_constant, ureg.Quantity):
+                time_constant = time_constant.to(ureg.second).magnitude
+            return ExponentialAverage(1 - np.exp(-record_duration / float(time_constant)))
+        case "max" | "min":
+            return PeakHold(mode)
+        case "median":
+            return StreamingQuantile(0.5)
+        case "percentile":
+            return StreamingQuantile(float(value.get("percentile", 50)) / 100)
+        case _:
+            raise ValueError(f"Unknown averaging mode {mode}, use one of {AVERAGING_MODES}")
@@ -0,0 +1,125 @@
+"""This module contains the calibration of the PSD with the transfer function of
+the sensor and the preamplifiers.
+
+A calibration curve holds the gain of the signal chain at a set of frequencies,
+e.g. in V per sensor unit. The PSD is divided by the squared gain (or by the gain
+itself for curves of the power, see Calibration). The curve is interpolated linearly
+onto the frequencies of the PSD, values outside of the curve are held constant.
+
+The calibration is set with the config entry "calibration":
+
+- the path of a CSV file with the columns frequency (Hz) and gain, an optional header
+  line is skipped, or of an HDF5 file with the datasets "frequencies" and "gain"
+- {"file": path, "quantity": "power"} for a curve of the power instead of the amplitude
+- {"frequencies": [...], "gain": [...]} for a curve without file
+"""
+
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+# correction arrays kept per calibration, the latest ones are reused
+MAX_CACHED_GRIDS = 8
+# calibration files kept in memory, the latest ones are reused
+MAX_CACHED_FILES = 8
+
+
+class Calibration():
+    """Transfer function of the signal chain.
+
+    Args:
+        frequencies (array-like): frequencies of the curve in Hz
+        gain (array-like): gain at the frequencies
+        quantity (str, optional): "amplitude" if the PSD is divided by gain**2
+            or "power" if it is divided by gain. Defaults to "amplitude".
+        name (str, optional): name shown in messages and saved files. Defaults to "calibration".
+    """
+
+    def __init__(self, frequencies, gain, quantity:str="amplitude", name:str="calibration") -> None:
+        frequencies = np.asarray(frequencies, dtype=float)
+        gain = np.asarray(gain, dtype=float)
+        if frequencies.ndim != 1 or frequencies.shape != gain.shape or len(frequencies) == 0:
+            raise ValueError(f"Calibration {name}: frequencies and gain need the same length")
+        if np.any(gain == 0):
+            raise ValueError(f"Calibration {name}: the gain must not be zero")
+        if quantity not in ("amplitude", "power"):
+            raise ValueError(f"Unknown quantity {quantity}, use amplitude or power")
+        order = np.argsort(frequencies)
+        self.frequencies = frequencies[order]
+        self.gain = gain[order]
+        self.quantity = quantity
+        self.name = name
+        self._corrections = {} # correction per (samples, sample_rate)
+
+    @classmethod
+    def load(cls, file_path:str|Path, quantity:str="amplitude") -> "Calibration":
+        """Reads a curve from a CSV or HDF5 (.h5) file."""
+        file_path = Path(file_path)
+        if not file_path.exists():
+            raise FileNotFoundError(f"Calibration {file_path} does not exist")
+        if file_path.suffix == ".h5":
+            import h5py
+            with h5py.File(file_path, "r") as f:
+                frequencies, gain = f["frequencies"][:], f["gain"][:]
+        else:
+            with open(file_path) as f:
+                lines = [line.replace(",", " ").replace(";", " ") for line in f
+                         if line.strip() and not line.startswith("#")]
+            try:
+                float(lines[0].split()[0])
+            except (ValueError, IndexError):
+                # header line
+                lines = lines[1:]
+            data = np.loadtxt(lines, ndmin=2)
+            frequencies, gain = data[:, 0], data[:, 1]
+        return cls(frequencies, gain, quantity, name=file_path.name)
+
+    @classmethod
+    def from_hdf5(cls, group) -> "Calibration":
+        """Reads a curve that was stored with to_hdf5."""
+        return cls(group["frequencies"][:], group["gain"][:], 
+                   group.attrs["quantity"], group.attrs["name"])
+
+    def to_hdf5(self, group):
+        """Writes the curve into an HDF5 group."""
+        group.attrs["name"] = self.name
+        group.attrs["quantity"] = self.quantity
+        group.create_dataset("frequencies", data=self.frequencies)
+        group.create_dataset("gain", data=self.gain)
+
+    def correction(self, samples:int, sample_rate:float) -> np.ndarray:
+        """Factors of the PSD of records with the given number of samples
+        at the frequencies of scipy.signal.periodogram.
+        They are interpolated once per (samples, sample_rate)."""
+        key = (samples, sample_rate)
+        correction = self._corrections.get(key)
+        if correction is None:
+            frequencies = np.fft.rfftfreq(samples, 1 / sample_rate)
+            gain = np.abs(np.interp(frequencies, self.frequencies, self.gain))
+            correction = 1 / (gain**2 if self.quantity == "amplitude" else gain)
+            if len(self._corrections) >= MAX_CACHED_GRIDS:
+                self._corrections.pop(next(iter(self._corrections)))
+            self._corrections[key] = correction
+        return correction
+
+
+@lru_cache(maxsize=MAX_CACHED_FILES)
+def _load(file_path:Path, quantity:str, mtime:float|None) -> Calibration:
+    # the modification time is part of the key, so modified files are read again
+    return Calibration.load(file_path, quantity)
+
+
+def from_config(value) -> Calibration|None:
+    """Creates the calibration of the config entry "calibration", see the module docstring.
+    Files are only read again if they have been modified."""
+    if not value:
+        return None
+    if isinstance(value, (str, Path)):
+        value = {"file": value}
+    quantity = value.get("quantity", "amplitude")
+    if "file" not in value:
+        return Calibration(value["frequencies"], value["gain"], quantity)
+    file_path = Path(value["file"]).resolve()
+    return _load(file_path, quantity, os.path.getmtime(file_path) if file_path.exists() else None)
@@ -0,0 +1,272 @@
+"""This module contains a SQLite catalog of saved measurements.
+
+Every file saved by DataHandler.save_file is registered with its configuration
+and summary statistics, so that measurements can be found without opening them.
+The catalog can be rebuilt from a directory tree via
+
+    python -m spectran.catalog rescan <directory>
+"""
+import sqlite3
+import json
+import argparse
+import os
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+
+from . import log, ureg
+
+DEFAULT_CATALOG_PATH = Path.home() / ".spectran" / "catalog.sqlite"
+# file extensions that are considered by Catalog.rescan
+CATALOG_EXTENSIONS = (".txt", ".dat", ".npy", ".npz", ".h5")
+# decades in Hz in which the band power is calculated
+BANDS = tuple((10.0**i, 10.0**(i+1)) for i in range(8))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    path TEXT PRIMARY KEY,
+    driver TEXT,
+    device TEXT,
+    input_channel TEXT,
+    start_time TEXT,
+    sample_rate REAL,
+    duration REAL,
+    averages INTEGER,
+    samples INTEGER,
+    size_bytes INTEGER,
+    rms REAL,
+    band_powers TEXT,
+    config TEXT,
+    registered TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_device ON measurements (device);
+CREATE INDEX IF NOT EXISTS idx_start_time ON measurements (start_time);
+CREATE INDEX IF NOT EXISTS idx_sample_rate ON measurements (sample_rate);
+"""
+
+
+class Catalog():
+    """Index of saved measurements in a SQLite database.
+
+    Args:
+        path (str|Path, optional): location of the database. Defaults to DEFAULT_CATALOG_PATH.
+    """
+
+    def __init__(self, path:str|Path = DEFAULT_CATALOG_PATH) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self.connect()) as connection:
+            connection.executescript(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        # a new connection for every operation, as saving can happen on any thread
+        connection = sqlite3.connect(self.path)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def register(self, file_path:str|Path, config:dict, voltage_data,
+                 frequencies=None, psd=None):
+        """Adds a saved measurement to the catalog or updates its entry.
+
+        Args:
+            file_path (str|Path): path of the saved file
+            config (dict): configuration of the measurement
+            voltage_data (array-like): two dimensional data (averages, samples)
+            frequencies (np.ndarray, optional): frequencies of the psd. Defaults to None.
+            psd (np.ndarray, optional): averaged psd used for the band powers. Defaults to None.
+        """
+        file_path = Path(file_path).resolve()
+        sample_rate = config.get("sample_rate_real", config.get("sample_rate"))
+        entry = {
+            "path": str(file_path),
+            "driver": config.get("driver"),
+            "device": config.get("device"),
+            "input_channel": config.get("input_channel"),
+            "start_time": config.get("start_time"),
+            "sample_rate": sample_rate.to(ureg.Hz).magnitude if sample_rate is not None else None,
+            "duration": config["duration"].to(ureg.second).magnitude if "duration" in config else None,
+            "averages": voltage_data.shape[0],
+            "samples": voltage_data.shape[1],
+            "size_bytes": file_path.stat().st_size,
+            "rms": rms(voltage_data),
+            "band_powers": json.dumps(band_powers(frequencies, psd)),
+            "config": json.dumps({key: str(value) for key, value in config.items()}),
+            "registered": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO measurements ({}) VALUES ({})".format(
+                    ", ".join(entry), ", ".join(f":{key}" for key in entry)),
+                entry)
+        log.debug("Registered {} in catalog".format(file_path))
+
+    def query(self, driver:str=None, device:str=None, input_channel:str=None,
+              min_sample_rate:float=None, max_sample_rate:float=None,
+              since:datetime|str=None, until:datetime|str=None,
+              path:str=None, limit:int=None) -> list[dict]:
+        """Returns all measurements that match the given filters.
+
+        Args:
+            driver (str, optional): name of the driver
+            device (str, optional): name of the device
+            input_channel (str, optional): name of the input channel
+            min_sample_rate (float, optional): minimal sample rate in Hz
+            max_sample_rate (float, optional): maximal sample rate in Hz
+            since (datetime|str, optional): earliest start time
+            until (datetime|str, optional): latest start time
+            path (str, optional): SQL LIKE pattern for the file path, e.g. "%/sweep_%"
+            limit (int, optional): maximal number of results
+
+        Returns:
+            list[dict]: matching measurements, newest first
+        """
+        conditions = []
+        parameters = []
+        for column, operator, value in (("driver", "=", driver),
+                                        ("device", "=", device),
+                                        ("input_channel", "=", input_channel),
+                                        ("sample_rate", ">=", min_sample_rate),
+                                        ("sample_rate", "<=", max_sample_rate),
+                                        ("start_time", ">=", since),
+                                        ("start_time", "<=", until),
+                                        ("path", "LIKE", path)):
+            if value is None:
+                continue
+            if isinstance(value, datetime):
+                value = value.strftime("%Y-%m-%d %H:%M:%S")
+            conditions.append(f"{column} {operator} ?")
+            parameters.append(value)
+
+        sql = "SELECT * FROM measurements"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY start_time DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(int(limit))
+
+        with closing(self.connect()) as connection:
+            rows = connection.execute(sql, parameters).fetchall()
+
+        results = []
+        for row in rows:
+            result = dict(row)
+            result["band_powers"] = json.loads(result["band_powers"])
+            result["config"] = json.loads(result["config"])
+            results.append(result)
+        return results
+
+    def remove(self, file_path:str|Path):
+        """Removes a measurement from the catalog."""
+        with closing(self.connect()) as connection, connection:
+            connection.execute("DELETE FROM measurements WHERE path = ?",
+                               (str(Path(file_path).resolve()),))
+
+    def rescan(self, directory:str|Path, compute_psd:bool=True) -> int:
+        """Rebuilds the index from all measurements found in a directory tree.
+        Entries of files that no longer exist are removed.
+
+        Args:
+            directory (str|Path): directory that is searched recursively
+            compute_psd (bool, optional): calculate the psd for the band powers
+                if it is not stored in the file. Defaults to True.
+
+        Returns:
+            int: number of registered measurements
+        """
+        from .averaging import LinearAverage
+        from .data_handler import open_measurement, averaged_psd
+
+        directory = Path(directory).resolve()
+        with closing(self.connect()) as connection, connection:
+            # only files below directory, not in siblings with the same prefix
+            prefix = str(directory).replace("!", "!!").replace("%", "!%").replace("_", "!_")
+            stored = connection.execute("SELECT path FROM measurements WHERE path LIKE ? ESCAPE '!'",
+                                        (f"{prefix}{os.sep}%",)).fetchall()
+            for (path,) in stored:
+                if not Path(path).exists():
+                    connection.execute("DELETE FROM measurements WHERE path = ?", (path,))
+
+        registered = 0
+        for file_path in sorted(directory.rglob("*")):
+            if file_path.suffix not in CATALOG_EXTENSIONS:
+                continue
+            try:
+                voltage_data, config, h5_file = open_measurement(file_path)
+            except Exception as e:
+                log.debug("Skipping {}: {}".format(file_path, e))
+                continue
+
+            try:
+                if "sample_rate" not in config:
+                    log.debug("Skipping {}: no spectran measurement".format(file_path))
+                    continue
+                frequencies, psd = None, None
+                if h5_file is not None and "psd" in h5_file and "frequencies" in h5_file:
+                    # the psd of the measurement, e.g. with another averaging mode
+                    frequencies, psd = h5_file["frequencies"][:], h5_file["psd"][:]
+                elif h5_file is not None and "psds" in h5_file and "frequencies" in h5_file:
+                    frequencies = h5_file["frequencies"][:]
+                    averager = LinearAverage()
+                    for psd_n in h5_file["psds"]:
+                        psd = averager.update(psd_n)
+                elif compute_psd:
+                    fs = config.get("sample_rate_real", config["sample_rate"]).to(ureg.Hz).magnitude
+                    frequencies, psd = averaged_psd(voltage_data, fs)
+                self.register(file_path, config, voltage_data, frequencies, psd)
+                registered += 1
+            finally:
+                if h5_file is not None:
+                    h5_file.close()
+
+        log.info("Registered {} measurements from {}".format(registered, directory))
+        return registered
+
+
+def rms(voltage_data) -> float:
+    """Root mean square of all records, calculated record by record."""
+    square_sum = 0.0
+    for record in voltage_data:
+        record = np.asarray(record)
+        square_sum += np.dot(record, record)
+    return float(np.sqrt(square_sum / voltage_data.size)) if voltage_data.size else 0.0
+
+
+def band_powers(frequencies, psd) -> dict:
+    """Integrated power of the psd in each decade of BANDS.
+
+    Returns:
+        dict: power by band label, e.g. {"10-100": 1.2e-9}
+    """
+    if frequencies is None or psd is None or not np.any(psd):
+        return {}
+    df = frequencies[1] - frequencies[0]
+    powers = {}
+    for f_min, f_max in BANDS:
+        mask = (frequencies >= f_min) & (frequencies < f_max)
+        if np.any(mask):
+            powers[f"{f_min:g}-{f_max:g}"] = float(np.sum(psd[mask]) * df)
+    return powers
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="python -m spectran.catalog",
+                                     description="Manage the catalog of saved measurements.")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH,
+                        help="path of the catalog database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rescan_parser = subparsers.add_parser("rescan", help="rebuild the index from a directory tree")
+    rescan_parser.add_argument("directory")
+    rescan_parser.add_argument("--no-psd", action="store_true",
+                               help="do not calculate band powers of files without stored psds")
+    args = parser.parse_args(args)
+
+    catalog = Catalog(args.catalog)
+    if args.command == "rescan":
+        count = catalog.rescan(args.directory, compute_psd=not args.no_psd)
+        print(f"Registered {count} measurements")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,695 @@
+"""This module contains the clients of the API, see spectran.api for the server.
+
+It only imports the standard library when it is imported, so scripts that
+drive Spectran remotely start fast and do not need the GUI stack. 
+requests, httpx, websockets and numpy are imported when they are used first.
+
+Example:
+    from spectran.client import API_Connection
+    api = API_Connection()
+    api.start_measurement()
+    api.wait_for_measurement()
+"""
+
+from __future__ import annotations
+
+from time import perf_counter
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from . import log
+
+if TYPE_CHECKING:
+    import numpy as np
+    import requests
+
+DEFAULT_API_KEY = "12345678910111213"
+JOB_DONE = ("finished", "aborted", "failed", "cancelled") # see spectran.jobs.DONE
+
+
+def config_to_serial_dict(config:dict) -> dict:
+    """Convert pint quantities to a dictionary with magnitude and unit,
+    also inside of dictionaries and lists like the entry "trigger"."""
+    def convert_value(v):
+        # pint quantities, pint itself is not imported
+        if hasattr(v, "magnitude") and hasattr(v, "units"):
+            return {"magnitude": v.magnitude, "unit": str(v.units)}
+        if isinstance(v, dict):
+            return {k: convert_value(value) for k, value in v.items()}
+        if isinstance(v, (list, tuple)):
+            return [convert_value(value) for value in v]
+        return v
+    
+    return {k: convert_value(v) for k, v in config.items()}
+
+
+def catalog_params(filters:dict) -> dict:
+    return {key: value.strftime("%Y-%m-%d %H:%M:%S") if isinstance(value, datetime) else value
+            for key, value in filters.items() if value is not None}
+
+
+def job_json(config, driver, device, directory, file_name, mode, save_kwargs) -> dict:
+    return {"config": config_to_serial_dict(config or {}), "driver": driver, "device": device,
+            "directory": None if directory is None else str(directory), 
+            "file_name": file_name, "mode": mode, "save_kwargs": save_kwargs}
+
+
+def data_path(name:str, job_id:str|None) -> str:
+    return f"/data/{name}" if job_id is None else f"/jobs/{job_id}/data/{name}"
+
+
+def array_from_response(response) -> np.ndarray:
+    import numpy as np
+    shape = tuple(int(n) for n in response.headers["X-Shape"].split(","))
+    return np.frombuffer(response.content, dtype=response.headers["X-Dtype"]).reshape(shape)
+
+
+class BaseConnection():
+    """Common parts of API_Connection and AsyncAPIConnection.
+    
+    Args:
+        host (str, optional): Defaults to "127.0.0.1".
+        port (int, optional): Defaults to 8111.
+        api_key (str, optional): Defaults to DEFAULT_API_KEY.
+        timeout (float, optional): timeout of the requests in seconds. Defaults to 10.
+        retries (int, optional): number of retries if the server cannot be reached. Defaults to 3.
+    """
+
+    def __init__(self, 
+                 host:str = "127.0.0.1",
+                 port: int = 8111,
+                 api_key:str = DEFAULT_API_KEY,
+                 timeout:float = 10,
+                 retries:int = 3):
+        self.api_key = api_key
+        self.host = host
+        self.port = port
+        self.url = f"http://{host}:{port}"
+        self.headers = {"Authorization": f"Bearer {self.api_key}"}
+        self.timeout = timeout
+        self.retries = retries
+
+    @staticmethod
+    def response_handler(response) -> str:
+        """Handle the response from the API Server by trying to read 'message' key.
+        Otherwise raise an error.
+        """
+        if response.status_code == 200:
+            return response.json()["message"]
+        else:
+            if "detail" in response.json():
+                error = response.json()["detail"]
+            else: 
+                error = response.json()
+            log.error(error)
+            raise ConnectionError(error)
+
+    @staticmethod
+    def wait_timeout(deadline:float|None, poll_timeout:float) -> float:
+        if deadline is None:
+            return poll_timeout
+        return max(min(poll_timeout, deadline - perf_counter()), 0)
+
+    async def stream(self, decimation:int = 1, max_rate:float = 10, max_points:int = None):
+        """Receive the processed averages and the running PSD while measurements run.
+        Frames are dropped if they are not consumed fast enough.
+
+        Example:
+
+            async for frame in api.stream(max_rate=5, max_points=1000):
+                print(frame["index"], frame["rms"], frame["psd"].max())
+
+        Args:
+            decimation (int, optional): receive only every n-th average. Defaults to 1.
+            max_rate (float, optional): maximal number of frames per second. Defaults to 10.
+            max_points (int, optional): maximal number of PSD bins. Defaults to None (all).
+
+        Yields:
+            dict: frame, see spectran.stream.decode_frame
+        """
+        from websockets.asyncio.client import connect as websocket_connect
+        from .stream import decode_frame
+
+        params = f"decimation={decimation}&max_rate={max_rate}"
+        if max_points is not None:
+            params += f"&max_points={max_points}"
+        async with websocket_connect(f"ws://{self.host}:{self.port}/stream?{params}",
+                           additional_headers=self.headers) as websocket:
+            async for message in websocket:
+                yield decode_frame(message)
+
+
+class API_Connection(BaseConnection):
+    """This class handles the connection to the API Server.
+    All requests share one session, so the connections are kept alive and reused.
+    Requests that cannot reach the server are retried with an exponential backoff. 
+    See BaseConnection for the arguments.
+
+    Raises:
+        ConnectionError: If the connection to the API Server fails
+    """
+       
+    def __init__(self, *args, **kwargs):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # POST requests are only retried, if they did not reach the server
+        retry = Retry(total=self.retries, backoff_factor=0.1, 
+                      status_forcelist=(502, 503, 504))
+        adapter = HTTPAdapter(max_retries=retry)
+        self.session.mount("http://", adapter)
+        
+        self.test_connection()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Closes the connections to the server."""
+        self.session.close()
+
+    def _get(self, path:str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(f"{self.url}{path}", **kwargs)
+
+    def _post(self, path:str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(f"{self.url}{path}", **kwargs)
+        
+    def test_connection(self):
+        """Tests the connection to the API Server
+
+        Raises:
+            ConnectionError: If the connection to the API Server fails
+        """
+        self.response_handler(self._get("/alive"))
+        
+    def start_measurement(self):
+        """Starts the measurement with settings from the GUI.
+        """
+        log.info(self.response_handler(self._post("/start_measurement")))
+        
+    def stop_measurement(self):
+        """Starts the measurement with settings from the GUI.
+        """
+        log.info(self.response_handler(self._post("/stop_measurement")))
+        
+    def set_config(self, config:dict):
+        """Sets GUI configuration with the given dictionary.
+
+        Args:
+            config (dict): Dictionary with configuration of GUI. See examples for details.
+        """
+        r = self._post("/config", json=config_to_serial_dict(config))
+        message = self.response_handler(r)
+        log.info("Configured Measurements with {}".format(message))
+        
+    def save_file(self, file_path:str, **save_kwargs):
+        """Save data to a file with the given filename.
+
+        Args:
+            file_path (str): Filename where to save the data.
+            save_kwargs: mode (name of SAVING_MODES, e.g. "HDF5") and the flags 
+                save_psds, save_time_line, save_envelope and save_allan of DataHandler.save_file
+        """
+        file_path = Path(file_path).resolve()
+        r = self._post("/save_file", json={"file_path": str(file_path), **save_kwargs})
+        message = self.response_handler(r)
+        log.info("Saved file to {} with {}".format(file_path, message))
+        
+    def load_file(self, file_path:str, recalculate_psd:bool = False):
+        """Load a saved measurement on the server for re-analysis.
+
+        Args:
+            file_path (str): File on the server that should be loaded.
+            recalculate_psd (bool, optional): Calculate the PSD of the loaded data. Defaults to False.
+        """
+        r = self._post("/load_file", json={"file_path": str(file_path),
+                                           "recalculate_psd": recalculate_psd})
+        log.info(self.response_handler(r))
+        
+    def recalculate_psd(self, **periodogram_kwargs):
+        """Recalculate the averaged PSD of the current data with different parameters.
+
+        Args:
+            periodogram_kwargs: passed to scipy.signal.periodogram, e.g. window="hann",
+                and averaging, an averaging mode like the config entry "averaging", e.g. averaging="median"
+        """
+        log.info(self.response_handler(self._post("/recalculate_psd", json=periodogram_kwargs)))
+        
+    def query_catalog(self, **filters) -> list[dict]:
+        """Query the catalog of saved measurements on the server.
+        
+        Example: all captures on Dev1 at 1 MHz or more during the last week
+        
+            api.query_catalog(device="Dev1", min_sample_rate=1e6, 
+                              since=datetime.now() - timedelta(days=7))
+
+        Args:
+            filters: see spectran.catalog.Catalog.query
+
+        Returns:
+            list[dict]: matching measurements, newest first
+        """
+        return self.response_handler(self._get("/catalog", params=catalog_params(filters)))
+        
+    def rescan_catalog(self, directory:str, compute_psd:bool = True):
+        """Rebuild the catalog on the server from all measurements in a directory tree.
+
+        Args:
+            directory (str): Directory on the server.
+            compute_psd (bool, optional): Calculate band powers of files without stored psds. Defaults to True.
+        """
+        r = self._post("/catalog/rescan", json={"directory": str(directory),
+                                                "compute_psd": compute_psd})
+        log.info(self.response_handler(r))
+        
+    def sweep(self, steps:list[dict], directory:str = None, file_name:str = None, 
+              mode:str = "HDF5", **save_kwargs) -> str:
+        """Runs a measurement per step on the server without a round trip in between.
+        Each step updates the configuration of the GUI, e.g. 
+        
+            sweep_id = api.sweep([{"sample_rate": rate * ureg.Hz} for rate in rates], 
+                                 directory="data", file_name="rate_{sample_rate.magnitude:.0f}.h5")
+            api.wait_for_sweep(sweep_id)
+
+        Args:
+            steps (list[dict]): configuration changes of each step
+            directory (str, optional): directory on the server where each step is saved, 
+                while the next one is measured. Defaults to None (not saved).
+            file_name (str, optional): formatted with step and the changes of the step.
+                Defaults to "sweep_{step}" with the suffix of the mode.
+            mode (str, optional): name of the saving mode. Defaults to "HDF5".
+            save_kwargs: passed to DataHandler.save_file, e.g. save_psds=True
+
+        Returns:
+            str: id of the sweep
+        """
+        json = {"steps": [config_to_serial_dict(step) for step in steps], 
+                "directory": None if directory is None else str(directory), 
+                "file_name": file_name, "mode": mode, "save_kwargs": save_kwargs}
+        sweep_id = self.response_handler(self._post("/sweep", json=json))
+        log.info("Started sweep {} with {} steps".format(sweep_id, len(steps)))
+        return sweep_id
+
+    def get_sweep(self, sweep_id:str, timeout:float = 0) -> dict:
+        """Progress of a sweep with the keys id, status, steps, done and results (one per step).
+        With timeout, the server waits up to timeout seconds for the sweep to be done."""
+        return self.response_handler(self._get(f"/sweep/{sweep_id}", params={"timeout": timeout},
+                                               timeout=timeout + self.timeout))
+
+    def cancel_sweep(self, sweep_id:str):
+        """Stops the running step and skips the remaining steps of a sweep."""
+        log.info(self.response_handler(self._post(f"/sweep/{sweep_id}/cancel")))
+
+    def wait_for_sweep(self, sweep_id:str, poll_timeout:float = 30) -> dict:
+        """Waits until the sweep is done and returns its progress, see get_sweep."""
+        while not (summary := self.get_sweep(sweep_id, timeout=poll_timeout))["status"] \
+                in ("finished", "failed", "cancelled"):
+            pass
+        return summary
+
+    def submit_job(self, config:dict = None, driver:str = None, device:str = None,
+                   directory:str = None, file_name:str = None, mode:str = "HDF5", 
+                   **save_kwargs) -> str:
+        """Queue a measurement on the server. The jobs are measured one after 
+        another and their data is kept on the server, so several users can share 
+        one instrument. The data is downloaded with job_id, e.g.
+        
+            job_id = api.submit_job({"averages": 10}, driver="DummyDAQ", device="Dev1")
+            api.wait_for_job(job_id)
+            psd = api.get_psd(job_id=job_id)
+
+        Args:
+            config (dict, optional): changes of the configuration. Defaults to None.
+            driver (str, optional): name of the driver. Defaults to None (the configuration
+                and the connected device of the GUI).
+            device (str, optional): device of the driver. Defaults to None.
+            directory (str, optional): directory on the server where the data is saved.
+                Defaults to None (only kept in the result store of the server).
+            file_name (str, optional): formatted with id. Defaults to "job_{id}" with the suffix of the mode.
+            mode (str, optional): name of the saving mode. Defaults to "HDF5".
+            save_kwargs: passed to DataHandler.save_file, e.g. save_psds=True
+
+        Returns:
+            str: id of the job
+        """
+        json = job_json(config, driver, device, directory, file_name, mode, save_kwargs)
+        job_id = self.response_handler(self._post("/jobs", json=json))
+        log.info("Submitted job {}".format(job_id))
+        return job_id
+
+    def list_jobs(self) -> list[dict]:
+        """All jobs of the server in the order of submission, see get_job."""
+        return self.response_handler(self._get("/jobs"))
+
+    def get_job(self, job_id:str, timeout:float = 0) -> dict:
+        """Status of a job with the keys id, status, averages, file_path, error, driver,
+        device and the times submitted, started and finished. 
+        With timeout, the server waits up to timeout seconds for the job to be done."""
+        return self.response_handler(self._get(f"/jobs/{job_id}", params={"timeout": timeout},
+                                               timeout=timeout + self.timeout))
+
+    def cancel_job(self, job_id:str):
+        """Remove a pending job from the queue or stop it, if it is running."""
+        log.info(self.response_handler(self._post(f"/jobs/{job_id}/cancel")))
+
+    def wait_for_job(self, job_id:str, poll_timeout:float = 30) -> dict:
+        """Waits until the job is done and returns its status, see get_job."""
+        while (job := self.get_job(job_id, timeout=poll_timeout))["status"] not in JOB_DONE:
+            pass
+        return job
+
+    def get_array(self, name:str, job_id:str = None, **params) -> np.ndarray:
+        """Download an array of the data handler on the server.
+
+        Args:
+            name (str): one of voltage_data, psds, psd, psd_raw, frequencies, taus, adev, mdev
+            job_id (str, optional): download the result of a job, see submit_job.
+                Defaults to None (the current measurement).
+            params: slicing parameters of the /data endpoints
+
+        Returns:
+            np.ndarray: the (read-only) array
+        """
+        r = self._get(data_path(name, job_id), params={key: value for key, value in params.items() 
+                                                       if value is not None})
+        if r.status_code != 200:
+            self.response_handler(r)
+        return array_from_response(r)
+
+    def get_voltage_data(self, averages:slice = slice(None), samples:slice = slice(None),
+                         job_id:str = None) -> np.ndarray:
+        """Download the measured data.
+
+        Args:
+            averages (slice, optional): averages to download. Defaults to all.
+            samples (slice, optional): samples of each average to download. Defaults to all.
+            job_id (str, optional): download the result of a job. Defaults to None (current data).
+
+        Returns:
+            np.ndarray: data with shape (averages, samples)
+        """
+        return self.get_array("voltage_data", job_id,
+                              average_start=averages.start, average_stop=averages.stop,
+                              sample_start=samples.start, sample_stop=samples.stop)
+
+    def get_psds(self, averages:slice = slice(None), f_min:float = None, f_max:float = None,
+                 job_id:str = None) -> np.ndarray:
+        """Download the PSD of each average between f_min and f_max (in Hz)."""
+        return self.get_array("psds", job_id, average_start=averages.start, average_stop=averages.stop,
+                              f_min=f_min, f_max=f_max)
+
+    def get_psd(self, f_min:float = None, f_max:float = None, job_id:str = None,
+                raw:bool = False) -> np.ndarray:
+        """Download the averaged PSD between f_min and f_max (in Hz). 
+        With raw, the PSD without the calibration (see spectran.calibration) is downloaded."""
+        return self.get_array("psd_raw" if raw else "psd", job_id, f_min=f_min, f_max=f_max)
+
+    def get_frequencies(self, f_min:float = None, f_max:float = None, job_id:str = None) -> np.ndarray:
+        """Download the frequencies of the PSD between f_min and f_max (in Hz)."""
+        return self.get_array("frequencies", job_id, f_min=f_min, f_max=f_max)
+
+    def get_allan_deviation(self, job_id:str = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Download the overlapping and modified Allan deviation of the records.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: taus in seconds, adev and mdev
+        """
+        return tuple(self.get_array(name, job_id) for name in ("taus", "adev", "mdev"))
+
+    def metrics(self) -> str:
+        """Performance metrics of the server in the Prometheus text format."""
+        r = self._get("/metrics")
+        if r.status_code != 200:
+            self.response_handler(r)
+        return r.text
+        
+    def enable_plotting(self, signal_enabled:bool, spectrum_enabled:bool, allan_enabled:bool = None):
+        """Enable or disable plotting of the data.
+
+        Args:
+            signal_enabled (bool): Enable plotting of the signal.
+            spectrum_enabled (bool): Enable plotting of the spectrum.
+            allan_enabled (bool, optional): Enable calculating and plotting of the 
+                Allan deviation. Defaults to None (unchanged).
+        """
+        r = self._post("/enable_plotting", json={"signal": signal_enabled,
+                                                 "spectrum": spectrum_enabled,
+                                                 "allan": allan_enabled})
+        message = self.response_handler(r)
+        log.info(message)
+
+    def wait_for_measurement(self, timeout:float = None, poll_timeout:float = 30) -> dict:
+        """Wait for the measurement to finish. The server answers as soon as
+        the measurement is finished, aborted or failed (long polling).
+
+        Args:
+            timeout (float, optional): maximal time to wait in seconds. Defaults to None (forever).
+            poll_timeout (float, optional): maximal duration of a single request. Defaults to 30.
+
+        Raises:
+            TimeoutError: If the measurement is still running after timeout
+
+        Returns:
+            dict: result with the keys run, status ("finished", "aborted" or "failed"),
+                averages and error
+        """
+        deadline = None if timeout is None else perf_counter() + timeout
+        while True:
+            wait_time = self.wait_timeout(deadline, poll_timeout)
+            r = self._get("/wait", params={"timeout": wait_time}, 
+                          timeout=wait_time + self.timeout)
+            result = self.response_handler(r)
+            if not result["running"]:
+                break
+            if deadline is not None and perf_counter() >= deadline:
+                raise TimeoutError("Measurement still running")
+        
+        log.info("Measurement {}".format(result.get("status", "finished")))
+        return result
+            
+    def connect_device(self, driver:str, device:str):
+        """Connect to the device with the given driver.
+
+        Args:
+            driver (str): Name of the driver to connect to.
+            device (str): Name of the device to connect to.
+        """
+        r = self._post("/connect_device", json={"driver": driver,
+                                                "device": device})
+        log.info(self.response_handler(r))
+
+
+class AsyncAPIConnection(BaseConnection):
+    """Asynchronous version of API_Connection with the same methods as coroutines,
+    e.g. to drive several instances of Spectran concurrently:
+
+        async with AsyncAPIConnection(port=8111) as a, AsyncAPIConnection(port=8112) as b:
+            await asyncio.gather(a.start_measurement(), b.start_measurement())
+            await asyncio.gather(a.wait_for_measurement(), b.wait_for_measurement())
+
+    The connection is tested when entering the context. See BaseConnection for the arguments.
+
+    Raises:
+        ConnectionError: If the connection to the API Server fails
+    """
+
+    def __init__(self, *args, **kwargs):
+        import httpx
+
+        super().__init__(*args, **kwargs)
+        # retries only cover connection errors, so no request is sent twice
+        self.client = httpx.AsyncClient(base_url=self.url, headers=self.headers, 
+                                        timeout=self.timeout, 
+                                        transport=httpx.AsyncHTTPTransport(retries=self.retries))
+
+    async def __aenter__(self):
+        await self.test_connection()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """Closes the connections to the server."""
+        await self.client.aclose()
+
+    async def test_connection(self):
+        """Tests the connection to the API Server
+
+        Raises:
+            ConnectionError: If the connection to the API Server fails
+        """
+        self.response_handler(await self.client.get("/alive"))
+
+    async def start_measurement(self):
+        """Starts the measurement with settings from the GUI."""
+        log.info(self.response_handler(await self.client.post("/start_measurement")))
+
+    async def stop_measurement(self):
+        """Stops the running measurement."""
+        log.info(self.response_handler(await self.client.post("/stop_measurement")))
+
+    async def set_config(self, config:dict):
+        """Sets GUI configuration with the given dictionary, see API_Connection.set_config."""
+        r = await self.client.post("/config", json=config_to_serial_dict(config))
+        log.info("Configured Measurements with {}".format(self.response_handler(r)))
+
+    async def save_file(self, file_path:str, **save_kwargs):
+        """Save data to a file with the given filename, see API_Connection.save_file."""
+        file_path = Path(file_path).resolve()
+        r = await self.client.post("/save_file", json={"file_path": str(file_path), **save_kwargs})
+        log.info("Saved file to {} with {}".format(file_path, self.response_handler(r)))
+
+    async def load_file(self, file_path:str, recalculate_psd:bool = False):
+        """Load a saved measurement on the server for re-analysis."""
+        r = await self.client.post("/load_file", json={"file_path": str(file_path),
+                                                       "recalculate_psd": recalculate_psd})
+        log.info(self.response_handler(r))
+
+    async def recalculate_psd(self, **periodogram_kwargs):
+        """Recalculate the averaged PSD of the current data with different parameters."""
+        r = await self.client.post("/recalculate_psd", json=periodogram_kwargs)
+        log.info(self.response_handler(r))
+
+    async def query_catalog(self, **filters) -> list[dict]:
+        """Query the catalog of saved measurements on the server, see API_Connection.query_catalog."""
+        return self.response_handler(await self.client.get("/catalog", params=catalog_params(filters)))
+
+    async def rescan_catalog(self, directory:str, compute_psd:bool = True):
+        """Rebuild the catalog on the server from all measurements in a directory tree."""
+        r = await self.client.post("/catalog/rescan", json={"directory": str(directory),
+                                                            "compute_psd": compute_psd})
+        log.info(self.response_handler(r))
+
+    async def sweep(self, steps:list[dict], directory:str = None, file_name:str = None, 
+                    mode:str = "HDF5", **save_kwargs) -> str:
+        """Runs a measurement per step on the server, see API_Connection.sweep."""
+        json = {"steps": [config_to_serial_dict(step) for step in steps], 
+                "directory": None if directory is None else str(directory), 
+                "file_name": file_name, "mode": mode, "save_kwargs": save_kwargs}
+        return self.response_handler(await self.client.post("/sweep", json=json))
+
+    async def get_sweep(self, sweep_id:str, timeout:float = 0) -> dict:
+        """Progress of a sweep, see API_Connection.get_sweep."""
+        r = await self.client.get(f"/sweep/{sweep_id}", params={"timeout": timeout},
+                                  timeout=timeout + self.timeout)
+        return self.response_handler(r)
+
+    async def cancel_sweep(self, sweep_id:str):
+        """Stops the running step and skips the remaining steps of a sweep."""
+        log.info(self.response_handler(await self.client.post(f"/sweep/{sweep_id}/cancel")))
+
+    async def wait_for_sweep(self, sweep_id:str, poll_timeout:float = 30) -> dict:
+        """Waits until the sweep is done and returns its progress, see get_sweep."""
+        while not (summary := await self.get_sweep(sweep_id, timeout=poll_timeout))["status"] \
+                in ("finished", "failed", "cancelled"):
+            pass
+        return summary
+
+    async def submit_job(self, config:dict = None, driver:str = None, device:str = None,
+                         directory:str = None, file_name:str = None, mode:str = "HDF5", 
+                         **save_kwargs) -> str:
+        """Queue a measurement on the server, see API_Connection.submit_job."""
+        json = job_json(config, driver, device, directory, file_name, mode, save_kwargs)
+        return self.response_handler(await self.client.post("/jobs", json=json))
+
+    async def list_jobs(self) -> list[dict]:
+        """All jobs of the server in the order of submission, see get_job."""
+        return self.response_handler(await self.client.get("/jobs"))
+
+    async def get_job(self, job_id:str, timeout:float = 0) -> dict:
+        """Status of a job, see API_Connection.get_job."""
+        r = await self.client.get(f"/jobs/{job_id}", params={"timeout": timeout},
+                                  timeout=timeout + self.timeout)
+        return self.response_handler(r)
+
+    async def cancel_job(self, job_id:str):
+        """Remove a pending job from the queue or stop it, if it is running."""
+        log.info(self.response_handler(await self.client.post(f"/jobs/{job_id}/cancel")))
+
+    async def wait_for_job(self, job_id:str, poll_timeout:float = 30) -> dict:
+        """Waits until the job is done and returns its status, see get_job."""
+        while (job := await self.get_job(job_id, timeout=poll_timeout))["status"] not in JOB_DONE:
+            pass
+        return job
+
+    async def get_array(self, name:str, job_id:str = None, **params) -> np.ndarray:
+        """Download an array of the data handler on the server, see API_Connection.get_array."""
+        r = await self.client.get(data_path(name, job_id), 
+                                  params={key: value for key, value in params.items() 
+                                          if value is not None})
+        if r.status_code != 200:
+            self.response_handler(r)
+        return array_from_response(r)
+
+    async def get_voltage_data(self, averages:slice = slice(None), samples:slice = slice(None),
+                         job_id:str = None) -> np.ndarray:
+        """Download the measured data with shape (averages, samples)."""
+        return await self.get_array("voltage_data", job_id,
+                                    average_start=averages.start, average_stop=averages.stop,
+                                    sample_start=samples.start, sample_stop=samples.stop)
+
+    async def get_psds(self, averages:slice = slice(None), f_min:float = None, f_max:float = None,
+                 job_id:str = None) -> np.ndarray:
+        """Download the PSD of each average between f_min and f_max (in Hz)."""
+        return await self.get_array("psds", job_id, average_start=averages.start, average_stop=averages.stop,
+                                    f_min=f_min, f_max=f_max)
+
+    async def get_psd(self, f_min:float = None, f_max:float = None, job_id:str = None,
+                      raw:bool = False) -> np.ndarray:
+        """Download the averaged PSD between f_min and f_max (in Hz), see API_Connection.get_psd."""
+        return await self.get_array("psd_raw" if raw else "psd", job_id, f_min=f_min, f_max=f_max)
+
+    async def get_frequencies(self, f_min:float = None, f_max:float = None, job_id:str = None) -> np.ndarray:
+        """Download the frequencies of the PSD between f_min and f_max (in Hz)."""
+        return await self.get_array("frequencies", job_id, f_min=f_min, f_max=f_max)
+
+    async def get_allan_deviation(self, job_id:str = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Download taus, adev and mdev, see API_Connection.get_allan_deviation."""
+        return tuple([await self.get_array(name, job_id) for name in ("taus", "adev", "mdev")])
+
+    async def metrics(self) -> str:
+        """Performance metrics of the server in the Prometheus text format."""
+        r = await self.client.get("/metrics")
+        if r.status_code != 200:
+            self.response_handler(r)
+        return r.text
+
+    async def enable_plotting(self, signal_enabled:bool, spectrum_enabled:bool, allan_enabled:bool = None):
+        """Enable or disable plotting of the signal, the spectrum and the Allan deviation."""
+        r = await self.client.post("/enable_plotting", json={"signal": signal_enabled,
+                                                             "spectrum": spectrum_enabled,
+                                                             "allan": allan_enabled})
+        log.info(self.response_handler(r))
+
+    async def wait_for_measurement(self, timeout:float = None, poll_timeout:float = 30) -> dict:
+        """Wait for the measurement to finish, see API_Connection.wait_for_measurement."""
+        deadline = None if timeout is None else perf_counter() + timeout
+        while True:
+            wait_time = self.wait_timeout(deadline, poll_timeout)
+            r = await self.client.get("/wait", params={"timeout": wait_time}, 
+                                      timeout=wait_time + self.timeout)
+            result = self.response_handler(r)
+            if not result["running"]:
+                break
+            if deadline is not None and perf_counter() >= deadline:
+                raise TimeoutError("Measurement still running")
+
+        log.info("Measurement {}".format(result.get("status", "finished")))
+        return result
+
+    async def connect_device(self, driver:str, device:str):
+        """Connect to the device with the given driver."""
+        r = await self.client.post("/connect_device", json={"driver": driver,
+                                                            "device": device})
+        log.info(self.response_handler(r))
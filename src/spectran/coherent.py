@@ -0,0 +1,113 @@
+"""This module contains the coherent time-domain averaging of triggered records.
+
+Records that are locked to a reference are averaged sample by sample, which
+suppresses the uncorrelated noise by sqrt(N) while the locked signal is kept.
+It is enabled with the config entry "coherent_averaging" and the records are
+aligned by the config entry "trigger":
+
+- hardware trigger, e.g. {"source": "/Dev1/PFI0"} (NI-DAQmx start trigger) or
+  {"source": "TRIG", "level": 0.5, "slope": "rising"} (NI-SCOPE edge trigger):
+  the records start at the trigger and are averaged as they are
+- software trigger {"source": "software", "level": 0.0, "slope": "rising", "window": 0.01}:
+  the first crossing of level within the first window seconds (default: a tenth of
+  the record) is searched in each record, which is aligned to it with sub-sample
+  precision. The averaged record is shorter than the acquired one by the window.
+  Records without a crossing are rejected.
+
+Only the running mean and two acquisition buffers are held in memory,
+so the memory does not grow with the number of averages.
+"""
+
+import numpy as np
+
+from . import log, ureg
+
+
+class CoherentAverager():
+    """Running mean of aligned records.
+
+    Args:
+        samples (int): number of acquired samples per record
+        sample_rate (float): sample rate in Hz
+        trigger (dict, optional): config entry "trigger". Defaults to None (no alignment).
+        slots (int, optional): acquisition buffers, one is acquired while
+            the other one is averaged. Defaults to 2.
+    """
+
+    def __init__(self, samples:int, sample_rate:float, trigger:dict=None, slots:int=2) -> None:
+        trigger = trigger or {}
+        self.software = trigger.get("source") == "software"
+        self.level = magnitude(trigger.get("level", 0.0), ureg.volt)
+        self.slope = trigger.get("slope", "rising")
+        if self.slope not in ("rising", "falling"):
+            raise ValueError(f"Unknown trigger slope {self.slope}, use rising or falling")
+        self.window = 0
+        if self.software:
+            window = magnitude(trigger.get("window", 0.1 * samples / sample_rate), ureg.second)
+            self.window = int(window * sample_rate)
+            if not 1 <= self.window < samples - 1:
+                raise ValueError("The trigger window has to be shorter than the record")
+        self.length = samples - self.window # samples of the averaged record
+        self.slots = slots
+        self.buffers = np.empty((slots, samples))
+        self.count = 0 # number of averaged records
+        self.rejected = 0 # number of records without trigger
+
+    def buffer(self, index:int) -> np.ndarray:
+        """Buffer into which the record with the given index is acquired."""
+        return self.buffers[index % self.slots]
+
+    def accumulate(self, index:int, mean:np.ndarray) -> bool:
+        """Aligns the acquired record and adds it to the running mean in place.
+
+        Args:
+            index (int): index of the record
+            mean (np.ndarray): running mean with self.length samples
+
+        Returns:
+            bool: False if the record was rejected, because it has no trigger
+        """
+        record = self.buffer(index)
+        if self.software:
+            position = find_trigger(record[:self.window+1], self.level, self.slope)
+            if position is None:
+                self.rejected += 1
+                log.warning("No trigger found in average {}, it is skipped".format(index+1))
+                return False
+            # linear interpolation between the samples around the crossing
+            start = min(int(position), self.window - 1)
+            fraction = position - start
+            aligned = record[start:start+self.length] * (1 - fraction)
+            aligned += fraction * record[start+1:start+1+self.length]
+        else:
+            # the buffer is not needed afterwards, so it is used as temporary array
+            aligned = record[:self.length]
+        aligned -= mean
+        aligned /= self.count + 1
+        mean += aligned
+        self.count += 1
+        return True
+
+
+def find_trigger(record:np.ndarray, level:float, slope:str="rising") -> float|None:
+    """Position of the first crossing of level in samples, interpolated linearly.
+
+    Returns:
+        float|None: position between two samples or None if there is no crossing
+    """
+    above = record >= level
+    if slope == "rising":
+        crossings = np.flatnonzero(~above[:-1] & above[1:])
+    else:
+        crossings = np.flatnonzero(above[:-1] & ~above[1:])
+    if len(crossings) == 0:
+        return None
+    k = crossings[0]
+    return k + (level - record[k]) / (record[k+1] - record[k])
+
+
+def magnitude(value, unit) -> float:
+    """Magnitude of a pint quantity in unit or the value itself."""
+    if isinstance(value, ureg.Quantity):
+        return value.to(unit).magnitude
+    return float(value)
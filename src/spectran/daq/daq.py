@@ -6,11 +6,13 @@ from enum import Enum
 
 from abc import ABC, abstractmethod
 import numpy as np
-from PySide6.QtCore import Signal
 
 class DAQ(ABC):
     
     connected_device: str = None
+    # records are read in chunks of this duration in seconds,
+    # a running measurement can be stopped between chunks
+    chunk_duration: float = 0.1
     
     @abstractmethod
     def list_devices(self) -> list[str]:
@@ -49,21 +51,45 @@ class DAQ(ABC):
     def get_sequence(self, data_holder:np.ndarray, 
                      average_index:int,
                      config:dict,
-                     main_window,
-                     plotting_signal:Signal) -> np.ndarray:
+                     engine=None) -> int:
         """Get data from DAQ device
 
         Args:
             data_holder (np.ndarray): array to store data, one-dimensional
             average_index (int): index of average
-            config (dict): configuration dictionary
-            plotting_signal (Signal): signal to emit when to plot. 
-                    This is filled automatically by the Worker class 
+            config (dict): configuration dictionary, 
+                the real values of the device are written into it (e.g. sample_rate_real)
+            engine (MeasurementEngine, optional): engine that runs the measurement. 
+                The device_status event is emitted when the real values are known.
+                The acquisition should be aborted between chunks when engine.stopped is set.
 
         Returns:
-            np.ndarray: data_holder with data
+            int: number of acquired samples, 
+                less than len(data_holder) if the acquisition was aborted
         """
 
+    def chunks(self, samples:int, sample_rate:float):
+        """Splits a record into chunks of about self.chunk_duration.
+
+        Args:
+            samples (int): number of samples of the record
+            sample_rate (float): sample rate in Hz
+
+        Yields:
+            tuple[int, int]: first and last sample (exclusive) of each chunk
+        """
+        size = max(1, int(self.chunk_duration * sample_rate))
+        for start in range(0, samples, size):
+            yield start, min(start + size, samples)
+
+def hardware_trigger(config:dict) -> dict|None:
+    """Returns the config entry "trigger" if the records should be started 
+    by a hardware trigger, see spectran.coherent."""
+    trigger = config.get("trigger")
+    if not trigger or trigger.get("source") in (None, "software"):
+        return None
+    return trigger
+
 import time
 class DummyDAQ(DAQ):
      
@@ -83,34 +109,35 @@ class DummyDAQ(DAQ):
     def get_sequence(self, data_holder:np.ndarray,
                      average_index:int, 
                      config:dict,
-                     main_window,
-                     plotting_signal:Signal):
+                     engine=None):
         
         start_time = time.time()
         duration = config["duration"].to(ureg.second).magnitude
         sample_rate = config["sample_rate"].to(ureg.Hz).magnitude
         averages = config["averages"]
         
-         # set gui information
+        # set device information
         config["sample_rate_real"] = config["sample_rate"]
-        main_window.main_ui.sample_rate_status.setText(f"{config['sample_rate_real'].to(ureg.Hz).magnitude:6g}")
-
         config["signal_range_min_real"] = config["signal_range_min"]
         config["signal_range_max_real"] = config["signal_range_max"]
-        main_window.main_ui.range_min_status.setText(f"{config['signal_range_min_real'].to(ureg.volt).magnitude:.6g}")
-        main_window.main_ui.range_max_status.setText(f"{config['signal_range_max_real'].to(ureg.volt).magnitude:.6g}")
+        if engine is not None:
+            engine.emit("device_status", config)
         
         # this is where the data is acquired
-        data_holder[:] = self.acquire(duration, sample_rate)
-        end_time = time.time()
+        signal = self.acquire(duration, sample_rate)
         
-        # simulate length
-        waiting_time = duration - (end_time - start_time)
-        if waiting_time > 0:
-            time.sleep(waiting_time)
+        for start, stop in self.chunks(len(data_holder), sample_rate):
+            if engine is not None and engine.stopped:
+                log.info(f"{average_index+1}/{averages} aborted after {start} samples")
+                return start
+            data_holder[start:stop] = signal[start:stop]
+            # simulate length
+            waiting_time = stop / sample_rate - (time.time() - start_time)
+            if waiting_time > 0:
+                time.sleep(waiting_time)
         
-        log.info(f"Emit at {average_index+1}/{averages} - {(time.time()-start_time)*1e3:.2f} ms")
-        plotting_signal.emit(average_index)
+        log.info(f"{average_index+1}/{averages} done - {(time.time()-start_time)*1e3:.2f} ms")
+        return len(data_holder)
         
     def acquire(self, duration, sample_rate) -> np.ndarray:
         """A wrapper function to simulate data acquisition. 
@@ -1,11 +1,12 @@
 from nidaqmx import Task
 from nidaqmx.system import System, Device
 from nidaqmx.stream_readers import AnalogSingleChannelReader
-from nidaqmx.constants import TerminalConfiguration
+from nidaqmx.constants import TerminalConfiguration, Edge, Slope
 import numpy as np
 
 from .. import log, ureg
-from .daq import DAQ
+from ..coherent import magnitude
+from .daq import DAQ, hardware_trigger
 
 class NIDAQMX(DAQ):
 
@@ -47,8 +48,7 @@ class NIDAQMX(DAQ):
     def get_sequence(self, data_holder: np.ndarray, 
                      average_index: int, 
                      config: dict, 
-                     main_window,
-                     plotting_signal) -> np.ndarray:
+                     engine=None) -> int:
         
         duration = config["duration"].to(ureg.second).magnitude
         sample_rate = config["sample_rate"].to(ureg.Hz).magnitude
@@ -74,30 +74,50 @@ class NIDAQMX(DAQ):
             )
 
 
+            trigger = hardware_trigger(config)
+            if trigger is not None:
+                rising = trigger.get("slope", "rising") == "rising"
+                if "level" in trigger:
+                    read_task.triggers.start_trigger.cfg_anlg_edge_start_trig(
+                        trigger_source=trigger["source"],
+                        trigger_slope=Slope.RISING if rising else Slope.FALLING,
+                        trigger_level=magnitude(trigger["level"], ureg.volt))
+                else:
+                    read_task.triggers.start_trigger.cfg_dig_edge_start_trig(
+                        trigger_source=trigger["source"],
+                        trigger_edge=Edge.RISING if rising else Edge.FALLING)
+                log.info("Start trigger: {}".format(trigger))
+
             # Log the actual settings
             config["sample_rate_real"] = read_task.timing.samp_clk_rate * ureg.Hz
             log.info("Sample Rate: {} Hz".format(read_task.timing.samp_clk_rate))
-            main_window.main_ui.sample_rate_status.setText(f"{config['sample_rate_real']:6g}")
 
-            # set gui information
+            # set device information
             config["signal_range_min_real"] = aichan.ai_min * ureg.volt
             config["signal_range_max_real"] = aichan.ai_max * ureg.volt
             log.info("AI Min: {}".format(config["signal_range_min_real"]))
             log.info("AI Max: {}".format(config["signal_range_max_real"]))
-            main_window.main_ui.range_min_status.setText(f"{config['signal_range_min_real'].to(ureg.volt).magnitude:.6g}")
-            main_window.main_ui.range_max_status.setText(f"{config['signal_range_max_real'].to(ureg.volt).magnitude:.6g}")
+            if engine is not None:
+                engine.emit("device_status", config)
 
             reader = AnalogSingleChannelReader(task_in_stream=read_task.in_stream)
-
-            reader.read_many_sample(data=data_holder,
-                                    number_of_samples_per_channel=int(sample_rate*duration),
-                                    timeout=2*duration)
+            read_task.start()
+
+            # read in chunks to be able to abort the task mid-record
+            sample_rate_real = read_task.timing.samp_clk_rate
+            for start, stop in self.chunks(len(data_holder), sample_rate_real):
+                if engine is not None and engine.stopped:
+                    read_task.stop()
+                    log.info(f"{average_index+1}/{averages} aborted after {start} samples")
+                    return start
+                timeout = max(2*(stop-start)/sample_rate_real, 1)
+                if start == 0 and trigger is not None:
+                    # the acquisition waits for the trigger
+                    timeout += trigger.get("timeout", 10)
+                reader.read_many_sample(data=data_holder[start:stop],
+                                        number_of_samples_per_channel=stop-start,
+                                        timeout=timeout)
             
             log.info(f"{average_index+1}/{averages} done.")
 
-        plotting_signal.emit(average_index)
-
-            
-
-
-        
\ No newline at end of file
+        return len(data_holder)
@@ -1,11 +1,11 @@
 import niscope
 from niscope import TerminalConfiguration
 import numpy as np
-from PySide6.QtCore import Signal
 import nisyscfg
 
-from .daq import DAQ
+from .daq import DAQ, hardware_trigger
 from .. import log, ureg
+from ..coherent import magnitude
 
 class NISCOPE(DAQ):
     
@@ -41,8 +41,7 @@ class NISCOPE(DAQ):
     def get_sequence(self, data_holder:np.ndarray, 
                      average_index: int,
                      config:dict,
-                     main_window,
-                     plotting_signal:Signal = None) -> np.ndarray:
+                     engine=None) -> int:
         
         # configuration
         duration = config["duration"].to(ureg.second).magnitude
@@ -62,17 +61,28 @@ class NISCOPE(DAQ):
             session.channels[channel].configure_vertical(range=v_range,
                                                          offset=v_offset,
                                                          coupling=niscope.VerticalCoupling.DC)
+            trigger = hardware_trigger(config)
+            ref_position = 50.0
+            if trigger is not None:
+                rising = trigger.get("slope", "rising") == "rising"
+                session.configure_trigger_edge(trigger_source=trigger["source"],
+                                               level=magnitude(trigger.get("level", 0.0), ureg.volt),
+                                               trigger_coupling=niscope.TriggerCoupling.DC,
+                                               slope=niscope.TriggerSlope.POSITIVE if rising 
+                                                     else niscope.TriggerSlope.NEGATIVE)
+                # the record starts at the trigger unless pre-trigger samples are requested
+                ref_position = float(trigger.get("pre_trigger", 0.0))
+                log.info("Edge trigger: {}".format(trigger))
             session.configure_horizontal_timing(min_sample_rate=sample_rate, 
                                                 min_num_pts=int(sample_rate*duration), 
                                                 num_records=1, 
-                                                # TODO: find out what these do
-                                                ref_position=50.0, 
+                                                # position of the trigger in percent of the record
+                                                ref_position=ref_position, 
                                                 enforce_realtime=True)
 
-            # set gui information
+            # set device information
             config["sample_rate_real"] = session.horz_sample_rate * ureg.Hz
             log.debug("Sample Rate: {}".format(config["sample_rate_real"]))
-            main_window.main_ui.sample_rate_status.setText(f"{session.horz_sample_rate:6g}")
 
             vertical_range = session.channels[channel].vertical_range
             vertical_offset = session.channels[channel].vertical_offset
@@ -80,22 +90,34 @@ class NISCOPE(DAQ):
                                                         vertical_offset))
             config["signal_range_min_real"] = (vertical_offset - vertical_range / 2) * ureg.volt
             config["signal_range_max_real"] = (vertical_offset + vertical_range / 2) * ureg.volt
-            main_window.main_ui.range_min_status.setText(f"{config['signal_range_min_real'].to(ureg.volt).magnitude:.6g}")
-            main_window.main_ui.range_max_status.setText(f"{config['signal_range_max_real'].to(ureg.volt).magnitude:.6g}")
+            if engine is not None:
+                engine.emit("device_status", config)
            
            # start measurement
             with session.initiate():
-                log.debug(f'Starting acquisition')                
-                waveforms = session.channels[channel].fetch_into(waveform=data_holder, 
-                                                                 num_records=1,
-                                                                 timeout=duration*2
-                                                                )
+                log.debug(f'Starting acquisition')
+                # fetch in chunks to be able to abort the session mid-record
+                sample_rate_real = session.horz_sample_rate
+                for start, stop in self.chunks(len(data_holder), sample_rate_real):
+                    if engine is not None and engine.stopped:
+                        # leaving the initiate context aborts the acquisition
+                        log.info(f"{average_index+1}/{averages} aborted after {start} samples")
+                        return start
+                    timeout = max(2*(stop-start)/sample_rate_real, 1)
+                    if start == 0 and trigger is not None:
+                        # the acquisition waits for the trigger
+                        timeout += trigger.get("timeout", 10)
+                    waveforms = session.channels[channel].fetch_into(waveform=data_holder[start:stop], 
+                                                                     relative_to=niscope.FetchRelativeTo.PRETRIGGER,
+                                                                     offset=start,
+                                                                     num_records=1,
+                                                                     timeout=timeout
+                                                                    )
             for i in range(len(waveforms)):
                 log.debug(f'Waveform {i} information:')
                 log.debug(f'{waveforms[i]}')
             
 
             log.info(f"{average_index+1}/{averages} done.")
-    
-        if plotting_signal is not None:
-            plotting_signal.emit(average_index)
\ No newline at end of file
+
+        return len(data_holder)
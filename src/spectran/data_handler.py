@@ -1,24 +1,51 @@
-"""This class should contain all data related functionality."""
+"""This class should contain all data related functionality.
+It does not depend on Qt, so it can be used without the GUI."""
 from . import log, ureg
-from scipy.signal import periodogram
 import numpy as np 
-from PySide6.QtWidgets import QFileDialog
-import h5py
 from pathlib import Path
 from enum import Enum
+import re
+import time
+from .allan import AllanDeviation
+from .averaging import Averager, LinearAverage, make_averager
+from .calibration import Calibration, from_config as calibration_from_config
+from .coherent import CoherentAverager
+from .envelope import EnvelopePyramid
+from .filters import FilterChain
+from .metrics import PSD_SECONDS, FILTER_SECONDS, SAVE_SECONDS, BYTES_WRITTEN
+from .profiling import span
 SAVING_MODES = Enum("SavingModes", "PLAIN_TEXT NP_BINARY NP_COMPRESSED HDF5")
 
+# config entries that are stored as pint quantities
+QUANTITY_KEYS = ("duration", "sample_rate", "sample_rate_real",
+                 "signal_range_min", "signal_range_max",
+                 "signal_range_min_real", "signal_range_max_real")
+
 class DataHandler():
 
     voltage_data = None
     done_indices:set = set() # set of indices that have been calculated
     time_seq = None
     frequencies = None
-    psd = None
+    psd = None # averaged psd, corrected with the calibration
+    psd_raw = None # averaged psd without calibration, psd itself if there is none
+    calibration:Calibration = None # transfer function that the psd is corrected with
     _config = dict()
+    _h5_file = None # open HDF5 file of a loaded measurement
+    catalog = None # Catalog in which saved files are registered
+    envelope:EnvelopePyramid = None # min/max envelopes of the records
+    allan:AllanDeviation = None # Allan deviations accumulated over the records
+    coherent:CoherentAverager = None # running mean of triggered records in the coherent mode
+    filters:FilterChain = None # applied to each record of a measurement as it arrives
+    partial_record = None # samples of an average that was stopped before it was complete
+    stop_plotting = False # skip the calculation of single averages
+    compute_psd = True # calculate the psd of each average during the measurement
+    averager = None # combines the psds of the averages, see spectran.averaging
+    compute_allan = False # accumulate the Allan deviations of each average during the measurement
 
-    def __init__(self, main_window) -> None:
-        self.main_window = main_window
+    def __init__(self, engine=None) -> None:
+        # the MeasurementEngine that is notified about new data
+        self.engine = engine
 
     # config setter and getter    
     @property
@@ -34,13 +61,21 @@ class DataHandler():
             self._config["duration"].to(ureg.second).magnitude, 
             int(self._config["duration"].to(ureg.second).magnitude * self._config["sample_rate"].to(ureg.Hz).magnitude))
 
+    @span("calculate_psd")
     def calculate_psd(self, index):
+        # scipy is imported when it is needed first, see preload_modules
+        from scipy.signal import periodogram
+        if index is None and self.psd is None and not self.done_indices:
+            # loaded file without the averaged psd
+            if self.psds is None:
+                return self.recalculate_psd()
+            return self.average_stored_psds()
         # if index is None, calculate the psd for all averages
         # but only if the psd has not been calculated yet 
         n = len(self.done_indices)
         
         # if the user wants to stop plotting, calculate the psd for all averages
-        if self.main_window.main_ui.stop_plotting:
+        if self.stop_plotting:
             if index is not None:
                 log.debug("Abort calculating PSD at index {}".format(index))
                 return
@@ -57,91 +92,201 @@ class DataHandler():
                 return self.frequencies, self.psd
             self.frequencies, self.psds[undone_idxs] = periodogram(self.voltage_data[undone_idxs], 
                                                 fs=self._config["sample_rate"].to(ureg.Hz).magnitude)
-            self.psd = np.mean(self.psds, axis=0)
+            for i in sorted(undone_idxs):
+                self.averager.update(self.psds[i])
+            self.psd_raw = self.averager.result
+            self.calibrate()
             index = self.psds.shape[0]-1
             
             log.debug("All PSDs calculated ({}/{} at the end)".format(len(undone_idxs), n))
             
         else:
             # calculate the psd for current index
-            if self.main_window.main_ui.plot_spectrum_cb.isChecked():
+            if self.compute_psd:
                 self.frequencies, self.psds[index] = periodogram(self.voltage_data[index], 
                                                     fs=self._config["sample_rate"].to(ureg.Hz).magnitude)
                 # calculate the average from previous psd
                 if index is not None:
                     self.done_indices.add(index)
                 
-                # iterative average
-                self.psd = self.psd * (n / (n+1)) + self.psds[index] / (n+1)
+                # iterative average, see spectran.averaging
+                self.psd_raw = self.averager.update(self.psds[index])
+                self.calibrate()
 
             log.debug("PSD calculated at index {}".format(index))
 
         return self.frequencies, self.psd
 
+    def average_stored_psds(self):
+        """Averages the psds of a loaded file one by one with the averager."""
+        self.averager.reset()
+        for psd_n in self.psds:
+            self.averager.update(psd_n)
+        self.psd_raw = self.averager.result
+        fs = self._config.get("sample_rate_real", self._config["sample_rate"]).to(ureg.Hz).magnitude
+        self.calibrate(fs)
+        self.done_indices = set(range(self.voltage_data.shape[0]))
+        log.debug("Averaged {} stored PSDs".format(len(self.psds)))
+        return self.frequencies, self.psd
+
     def initialize(self, averages, duration, sample_rate):
         # delete old data
+        self.close_file()
         self.voltage_data = None
         self.psds = None
         self.psd = None
+        self.psd_raw = None
+        self.partial_record = None
         
-        self.voltage_data = np.empty((averages, int(duration * sample_rate)))
-        self.psds = np.empty(((averages, int(duration * sample_rate)//2+1)))
-        self.psd = np.zeros((int(duration * sample_rate)//2+1))
+        samples = int(duration * sample_rate)
+        self.coherent = None
+        if self._config.get("coherent_averaging"):
+            # the records are acquired into buffers and only their mean is stored
+            self.coherent = CoherentAverager(samples, sample_rate, self._config.get("trigger"))
+            averages, samples = 1, self.coherent.length
+            self.voltage_data = np.zeros((averages, samples))
+            self.time_seq = self.time_seq[:samples]
+        else:
+            self.voltage_data = np.empty((averages, samples))
+        self.psds = np.empty(((averages, samples//2+1)))
+        self.psd_raw = np.zeros((samples//2+1))
+        self.psd = self.psd_raw
+        # invalid calibrations fail the measurement here
+        self.calibration = calibration_from_config(self._config.get("calibration"))
         self.done_indices = set()
+        # invalid averaging modes fail the measurement here
+        self.averager = make_averager(self._config.get("averaging"), duration)
+        self.envelope = EnvelopePyramid(averages, samples)
+        self.allan = AllanDeviation(sample_rate, samples)
+        # a new chain starts with a new state, invalid filters fail the measurement here
+        filters = self._config.get("filters")
+        self.filters = FilterChain.from_config(filters, sample_rate) if filters else None
         
     def calculate_data(self, index:int, ignore_check:bool = True, progress_callback=None):
         """Calculates the PSD of the data and stores it in the 
-        psd attribute only if the plotting of psd is enabled.
+        psd attribute only if compute_psd is enabled.
+        A new average is filtered in place first, if filters are configured.
+        The Allan deviations are accumulated if compute_allan is enabled.
+        In the coherent mode, the average is added to the coherent mean instead
+        and the psd of the mean is calculated.
+        The engine is notified with the data_updated event.
 
         Args:
-            data (np.ndarray): one dimensional array of data 
-                if data is None, only the psd is calculated
-            index (int): average index of data
-            ignore_check (bool): if True, the psd is calculated regardless of the plotting setting
-            progress_callback (Signal): _description_
+            index (int): average index of data, 
+                if index is None, the psd is calculated for all averages
+            ignore_check (bool): if True, the psd is calculated regardless of compute_psd
+            progress_callback (Signal): filled automatically by the Worker class
         """
         # if there is no data, we dont calculate the psd
         if self.voltage_data is None:
             raise ValueError("No data to calculate")
         
-        if (ignore_check 
-            or self.main_window.main_ui.plot_spectrum_cb.isChecked()):
-            self.calculate_psd(index)
+        if index is not None:
+            if self.filters is not None:
+                with FILTER_SECONDS.time():
+                    self.filters.apply(self.acquisition_buffer(index))
+            if self.coherent is not None:
+                self.accumulate_coherent(index)
+            else:
+                self.envelope.update(index, self.voltage_data[index])
+                if self.compute_allan:
+                    self.allan.update(index, self.voltage_data[index])
+        elif self.compute_allan:
+            self.allan_deviation()
+        
+        if ignore_check or self.compute_psd:
+            with PSD_SECONDS.time():
+                if self.coherent is not None:
+                    self.calculate_coherent_psd(index)
+                else:
+                    self.calculate_psd(index)
+            
+        if self.engine is not None:
+            self.engine.emit("data_updated", index)
+
+    def acquisition_buffer(self, index:int) -> np.ndarray:
+        """Array into which the driver writes the average with the given index."""
+        if self.coherent is not None:
+            return self.coherent.buffer(index)
+        return self.voltage_data[index]
+
+    def record(self, index:int) -> np.ndarray:
+        """The average with the given index or the coherent mean in the coherent mode."""
+        return self.voltage_data[0 if self.coherent is not None else index]
+
+    def accumulate_coherent(self, index:int):
+        """Adds the acquired average to the coherent mean, see CoherentAverager."""
+        if not self.coherent.accumulate(index, self.voltage_data[0]):
+            return
+        self.done_indices.add(index)
+        self._config["coherent_records"] = self.coherent.count
+        self.envelope.update(0, self.voltage_data[0])
 
-    def save_file(self, file_path:str|Path=None, 
+    def calculate_coherent_psd(self, index:int|None):
+        """Calculates the psd of the coherent mean. During the measurement,
+        it is skipped if stop_plotting is set, like in calculate_psd."""
+        from scipy.signal import periodogram
+        if (self.stop_plotting and index is not None) or not self.done_indices:
+            return
+        self.frequencies, self.psds[0] = periodogram(self.voltage_data[0], 
+                                                     fs=self._config["sample_rate"].to(ureg.Hz).magnitude)
+        self.psd_raw = self.psds[0]
+        self.calibrate()
+        return self.frequencies, self.psd
+
+    def calibrate(self, sample_rate:float=None, samples:int=None):
+        """Sets psd to psd_raw corrected with the calibration. The correction is
+        interpolated once per FFT length and sample rate (see Calibration.correction),
+        so an update of the psd costs one multiplication.
+
+        Args:
+            sample_rate (float, optional): sample rate of the psd in Hz. 
+                Defaults to the sample rate of the config.
+            samples (int, optional): length of the FFT of the psd. 
+                Defaults to the length of the records.
+        """
+        if self.calibration is None or self.psd_raw is None:
+            self.psd = self.psd_raw
+            return
+        if sample_rate is None:
+            sample_rate = self._config["sample_rate"].to(ureg.Hz).magnitude
+        correction = self.calibration.correction(samples or self.voltage_data.shape[1], sample_rate)
+        if self.psd is None or self.psd is self.psd_raw or self.psd.shape != self.psd_raw.shape:
+            self.psd = np.empty_like(self.psd_raw)
+        np.multiply(self.psd_raw, correction, out=self.psd)
+
+    def set_calibration(self, calibration, sample_rate:float=None):
+        """Sets the calibration (a Calibration or a value of the config entry 
+        "calibration", None removes it) and corrects the current psd with it."""
+        if not isinstance(calibration, Calibration):
+            calibration = calibration_from_config(calibration)
+        self.calibration = calibration
+        self.calibrate(sample_rate)
+
+    @span("save_file")
+    def save_file(self, file_path:str|Path, 
                   mode:SAVING_MODES=SAVING_MODES.PLAIN_TEXT,
                   save_psds:bool=False,
-                  save_time_line:bool=False):
-        """Saves the data to a file. If no file_path is given, a file dialog is opened.
+                  save_time_line:bool=False,
+                  save_envelope:bool=False,
+                  save_allan:bool=False):
+        """Saves the data to a file.
 
         Args:
-            file_path (str|Path, optional): where to save file. Defaults to None.
+            file_path (str|Path): where to save file.
             mode: SAVING_MODES: how to save the file. Defaults to SAVING_MODES.PLAIN_TEXT.
-            save_psd (bool, optional): save the psd data. Defaults to False. Not Implemented.
-            save_time_line (bool, optional): save the time line. Defaults to False. Not Implemented.
+            save_psds (bool, optional): save the frequencies, the psds of the averages and 
+                the averaged psd, with psd_raw and the calibration if it is calibrated 
+                (only HDF5). Defaults to False.
+            save_time_line (bool, optional): save the time line (only HDF5). Defaults to False.
+            save_envelope (bool, optional): save the min/max envelopes for fast previews (only HDF5). Defaults to False.
+            save_allan (bool, optional): save the Allan deviations (only HDF5). Defaults to False.
         """
-        if not self.main_window.measurement_stopped:
-            self.main_window.raise_error("Measurement is still running. Stop it first.")            
-            return 
+        if self.engine is not None and self.engine.running:
+            raise RuntimeError("Measurement is still running. Stop it first.")
         
         if self.voltage_data is None:
-            self.main_window.raise_error("No data to save")
-            return
-        
-                
-        if file_path is None:
-            file_name = "output.txt"
-            match mode:
-                case SAVING_MODES.NP_BINARY:
-                    file_name = "output.npy"
-                case SAVING_MODES.NP_COMPRESSED:
-                    file_name = "output.npz"
-                case SAVING_MODES.HDF5:
-                    file_name = "output.h5"
-            file_path = self.save_file_dialog(file_name)
-        if file_path is None:
-            return
-        
+            raise ValueError("No data to save")
         
         self.file_path = Path(file_path)
         header_text = (f"Measurement with Driver:{self._config['driver']} on Device:{self._config['device']}\n"
@@ -154,6 +299,7 @@ class DataHandler():
             + f"Unit of Data: {self._config['unit']}\n"
             )
 
+        start_time = time.perf_counter()
         match mode:
             case SAVING_MODES.PLAIN_TEXT:
                 np.savetxt(self.file_path, 
@@ -176,42 +322,371 @@ class DataHandler():
                     f.write(header_text)
                     
             case SAVING_MODES.HDF5:
+                import h5py
                 with h5py.File(self.file_path, "w") as f:
                     if save_time_line:
                         f.create_dataset("time_seq", 
                                          data=self.time_seq)
                     f.create_dataset("voltage_data", 
                                      data=self.voltage_data)
-                    if save_psds:
+                    if save_psds and self.frequencies is not None:
                         f.create_dataset("frequencies",
                                          data=self.frequencies)
-                        f.create_dataset("psds", 
-                                         data=self.psds)
+                        if self.psds is not None:
+                            f.create_dataset("psds", 
+                                             data=self.psds)
+                        if self.psd is not None:
+                            # the corrected and the raw psd
+                            f.create_dataset("psd", data=self.psd)
+                            if self.calibration is not None:
+                                f.create_dataset("psd_raw", data=self.psd_raw)
+                                self.calibration.to_hdf5(f.create_group("calibration"))
+                    if save_envelope:
+                        for index in set(range(self.voltage_data.shape[0])) - self.envelope.done:
+                            self.envelope.update(index, self.voltage_data[index])
+                        self.envelope.to_hdf5(f.create_group("envelope"))
+                    if save_allan:
+                        self.allan_deviation()
+                        self.allan.to_hdf5(f.create_group("allan"))
                     # Add header information as attributes
                     for key, value in self._config.items():
                         f.attrs[key] = str(value)
                     
+        SAVE_SECONDS.labels(mode=mode.name).observe(time.perf_counter() - start_time)
+        written = self.file_path.stat().st_size if self.file_path.exists() else 0
+        if mode in (SAVING_MODES.NP_BINARY, SAVING_MODES.NP_COMPRESSED):
+            written += Path(meta_file).stat().st_size
+        BYTES_WRITTEN.inc(written)
+        
+        if self.catalog is not None:
+            self.catalog.register(self.file_path, self._config, self.voltage_data,
+                                  self.frequencies, self.psd)
         
-        # self.main_window.statusBar().showMessage(f"Data saved to {self.file_path}")
         log.info("Data saved to {}".format(self.file_path))
+        if self.engine is not None:
+            self.engine.emit("status", f"Data saved to {self.file_path}")
         return self.file_path
     
-    def save_file_dialog(
-        self, file_name="output.txt", extensions="Data-File (*.txt *.dat *.npy *.npz *.h5);;All Files (*)"
-    ):
-        filename, _ = QFileDialog.getSaveFileName(
-            self.main_window.main_ui, "Save", file_name, extensions
-        )
-        if filename:
-            return filename
-        
-    def cut_data(self, index):
-        """cuts data self.voltage_data[:index] and self.psds[:index]
+    def snapshot(self) -> "DataHandler":
+        """Returns a DataHandler without engine that shares the current data.
+        The arrays are not copied, as the next measurement allocates new ones
+        (see initialize), so the snapshot can be saved while the next one runs."""
+        snapshot = DataHandler()
+        for attribute in ("voltage_data", "psds", "psd", "frequencies", "time_seq", 
+                          "done_indices", "envelope", "allan", "psd_raw", "calibration", "partial_record", "catalog"):
+            setattr(snapshot, attribute, getattr(self, attribute, None))
+        snapshot._config = dict(self._config)
+        return snapshot
+
+    def cut_data(self, index:int, samples:int=None):
+        """Keeps only the first averages self.voltage_data[:index] and self.psds[:index].
+
+        If the average at index was stopped during the acquisition, 
+        its first samples are kept as well. Without complete averages, it becomes 
+        the only average and the duration is shortened accordingly. 
+        Otherwise it is stored in self.partial_record, as it does not fit 
+        to the other averages.
 
         Args:
-            index (_type_): _description_
+            index (int): number of complete averages
+            samples (int, optional): number of acquired samples of the average at index. 
+                Defaults to None.
         """
-        if self.voltage_data.shape[0] > index+1:
+        if self.coherent is not None:
+            # partial records are not averaged, the mean is only kept if it is not empty
+            if not self.done_indices:
+                self.voltage_data = self.voltage_data[:0]
+                self.psds = self.psds[:0]
+                self.envelope.cut(0)
+            return
+        if samples is not None and index < self.voltage_data.shape[0] and samples > 0:
+            if self.filters is not None:
+                self.filters.apply(self.voltage_data[index, :samples])
+            if index == 0:
+                sample_rate = self._config["sample_rate"].to(ureg.Hz).magnitude
+                self._config["duration"] = samples / sample_rate * ureg.second
+                self.time_seq = self.time_seq[:samples]
+                self.voltage_data = self.voltage_data[:1, :samples]
+                self.psds = np.empty((1, samples//2+1))
+                self.psd_raw = np.zeros(samples//2+1)
+                self.psd = self.psd_raw
+                self.done_indices = set()
+                self.averager.reset()
+                self.envelope = EnvelopePyramid(1, samples)
+                self.allan = AllanDeviation(sample_rate, samples)
+                return
+            self.partial_record = self.voltage_data[index, :samples].copy()
+            
+        if self.voltage_data.shape[0] > index:
             self.voltage_data = self.voltage_data[:index]
             self.psds = self.psds[:index]
-        
\ No newline at end of file
+            self.envelope.cut(index)
+
+    def signal_envelope(self, index:int, start:int, stop:int, pixels:int):
+        """Returns the min/max envelope of a part of a record for displaying it.
+        The envelope of the record is calculated if it does not exist yet.
+        See EnvelopePyramid.select for details.
+        """
+        index = index % self.voltage_data.shape[0]
+        if index not in self.envelope.done:
+            self.envelope.update(index, self.voltage_data[index])
+        return self.envelope.select(index, start, stop, pixels)
+
+    def allan_deviation(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the overlapping and modified Allan deviation of all records.
+        Records that have not been added yet are added first, see AllanDeviation.update.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: taus in seconds, adev and mdev
+        """
+        if self.voltage_data is None:
+            raise ValueError("No data to calculate")
+        if self.allan is None:
+            fs = self._config.get("sample_rate_real", self._config["sample_rate"]).to(ureg.Hz).magnitude
+            self.allan = AllanDeviation(fs, self.voltage_data.shape[1])
+        for index in sorted(set(range(self.voltage_data.shape[0])) - self.allan.done):
+            self.allan.update(index, self.voltage_data[index])
+        return self.allan.taus, self.allan.adev, self.allan.mdev
+
+    def load_file(self, file_path:str|Path, 
+                  recalculate_psd:bool=False,
+                  progress_callback=None):
+        """Loads a saved measurement for re-analysis. Records are only read
+        from disk when they are accessed (see open_measurement).
+        The configuration is restored from the `.metadata` file, 
+        the HDF5 attributes or the header of the text file.
+
+        Args:
+            file_path (str|Path): file to load
+            recalculate_psd (bool, optional): calculate the PSD of the loaded data. Defaults to False.
+            progress_callback (Signal): filled automatically by the Worker class
+
+        Returns:
+            Path: path of the loaded file
+        """
+        if self.engine is not None and self.engine.running:
+            raise RuntimeError("Measurement is still running. Stop it first.")
+        
+        file_path = Path(file_path)
+        if not file_path.exists():
+            raise FileNotFoundError(f"File {file_path} does not exist")
+        
+        self.close_file()
+        self.psds = None
+        self.psd = None
+        self.psd_raw = None
+        self.calibration = None
+        self.frequencies = None
+        
+        voltage_data, config, self._h5_file = open_measurement(file_path)
+        if self._h5_file is not None and "frequencies" in self._h5_file:
+            self.frequencies = self._h5_file["frequencies"][:]
+            if "psds" in self._h5_file:
+                self.psds = self._h5_file["psds"]
+            if "psd" in self._h5_file:
+                self.psd = self._h5_file["psd"][:]
+                self.psd_raw = self._h5_file["psd_raw"][:] if "psd_raw" in self._h5_file else self.psd
+        if self._h5_file is not None and "calibration" in self._h5_file:
+            self.calibration = Calibration.from_hdf5(self._h5_file["calibration"])
+        if self._h5_file is not None and "envelope" in self._h5_file:
+            self.envelope = EnvelopePyramid.from_hdf5(self._h5_file["envelope"])
+        else:
+            # it is calculated for each record when it is displayed
+            self.envelope = EnvelopePyramid(*voltage_data.shape)
+        if self._h5_file is not None and "allan" in self._h5_file:
+            self.allan = AllanDeviation.from_hdf5(self._h5_file["allan"])
+        else:
+            # it is calculated when it is requested, see allan_deviation
+            fs = config.get("sample_rate_real", config.get("sample_rate")).to(ureg.Hz).magnitude
+            self.allan = AllanDeviation(fs, voltage_data.shape[1])
+        
+        self.voltage_data = voltage_data
+        self.coherent = None
+        self._config = config
+        # the time sequence has to match the stored records
+        duration = config["duration"].to(ureg.second).magnitude
+        self.time_seq = np.linspace(0, duration, self.voltage_data.shape[1])
+        # without a stored psd, it is calculated by calculate_psd
+        self.done_indices = set(range(self.voltage_data.shape[0])) if self.psd is not None else set()
+        # the stored records are already filtered
+        self.filters = None
+        try:
+            self.averager = make_averager(config.get("averaging"), duration)
+        except ValueError:
+            # the mode is only restored if it was saved as name, e.g. "max"
+            log.warning("Averaging mode {} of {} is not restored".format(config.get("averaging"), file_path))
+            self.averager = LinearAverage()
+        self.file_path = file_path
+        log.info("Loaded {} with {} averages of {} samples".format(file_path, 
+                                                                  *self.voltage_data.shape))
+        
+        if recalculate_psd:
+            self.recalculate_psd()
+        return file_path
+
+    def recalculate_psd(self, averaging=None, **periodogram_kwargs):
+        """Recalculates the averaged PSD record by record. 
+        Only one record is held in memory at once, which allows 
+        reprocessing of loaded files that are larger than the RAM.
+        The individual psds are not kept.
+
+        Args:
+            averaging (str|dict, optional): averaging mode like the config entry "averaging",
+                see spectran.averaging. Defaults to None (linear).
+            periodogram_kwargs: passed to scipy.signal.periodogram, e.g. window or detrend
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: frequencies and averaged psd
+        """
+        if self.voltage_data is None:
+            raise ValueError("No data to calculate")
+        
+        fs = self._config.get("sample_rate_real", self._config["sample_rate"]).to(ureg.Hz).magnitude
+        duration = self.voltage_data.shape[1] / fs
+        frequencies, psd = averaged_psd(self.voltage_data, fs, make_averager(averaging, duration),
+                                        **periodogram_kwargs)
+            
+        self.psds = None
+        self.frequencies, self.psd_raw = frequencies, psd
+        # the frequencies of the psd depend on nfft
+        self.calibrate(fs, periodogram_kwargs.get("nfft"))
+        log.debug("Recalculated PSD of {} averages with {}".format(self.voltage_data.shape[0], 
+                                                                   periodogram_kwargs))
+        return self.frequencies, self.psd
+
+    def close_file(self):
+        """Closes the HDF5 file of a loaded measurement."""
+        if self._h5_file is not None:
+            self._h5_file.close()
+            self._h5_file = None
+
+
+
+def default_file_name(mode:SAVING_MODES) -> str:
+    """Default name of a file saved with the given mode."""
+    match mode:
+        case SAVING_MODES.NP_BINARY:
+            return "output.npy"
+        case SAVING_MODES.NP_COMPRESSED:
+            return "output.npz"
+        case SAVING_MODES.HDF5:
+            return "output.h5"
+    return "output.txt"
+
+
+def open_measurement(file_path:str|Path) -> tuple:
+    """Opens a file written by DataHandler.save_file without reading it into memory.
+    
+    `.npy` files are memory-mapped and HDF5 datasets are opened lazily.
+    `.npz` and plain text files have to be read into memory.
+
+    Args:
+        file_path (str|Path): file to open
+
+    Returns:
+        tuple: voltage data, configuration and the open HDF5 file (None for other formats)
+    """
+    file_path = Path(file_path)
+    h5_file = None
+    match file_path.suffix:
+        case ".npy":
+            voltage_data = np.load(file_path, mmap_mode="r")
+            config = read_metadata(str(file_path) + ".metadata")
+        case ".npz":
+            # compressed arrays can not be memory-mapped
+            with np.load(file_path) as f:
+                voltage_data = f["voltage_data"]
+            config = read_metadata(str(file_path) + ".metadata")
+        case ".h5":
+            import h5py
+            h5_file = h5py.File(file_path, "r")
+            voltage_data = h5_file["voltage_data"]
+            config = {key: parse_config_value(key, value) 
+                      for key, value in h5_file.attrs.items()}
+        case _:
+            voltage_data = np.loadtxt(file_path, delimiter="\t", ndmin=2).T
+            with open(file_path) as f:
+                header = [line[2:] for line in f if line.startswith("# ")]
+            config = parse_header(header)
+    return voltage_data, config, h5_file
+
+
+def preload_modules():
+    """Imports scipy.signal and h5py, which take about a second and are otherwise
+    imported by the first calculation or saving. Used during the startup of the GUI."""
+    import scipy.signal
+    import h5py
+
+
+def averaged_psd(voltage_data, fs:float, averager:Averager=None,
+                 **periodogram_kwargs) -> tuple[np.ndarray, np.ndarray]:
+    """Calculates the averaged PSD record by record, so that only 
+    one record is held in memory at once.
+
+    Args:
+        voltage_data (array-like): two dimensional data (averages, samples)
+        fs (float): sample rate in Hz
+        averager (Averager, optional): averaging mode. Defaults to None (linear).
+        periodogram_kwargs: passed to scipy.signal.periodogram
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: frequencies and averaged psd
+    """
+    from scipy.signal import periodogram
+    averager = averager or LinearAverage()
+    averager.reset()
+    for n in range(voltage_data.shape[0]):
+        frequencies, psd_n = periodogram(np.asarray(voltage_data[n]), 
+                                         fs=fs, **periodogram_kwargs)
+        averager.update(psd_n)
+    return frequencies, averager.result
+
+
+def read_metadata(meta_file:str|Path) -> dict:
+    """Reads the configuration from a `.metadata` file."""
+    with open(meta_file) as f:
+        return parse_header(f.readlines())
+
+
+def parse_config_value(key:str, value:str):
+    """Converts a config value that was saved as string back to its type."""
+    if key in QUANTITY_KEYS:
+        return ureg.Quantity(value)
+    if key == "averages":
+        return int(value)
+    return value
+
+
+def parse_header(lines:list[str]) -> dict:
+    """Restores the configuration from the header written by DataHandler.save_file.
+
+    Args:
+        lines (list[str]): lines of the header
+
+    Returns:
+        dict: configuration
+    """
+    patterns = (
+        r"Measurement with Driver:(?P<driver>.*) on Device:(?P<device>.*)",
+        r"Date: (?P<start_time>.*)",
+        r"Input Channel: (?P<input_channel>.*) with (?P<terminal_config>.*)",
+        r"Duration: (?P<duration>.*)",
+        r"Sample Rate: (?P<sample_rate_real>.*)",
+        r"Signal Range: (?P<signal_range_min_real>.*), (?P<signal_range_max_real>.*)",
+        r"Averages: (?P<averages>.*)",
+        r"Unit of Data: (?P<unit>.*)",
+    )
+    config = {}
+    for line in lines:
+        for pattern in patterns:
+            match = re.fullmatch(pattern, line.strip())
+            if match:
+                config.update({key: parse_config_value(key, value) 
+                               for key, value in match.groupdict().items()})
+                break
+            
+    # the requested values are not part of the header
+    for key in ("sample_rate", "signal_range_min", "signal_range_max"):
+        if f"{key}_real" in config:
+            config[key] = config[f"{key}_real"]
+    return config
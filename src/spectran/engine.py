@@ -0,0 +1,259 @@
+"""This module contains the measurement engine. It runs measurements without
+any dependency on Qt and reports everything that happens via events,
+so it can be used in scripts, batch runs or servers as well as by the GUI."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from . import log, ureg
+from .daq import DAQ
+from .data_handler import DataHandler
+from .profiling import span
+from .metrics import (ACQUISITION_SECONDS, SAMPLES_ACQUIRED, 
+                      SAMPLES_PER_SECOND, PSD_QUEUE_DEPTH)
+
+# events emitted by the MeasurementEngine and the arguments passed to the callbacks
+EVENTS = {
+    "started": "config of the measurement",
+    "status": "status message",
+    "device_status": "config with the real values set by the device (e.g. sample_rate_real)",
+    "progress": "index of the average that was acquired",
+    "data_updated": "index of the average that was processed or None for all averages",
+    "finished": "number of averages",
+    "aborted": "number of complete averages",
+    "failed": "exception that stopped the measurement",
+}
+
+
+class EngineBusyError(RuntimeError):
+    """Raised if a measurement is started while another one is running."""
+
+
+class MeasurementEngine():
+    """Runs measurements and reports to subscribers via events.
+
+    Example:
+        engine = MeasurementEngine()
+        engine.subscribe("progress", lambda index: print(index))
+        engine.run(DummyDAQ(), config)
+        engine.data_handler.psd
+
+    Args:
+        data_handler (DataHandler, optional): where the data is stored.
+            A new one is created by default.
+    """
+
+    def __init__(self, data_handler:DataHandler=None) -> None:
+        self.data_handler = data_handler if data_handler is not None else DataHandler()
+        self.data_handler.engine = self
+        self.running = False
+        self.thread = None
+        self.run_count = 0 # number of started measurements
+        self.result = None # outcome of the last measurement, see wait
+        self._done = threading.Condition()
+        self._subscribers = {event: [] for event in EVENTS}
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        # the psds are calculated in the background while the next average is acquired
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spectran-psd")
+
+    def subscribe(self, event:str, callback):
+        """Calls callback(*args) whenever the event is emitted.
+        Callbacks are called on the thread that emits the event.
+
+        Args:
+            event (str): one of EVENTS
+            callback (callable): function to call
+        """
+        if event not in EVENTS:
+            raise ValueError(f"Unknown event {event}")
+        self._subscribers[event].append(callback)
+
+    def unsubscribe(self, event:str, callback):
+        self._subscribers[event].remove(callback)
+
+    def emit(self, event:str, *args):
+        for callback in list(self._subscribers[event]):
+            try:
+                callback(*args)
+            except Exception:
+                log.exception("Callback for {} failed".format(event))
+
+    @property
+    def stopped(self) -> bool:
+        """True if the measurement should be stopped."""
+        return self._stop_event.is_set()
+
+    def stop(self):
+        """Stops the running measurement. The driver aborts the acquisition 
+        after the current chunk, see DAQ.chunk_duration."""
+        self._stop_event.set()
+
+    def start(self, driver_instance:DAQ, config:dict) -> threading.Thread:
+        """Runs the measurement in a separate thread. See run.
+
+        Returns:
+            threading.Thread: the thread of the measurement
+        """
+        self._acquire()
+        self.thread = threading.Thread(target=self._run_in_thread,
+                                       args=(driver_instance, config),
+                                       name="spectran-measurement", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def run(self, driver_instance:DAQ, config:dict) -> int:
+        """Runs a measurement with the given configuration and blocks until it is done.
+        The data is written into self.data_handler.
+
+        Args:
+            driver_instance (DAQ): driver with a connected device
+            config (dict): configuration of the measurement, see settings.DEFAULT_VALUES
+
+        Returns:
+            int: number of averages that were measured
+        """
+        self._acquire()
+        return self._run(driver_instance, config)
+
+    def _acquire(self):
+        with self._lock:
+            if self.running:
+                raise EngineBusyError("Measurement already running")
+            self.running = True
+            self.run_count += 1
+            self._stop_event.clear()
+
+    def _run_in_thread(self, driver_instance, config):
+        try:
+            self._run(driver_instance, config)
+        except Exception:
+            # it has been reported with the failed event
+            pass
+
+    def _run(self, driver_instance:DAQ, config:dict) -> int:
+        try:
+            averages, event = self._measure(driver_instance, config)
+        except Exception as e:
+            self._set_result("failed", len(self.data_handler.done_indices), str(e))
+            log.error("Measurement failed: {}".format(e))
+            self.emit("status", "Measurement failed")
+            self.emit("failed", e)
+            raise e
+        
+        # a subscriber may start the next measurement right away
+        self._set_result(event, averages)
+        self.emit(event, averages)
+        return averages
+
+    def _set_result(self, status:str, averages:int, error:str=None):
+        with self._done:
+            self.result = {"run": self.run_count, "status": status, 
+                           "averages": averages, "error": error}
+            self.running = False
+            self._done.notify_all()
+
+    def wait(self, timeout:float=None) -> dict|None:
+        """Blocks until no measurement is running.
+
+        Args:
+            timeout (float, optional): maximal time to wait in seconds. Defaults to None.
+
+        Returns:
+            dict|None: result of the last finished measurement with the keys run 
+                (number of the measurement), status ("finished", "aborted" or "failed"),
+                averages and error. None if no measurement has finished yet.
+                Check running to tell whether the timeout has expired.
+        """
+        with self._done:
+            self._done.wait_for(lambda: not self.running, timeout)
+            return self.result
+
+    @span("measurement")
+    def _measure(self, driver_instance:DAQ, config:dict) -> tuple[int, str]:
+        log.info("Starting Measurement")
+        config.setdefault("driver", driver_instance.__class__.__name__)
+        config.setdefault("device", driver_instance.connected_device)
+        config.setdefault("terminal_config", driver_instance.list_term_configs()[1])
+        config.setdefault("unit", "Volt")
+        duration = config["duration"].to(ureg.second).magnitude
+        sample_rate = config["sample_rate"].to(ureg.Hz).magnitude
+        averages = config["averages"]
+        config["start_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        device = config["device"]
+        log.info("Getting sequence from {} for {} s at {} Hz".format(device, duration, sample_rate))
+
+        assert int(duration * sample_rate) > 2, "Duration too short for the sample rate"
+        self.data_handler.stop_plotting = False
+        self.data_handler.config = config
+        self.data_handler.initialize(averages, duration, sample_rate)
+        self.emit("started", config)
+        self.emit("status", f"Measurement in progress (0 / {averages})")
+
+        coherent = self.data_handler.coherent
+        calculations = {}
+        for i in range(averages):
+            if self.stopped:
+                log.info("Measurement stopped")
+                return self.abort(i), "aborted"
+
+            # normal operation
+            self.emit("status", f"Measurement in progress ({i+1} / {averages})")
+            if coherent is not None and i >= coherent.slots:
+                # the buffer is reused, the average acquired into it has to be processed
+                calculations.pop(i - coherent.slots).result()
+            data_holder = self.data_handler.acquisition_buffer(i)
+            start_time = time.perf_counter()
+            samples = driver_instance.get_sequence(
+                data_holder,
+                i,
+                config,
+                self)
+            self._record_acquisition(time.perf_counter() - start_time, samples, len(data_holder))
+            if samples is not None and samples < len(data_holder):
+                log.info("Measurement stopped during average {}".format(i+1))
+                return self.abort(i, samples), "aborted"
+            self.emit("progress", i)
+            PSD_QUEUE_DEPTH.inc()
+            calculation = self._executor.submit(self._calculate, i)
+            if coherent is not None:
+                calculations[i] = calculation
+
+        self.finish()
+        return averages, "finished"
+
+    def _record_acquisition(self, duration:float, samples:int|None, record_length:int):
+        samples = record_length if samples is None else samples
+        ACQUISITION_SECONDS.observe(duration)
+        SAMPLES_ACQUIRED.inc(samples)
+        if duration > 0:
+            SAMPLES_PER_SECOND.set(samples / duration)
+
+    def _calculate(self, index:int):
+        try:
+            self.data_handler.calculate_data(index, ignore_check=False)
+        except Exception:
+            log.exception("Calculation of average {} failed".format(index))
+        finally:
+            PSD_QUEUE_DEPTH.dec()
+
+    def abort(self, index:int, samples:int=None) -> int:
+        """Keeps the data acquired so far, see DataHandler.cut_data.
+
+        Returns:
+            int: number of complete averages
+        """
+        self.data_handler.stop_plotting = True
+        # cut on the executor, so that no calculation of single averages is running
+        self._executor.submit(self.data_handler.cut_data, index, samples).result()
+        self.finish()
+        self.emit("status", "Measurement aborted")
+        return index
+
+    def finish(self):
+        """Calculates all psds that are missing after the last average.
+        Pending calculations of single averages are skipped."""
+        self.data_handler.stop_plotting = True
+        self._executor.submit(self.data_handler.calculate_data, None, ignore_check=False).result()
@@ -0,0 +1,110 @@
+"""This module contains a multi-resolution min/max envelope of the records.
+It allows to display long time-domain records at any zoom level
+with a constant number of points."""
+
+import numpy as np
+
+
+class EnvelopePyramid():
+    """Min/max envelopes of all records at several levels of detail (LOD).
+
+    Level 0 holds the minimum and maximum of each `base` samples,
+    every further level combines `factor` bins of the previous one.
+    The memory needed is about 4 % of the records with the default values.
+
+    Args:
+        averages (int): number of records
+        samples (int): number of samples per record
+        base (int, optional): samples per bin on level 0. Defaults to 64.
+        factor (int, optional): bins combined between levels. Defaults to 4.
+        min_bins (int, optional): minimal number of bins on the coarsest level. Defaults to 256.
+    """
+
+    def __init__(self, averages:int, samples:int,
+                 base:int=64, factor:int=4, min_bins:int=256) -> None:
+        self.samples = samples
+        self.bin_sizes = []
+        bin_size = base
+        while -(-samples // bin_size) >= min_bins or not self.bin_sizes:
+            self.bin_sizes.append(bin_size)
+            bin_size *= factor
+        self.factor = factor
+        self.mins = [np.empty((averages, -(-samples // b))) for b in self.bin_sizes]
+        self.maxs = [np.empty((averages, -(-samples // b))) for b in self.bin_sizes]
+        self.done = set() # indices of records that have been processed
+
+    @classmethod
+    def from_hdf5(cls, group):
+        """Opens an envelope that was stored with to_hdf5.
+        The datasets are read lazily, only the displayed bins are loaded."""
+        envelope = cls.__new__(cls)
+        envelope.samples = int(group.attrs["samples"])
+        envelope.bin_sizes = [int(b) for b in group.attrs["bin_sizes"]]
+        envelope.factor = int(group.attrs["factor"])
+        envelope.mins = [group[f"min_{i}"] for i in range(len(envelope.bin_sizes))]
+        envelope.maxs = [group[f"max_{i}"] for i in range(len(envelope.bin_sizes))]
+        envelope.done = set(range(envelope.mins[0].shape[0]))
+        return envelope
+
+    def to_hdf5(self, group):
+        """Writes the envelope into an HDF5 group. All records have to be processed."""
+        group.attrs["samples"] = self.samples
+        group.attrs["bin_sizes"] = self.bin_sizes
+        group.attrs["factor"] = self.factor
+        for i, (mins, maxs) in enumerate(zip(self.mins, self.maxs)):
+            group.create_dataset(f"min_{i}", data=mins)
+            group.create_dataset(f"max_{i}", data=maxs)
+
+    def update(self, index:int, record:np.ndarray):
+        """Calculates all levels for a new record in O(samples).
+
+        Args:
+            index (int): index of the record
+            record (np.ndarray): one dimensional data of the record
+        """
+        record = np.asarray(record)
+        starts = np.arange(0, self.samples, self.bin_sizes[0])
+        self.mins[0][index] = np.minimum.reduceat(record, starts)
+        self.maxs[0][index] = np.maximum.reduceat(record, starts)
+        for level in range(1, len(self.bin_sizes)):
+            starts = np.arange(0, self.mins[level-1].shape[1], self.factor)
+            self.mins[level][index] = np.minimum.reduceat(self.mins[level-1][index], starts)
+            self.maxs[level][index] = np.maximum.reduceat(self.maxs[level-1][index], starts)
+        self.done.add(index)
+
+    def cut(self, averages:int):
+        """Keeps only the first records, analogous to DataHandler.cut_data."""
+        self.mins = [m[:averages] for m in self.mins]
+        self.maxs = [m[:averages] for m in self.maxs]
+        self.done = {i for i in self.done if i < averages}
+
+    def select(self, index:int, start:int, stop:int, pixels:int):
+        """Returns the envelope of samples [start, stop) of a record
+        on the coarsest level that still has a bin per pixel.
+
+        Args:
+            index (int): index of the record
+            start (int): first sample
+            stop (int): last sample (exclusive)
+            pixels (int): width of the plot in pixels
+
+        Returns:
+            tuple[np.ndarray, np.ndarray] | None: sample positions and values of
+                alternating minima and maxima or None if the raw samples
+                should be displayed, because there are less than about
+                `base` samples per pixel
+        """
+        level = None
+        for i, bin_size in enumerate(self.bin_sizes):
+            if (stop - start) / bin_size >= pixels:
+                level = i
+        if level is None:
+            return None
+
+        bin_size = self.bin_sizes[level]
+        first, last = start // bin_size, -(-stop // bin_size)
+        positions = (np.arange(first, last) + 0.5) * bin_size
+        values = np.empty(2 * (last - first))
+        values[0::2] = self.mins[level][index, first:last]
+        values[1::2] = self.maxs[level][index, first:last]
+        return np.repeat(positions, 2), values
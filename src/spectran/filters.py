@@ -0,0 +1,191 @@
+"""This module contains the streaming filter chain that is applied to each record
+before the spectral analysis, e.g. to remove mains hum or drifts.
+
+The chain is configured with the config entry "filters", a list of stages
+that are applied in the given order. Frequencies are given in Hz (or as pint quantities):
+
+- {"type": "lowpass" | "highpass", "frequency": f, "order": 4}: Butterworth filter
+- {"type": "bandpass" | "bandstop", "frequency": [f1, f2], "order": 4}: Butterworth filter
+- {"type": "notch", "frequency": f, "q": 30}: second order notch filter
+- {"type": "sos", "sos": [[b0, b1, b2, a0, a1, a2], ...]}: IIR filter in second-order sections
+- {"type": "fir", "taps": [...]}: FIR filter with the given coefficients
+- {"type": "fir", "numtaps": 101, "frequency": f or [f1, f2], "pass_zero": True}:
+  FIR filter designed with scipy.signal.firwin
+
+The state of each stage is carried from block to block and from record to record,
+so the records are filtered as one continuous stream without edge transients.
+The state is initialized with the steady state of the first sample.
+"""
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from . import ureg
+
+# samples that are filtered at once, so that only small temporary arrays are needed
+BLOCK_SIZE = 2**16
+
+IIR_TYPES = ("lowpass", "highpass", "bandpass", "bandstop", "notch", "sos")
+
+
+class FilterStage(ABC):
+    """A linear filter with the state of the stream.
+
+    Args:
+        name (str): name used in messages
+    """
+
+    def __init__(self, name:str) -> None:
+        self.name = name
+        self.state = None
+
+    def reset(self):
+        """Forgets the state, the next block starts a new stream."""
+        self.state = None
+
+    @abstractmethod
+    def process(self, block:np.ndarray) -> np.ndarray:
+        """Filters the next block of the stream and returns the filtered block."""
+
+
+class SOSStage(FilterStage):
+    """IIR filter in second-order sections, see scipy.signal.sosfilt.
+
+    Args:
+        sos (array-like): second-order sections with shape (sections, 6)
+    """
+
+    def __init__(self, sos, name:str="sos") -> None:
+        super().__init__(name)
+        self.sos = np.atleast_2d(np.asarray(sos, dtype=float))
+        if self.sos.ndim != 2 or self.sos.shape[1] != 6:
+            raise ValueError(f"Filter {name}: second-order sections need the shape (n, 6)")
+
+    def process(self, block):
+        from scipy.signal import sosfilt, sosfilt_zi
+        if self.state is None:
+            self.state = sosfilt_zi(self.sos) * block[0]
+        output, self.state = sosfilt(self.sos, block, zi=self.state)
+        return output
+
+
+class FIRStage(FilterStage):
+    """FIR filter, see scipy.signal.lfilter.
+
+    Args:
+        taps (array-like): coefficients of the filter
+    """
+
+    def __init__(self, taps, name:str="fir") -> None:
+        super().__init__(name)
+        self.taps = np.asarray(taps, dtype=float)
+        if self.taps.ndim != 1 or len(self.taps) == 0:
+            raise ValueError(f"Filter {name}: the taps have to be a non-empty list")
+
+    def process(self, block):
+        from scipy.signal import lfilter, lfilter_zi
+        if len(self.taps) == 1:
+            return block * self.taps[0]
+        if self.state is None:
+            self.state = lfilter_zi(self.taps, 1.0) * block[0]
+        output, self.state = lfilter(self.taps, 1.0, block, zi=self.state)
+        return output
+
+
+class FilterChain():
+    """Stages that are applied one after another to a stream of records.
+    Consecutive IIR stages are combined into one cascade of second-order sections.
+
+    Example:
+        chain = FilterChain.from_config([{"type": "notch", "frequency": 50}], 10_000)
+        for record in records:
+            chain.apply(record)
+
+    Args:
+        stages (list[FilterStage]): stages in the order they are applied
+        block_size (int, optional): samples filtered at once. Defaults to BLOCK_SIZE.
+    """
+
+    def __init__(self, stages:list[FilterStage], block_size:int=BLOCK_SIZE) -> None:
+        self.stages = []
+        for stage in stages:
+            if (isinstance(stage, SOSStage) and self.stages
+                and isinstance(self.stages[-1], SOSStage)):
+                previous = self.stages[-1]
+                stage = SOSStage(np.vstack((previous.sos, stage.sos)),
+                                 f"{previous.name}+{stage.name}")
+                self.stages[-1] = stage
+            else:
+                self.stages.append(stage)
+        self.block_size = block_size
+
+    @classmethod
+    def from_config(cls, specs:list[dict], sample_rate:float, **kwargs) -> "FilterChain":
+        """Designs the stages described in the config entry "filters", see the module docstring.
+
+        Args:
+            specs (list[dict]): description of the stages
+            sample_rate (float): sample rate of the records in Hz
+        """
+        if isinstance(specs, dict):
+            specs = [specs]
+        return cls([design_stage(spec, sample_rate) for spec in specs], **kwargs)
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def apply(self, record:np.ndarray):
+        """Filters the next record of the stream in place. The record is processed
+        in blocks, so the temporary arrays are at most block_size samples long."""
+        if not self.stages or len(record) == 0:
+            return
+        for start in range(0, len(record), self.block_size):
+            block = record[start:start+self.block_size]
+            for stage in self.stages:
+                block = stage.process(block)
+            record[start:start+self.block_size] = block
+
+
+def design_stage(spec:dict, sample_rate:float) -> FilterStage:
+    """Creates the stage described by spec, see the module docstring.
+
+    Raises:
+        ValueError: if the description is invalid
+    """
+    from scipy import signal
+    spec = dict(spec)
+    filter_type = spec.pop("type", None)
+    try:
+        match filter_type:
+            case "lowpass" | "highpass" | "bandpass" | "bandstop":
+                sos = signal.butter(int(spec.get("order", 4)), to_hz(spec["frequency"]),
+                                    btype=filter_type, output="sos", fs=sample_rate)
+                return SOSStage(sos, filter_type)
+            case "notch":
+                b, a = signal.iirnotch(to_hz(spec["frequency"]), float(spec.get("q", 30)),
+                                       fs=sample_rate)
+                return SOSStage(signal.tf2sos(b, a), filter_type)
+            case "sos":
+                return SOSStage(spec["sos"], filter_type)
+            case "fir":
+                if "taps" in spec:
+                    return FIRStage(spec["taps"], filter_type)
+                taps = signal.firwin(int(spec["numtaps"]), to_hz(spec["frequency"]),
+                                     pass_zero=spec.get("pass_zero", True), fs=sample_rate)
+                return FIRStage(taps, filter_type)
+            case _:
+                raise ValueError(f"Unknown filter type {filter_type}, use one of "
+                                 f"{IIR_TYPES + ('fir',)}")
+    except KeyError as e:
+        raise ValueError(f"Filter {filter_type} needs the entry {e}")
+
+
+def to_hz(frequency):
+    """Converts a frequency or a list of frequencies to Hz."""
+    if isinstance(frequency, (list, tuple)):
+        return [to_hz(f) for f in frequency]
+    if isinstance(frequency, ureg.Quantity):
+        return frequency.to(ureg.Hz).magnitude
+    return float(frequency)
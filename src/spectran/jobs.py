@@ -0,0 +1,350 @@
+"""This module contains the measurement job queue of the API.
+
+Clients submit jobs (configuration, driver and device, output policy) and
+receive an id. The jobs are measured one after another on the MeasurementEngine,
+so several users can share one instrument. The data of each job is kept in a
+ResultStore, which moves the least recently used results from memory to disk
+and deletes them from disk when its limits are exceeded."""
+
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import log
+from .daq import DAQs
+from .data_handler import DataHandler, SAVING_MODES, default_file_name
+from .engine import EngineBusyError
+
+DEFAULT_RESULTS_PATH = Path.home() / ".spectran" / "results"
+DEFAULT_MAX_MEMORY = 2**30 # bytes of results kept in memory
+DEFAULT_MAX_DISK = 10 * 2**30 # bytes of results kept on disk
+DEFAULT_MAX_JOBS = 1000 # number of jobs that are listed
+MAX_LOADED = 4 # results on disk that are kept open after they have been accessed
+
+# states of a job
+PENDING = "pending"
+RUNNING = "running"
+SAVING = "saving"
+FINISHED = "finished"
+ABORTED = "aborted"
+FAILED = "failed"
+CANCELLED = "cancelled"
+DONE = (FINISHED, ABORTED, FAILED, CANCELLED)
+
+
+class Job():
+    """A measurement that is run by the JobQueue.
+
+    Args:
+        driver_instance (DAQ): driver with a connected device
+        config (dict): configuration of the measurement, see settings.DEFAULT_VALUES
+        directory (str|Path, optional): where the data is saved. Defaults to None (not saved).
+        file_name (str, optional): name of the file, formatted with id. 
+            Defaults to "job_{id}" and the suffix of the mode.
+        mode (SAVING_MODES, optional): how the file is saved. Defaults to HDF5.
+        save_kwargs (dict, optional): passed to DataHandler.save_file.
+    """
+
+    def __init__(self, driver_instance, config:dict, directory:str|Path = None, 
+                 file_name:str = None, mode:SAVING_MODES = SAVING_MODES.HDF5, 
+                 save_kwargs:dict = None) -> None:
+        self.id = uuid.uuid4().hex
+        self.driver_instance = driver_instance
+        self.config = config
+        self.directory = None if directory is None else Path(directory)
+        suffix = Path(default_file_name(mode)).suffix
+        self.file_name = file_name or "job_{id}" + suffix
+        self.mode = mode
+        self.save_kwargs = save_kwargs or {}
+        self.status = PENDING
+        self.averages = None
+        self.file_path = None
+        self.error = None
+        self.cancelled = False
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in DONE
+
+    def wait(self, timeout:float = None) -> bool:
+        """Blocks until the job is done. Returns False if the timeout expired."""
+        return self._done.wait(timeout)
+
+    def summary(self) -> dict:
+        return {"id": self.id, "status": self.status, "averages": self.averages,
+                "file_path": None if self.file_path is None else str(self.file_path),
+                "error": self.error, "driver": self.driver_instance.__class__.__name__,
+                "device": self.driver_instance.connected_device,
+                "submitted": self.submitted, "started": self.started, "finished": self.finished}
+
+    def _set_done(self, status:str, error:str = None):
+        self.status = status
+        self.error = error
+        self.finished = time.time()
+        self._done.set()
+
+
+class ResultStore():
+    """Keeps the data of jobs in memory and on disk with least recently used eviction.
+
+    Results above max_memory are written to directory (or refer to the file the
+    job has saved already) and loaded lazily when they are accessed again.
+    Results above max_disk are deleted. The latest MAX_LOADED results that have
+    been loaded from disk are kept open, older ones are closed.
+
+    Args:
+        directory (str|Path, optional): Defaults to DEFAULT_RESULTS_PATH.
+        max_memory (int, optional): bytes in memory. Defaults to DEFAULT_MAX_MEMORY.
+        max_disk (int, optional): bytes on disk. Defaults to DEFAULT_MAX_DISK.
+    """
+
+    def __init__(self, directory:str|Path = DEFAULT_RESULTS_PATH, 
+                 max_memory:int = DEFAULT_MAX_MEMORY, max_disk:int = DEFAULT_MAX_DISK) -> None:
+        self.directory = Path(directory)
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self._memory = OrderedDict() # DataHandler by id
+        self._disk = OrderedDict() # (file path, bytes written by the store) by id
+        self._loaded = OrderedDict() # DataHandler of results on disk by id
+        self._lock = threading.RLock()
+
+    @property
+    def memory_size(self) -> int:
+        return sum(data_size(data_handler) for data_handler in self._memory.values())
+
+    @property
+    def disk_size(self) -> int:
+        return sum(size for _, size in self._disk.values())
+
+    def __contains__(self, job_id:str) -> bool:
+        return job_id in self._memory or job_id in self._disk
+
+    def put(self, job_id:str, data_handler:DataHandler, file_path:Path = None):
+        """Stores the data of a job.
+
+        Args:
+            job_id (str): id of the job
+            data_handler (DataHandler): data of the job, see DataHandler.snapshot
+            file_path (Path, optional): file in which the data has been saved.
+                It is used instead of writing the data again, when the result is
+                moved to disk. Defaults to None.
+        """
+        # files of the store are not registered in the catalog
+        data_handler.catalog = None
+        data_handler.file_path = file_path
+        with self._lock:
+            self._memory[job_id] = data_handler
+            self._evict()
+
+    def get(self, job_id:str) -> DataHandler:
+        """Returns the data of a job and marks it as recently used.
+
+        Raises:
+            KeyError: If the result does not exist (anymore)
+        """
+        with self._lock:
+            if job_id in self._memory:
+                self._memory.move_to_end(job_id)
+                return self._memory[job_id]
+            file_path, _ = self._disk[job_id]
+            self._disk.move_to_end(job_id)
+            if job_id in self._loaded:
+                self._loaded.move_to_end(job_id)
+                return self._loaded[job_id]
+            # the records are memory-mapped or read lazily
+            data_handler = DataHandler()
+            try:
+                data_handler.load_file(file_path)
+            except FileNotFoundError:
+                # the file has been deleted outside of the store
+                del self._disk[job_id]
+                log.warning("File {} of job {} does not exist anymore".format(file_path, job_id))
+                raise KeyError(job_id)
+            self._loaded[job_id] = data_handler
+            while len(self._loaded) > MAX_LOADED:
+                self._loaded.popitem(last=False)[1].close_file()
+            return data_handler
+
+    def remove(self, job_id:str):
+        with self._lock:
+            self._memory.pop(job_id, None)
+            if job_id in self._disk:
+                self._unload(job_id)
+                self._delete(*self._disk.pop(job_id))
+
+    def _evict(self):
+        memory_size = self.memory_size
+        while memory_size > self.max_memory and self._memory:
+            job_id, data_handler = self._memory.popitem(last=False)
+            memory_size -= data_size(data_handler)
+            try:
+                self._disk[job_id] = self._write(job_id, data_handler)
+            except Exception:
+                log.exception("Writing the result of job {} failed".format(job_id))
+        disk_size = self.disk_size
+        while disk_size > self.max_disk and self._disk:
+            job_id, (file_path, size) = self._disk.popitem(last=False)
+            disk_size -= size
+            self._unload(job_id)
+            self._delete(file_path, size)
+            log.debug("Result of job {} evicted".format(job_id))
+
+    def _write(self, job_id:str, data_handler:DataHandler) -> tuple[Path, int]:
+        if data_handler.file_path is not None and Path(data_handler.file_path).exists():
+            return Path(data_handler.file_path), 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        file_path = data_handler.save_file(self.directory / f"{job_id}.npy", 
+                                           mode=SAVING_MODES.NP_BINARY)
+        meta_file = Path(str(file_path) + ".metadata")
+        return file_path, file_path.stat().st_size + meta_file.stat().st_size
+
+    def _unload(self, job_id:str):
+        data_handler = self._loaded.pop(job_id, None)
+        if data_handler is not None:
+            data_handler.close_file()
+
+    def _delete(self, file_path:Path, size:int):
+        # files saved by the jobs themselves are kept
+        if size:
+            file_path.unlink(missing_ok=True)
+            Path(str(file_path) + ".metadata").unlink(missing_ok=True)
+
+
+def data_size(data_handler:DataHandler) -> int:
+    return sum(getattr(getattr(data_handler, name, None), "nbytes", 0) 
+               for name in ("voltage_data", "psds"))
+
+
+class JobQueue():
+    """Runs submitted jobs one after another on the engine. Jobs wait while
+    another measurement (e.g. started in the GUI) is running.
+
+    Args:
+        engine (MeasurementEngine): engine that runs the measurements
+        store (ResultStore, optional): where the results are kept. 
+            Defaults to a ResultStore with the default limits.
+        max_jobs (int, optional): number of done jobs that are remembered. 
+            Defaults to DEFAULT_MAX_JOBS.
+    """
+
+    def __init__(self, engine, store:ResultStore = None, max_jobs:int = DEFAULT_MAX_JOBS) -> None:
+        self.engine = engine
+        self.store = store if store is not None else ResultStore()
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict() # Job by id in the order of submission
+        self.current = None # running job
+        self._queue = queue.Queue()
+        self._drivers = {} # DAQ by driver and device name
+        self._lock = threading.Lock()
+        # saving of a job overlaps with the measurement of the next one
+        self._saver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spectran-save")
+        # a job that is cancelled just before its measurement starts is stopped right away
+        engine.subscribe("started", self._started)
+        self.thread = threading.Thread(target=self._work, name="spectran-jobs", daemon=True)
+        self.thread.start()
+
+    def driver(self, driver:str, device:str):
+        """Returns a driver instance connected to device, which is reused by later jobs."""
+        with self._lock:
+            if (driver, device) not in self._drivers:
+                names = [daq.__name__ for daq in DAQs]
+                if driver not in names:
+                    raise ValueError(f"Unknown driver {driver}")
+                driver_instance = DAQs[names.index(driver)]()
+                driver_instance.connect_device(device)
+                self._drivers[driver, device] = driver_instance
+            return self._drivers[driver, device]
+
+    def submit(self, job:Job) -> Job:
+        with self._lock:
+            self.jobs[job.id] = job
+            # forget the oldest done jobs
+            done = [job_id for job_id, other in self.jobs.items() if other.done]
+            for job_id in done[:max(len(self.jobs) - self.max_jobs, 0)]:
+                del self.jobs[job_id]
+                self.store.remove(job_id)
+        self._queue.put(job)
+        log.info("Job {} submitted".format(job.id))
+        return job
+
+    def get(self, job_id:str) -> Job:
+        """Raises KeyError if the job does not exist."""
+        return self.jobs[job_id]
+
+    def list(self) -> list[dict]:
+        with self._lock:
+            return [job.summary() for job in self.jobs.values()]
+
+    def cancel(self, job_id:str):
+        """Removes a pending job from the queue or stops the running one."""
+        job = self.get(job_id)
+        with self._lock:
+            job.cancelled = True
+            if job.status == PENDING:
+                job._set_done(CANCELLED)
+                return
+        if job is self.current:
+            # the data measured so far is kept
+            self.engine.stop()
+
+    def result(self, job_id:str) -> DataHandler:
+        """Returns the data of a job, see ResultStore.get."""
+        return self.store.get(job_id)
+
+    def _started(self, config:dict):
+        if self.current is not None and self.current.cancelled:
+            self.engine.stop()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job.status != PENDING:
+                continue
+            self.current = job
+            try:
+                self._run(job)
+            except Exception as e:
+                log.exception("Job {} failed".format(job.id))
+                job._set_done(FAILED, str(e))
+            finally:
+                self.current = None
+
+    def _run(self, job:Job):
+        while True:
+            # wait for measurements that were not started by the queue
+            self.engine.wait()
+            with self._lock:
+                if job.status != PENDING:
+                    return
+                job.status = RUNNING
+                job.started = time.time()
+            try:
+                job.averages = self.engine.run(job.driver_instance, dict(job.config))
+                break
+            except EngineBusyError:
+                job.status = PENDING
+        status = CANCELLED if job.cancelled else self.engine.result["status"]
+        job.status = SAVING
+        self._saver.submit(self._finish, job, self.engine.data_handler.snapshot(), status)
+
+    def _finish(self, job:Job, data_handler:DataHandler, status:str):
+        try:
+            if job.directory is not None and data_handler.voltage_data is not None:
+                job.directory.mkdir(parents=True, exist_ok=True)
+                job.file_path = data_handler.save_file(job.directory / job.file_name.format(id=job.id),
+                                                       mode=job.mode, **job.save_kwargs)
+            self.store.put(job.id, data_handler, job.file_path)
+        except Exception as e:
+            log.exception("Saving job {} failed".format(job.id))
+            job._set_done(FAILED, str(e))
+            return
+        job._set_done(status)
+        log.info("Job {} {}".format(job.id, status))
@@ -14,17 +14,19 @@ from PySide6.QtWidgets import (
 )
 
 from PySide6.QtGui import QRegularExpressionValidator
+from PySide6.QtCore import QThreadPool
 
 from . import log, ureg
 from .windows import PropertiesWindow
-from .settings import DEFAULT_VALUES
+from . import settings
+from .settings import DEFAULT_MAGNITUDES
 from .daq import DAQs, DAQ
-from .measurement import Worker, run_measurement
+from .engine import EngineBusyError
+from .measurement import Worker
 
 class MainUI(QWidget):
 
     driver_instance: DAQ = None
-    stop_plotting = False
 
     def __init__(self, main_window, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -32,6 +34,8 @@ class MainUI(QWidget):
         self.main_window = main_window
         # dictionary to hold all input fields with units, if there are any
         self.input_fields = {}
+        # config entries without input field (e.g. filters), passed on to each measurement
+        self.extra_config = {}
 
         self.setMinimumWidth(300)
         self.setMaximumWidth(350)
@@ -122,9 +126,9 @@ class MainUI(QWidget):
         row += 1
         self.settings_layout.addWidget(QLabel("Sample Rate: "), row, 0)
         self.sample_rate_edit = QLineEdit(
-            placeholderText=str(DEFAULT_VALUES["sample_rate"].to(ureg.kHz).magnitude)
+            placeholderText=str(DEFAULT_MAGNITUDES["sample_rate"][0])
         )
-        self.input_fields["sample_rate"] = self.sample_rate_edit, ureg.kHz
+        self.input_fields["sample_rate"] = self.sample_rate_edit, "kHz"
         self.sample_rate_edit.setValidator(
             QRegularExpressionValidator(r"^[+-]?(\d+(\.\d*)?|\.\d+)$", self)
         )
@@ -135,9 +139,9 @@ class MainUI(QWidget):
         row += 1
         self.settings_layout.addWidget(QLabel("Duration: "), row, 0)
         self.duration_edit = QLineEdit(
-            placeholderText=str(DEFAULT_VALUES["duration"].to(ureg.second).magnitude)
+            placeholderText=str(DEFAULT_MAGNITUDES["duration"][0])
         )
-        self.input_fields["duration"] = self.duration_edit, ureg.second
+        self.input_fields["duration"] = self.duration_edit, "second"
         self.duration_edit.setValidator(
             QRegularExpressionValidator(r"^[+-]?(\d+(\.\d*)?|\.\d+)$", self)
         )
@@ -147,7 +151,7 @@ class MainUI(QWidget):
         # Averages
         row += 1
         self.settings_layout.addWidget(QLabel("Averages: "), row, 0)
-        self.averages_edit = QLineEdit(placeholderText=str(DEFAULT_VALUES["averages"]))
+        self.averages_edit = QLineEdit(placeholderText="1")
         self.input_fields["averages"] = self.averages_edit
         self.averages_edit.setValidator(QRegularExpressionValidator(r"^\d+$", self))
         self.settings_layout.addWidget(self.averages_edit, row, 1)
@@ -158,16 +162,16 @@ class MainUI(QWidget):
 
         range_layout = QHBoxLayout()
         self.range_min_edit = QLineEdit(
-            placeholderText=str(DEFAULT_VALUES["signal_range_min"].to(ureg.volt).magnitude)
+            placeholderText=str(DEFAULT_MAGNITUDES["signal_range_min"][0])
         )
-        self.input_fields["signal_range_min"] = self.range_min_edit, ureg.volt
+        self.input_fields["signal_range_min"] = self.range_min_edit, "volt"
         self.range_min_edit.setValidator(
             QRegularExpressionValidator(r"^[+-]?(\d+(\.\d*)?|\.\d+)$", self)
         )
         self.range_max_edit = QLineEdit(
-            placeholderText=str(DEFAULT_VALUES["signal_range_max"].to(ureg.volt).magnitude)
+            placeholderText=str(DEFAULT_MAGNITUDES["signal_range_max"][0])
         )
-        self.input_fields["signal_range_max"] = self.range_max_edit, ureg.volt
+        self.input_fields["signal_range_max"] = self.range_max_edit, "volt"
         self.range_max_edit.setValidator(
             QRegularExpressionValidator(r"^[+-]?(\d+(\.\d*)?|\.\d+)$", self)
         )
@@ -213,14 +217,16 @@ class MainUI(QWidget):
         self.status_layout = QGridLayout()
         status_gbox.setLayout(self.status_layout)
         
-    def enable_plotting(self, signal:bool, spectrum:bool):
-        """Enable or disable plotting of signal and spectrum
+    def enable_plotting(self, signal:bool, spectrum:bool, allan:bool=None):
+        """Enable or disable plotting of signal, spectrum and Allan deviation
 
         Args:
             enable (bool): True to enable plotting, False to disable
         """
         self.plot_signal_cb.setChecked(signal)
         self.plot_spectrum_cb.setChecked(spectrum)
+        if allan is not None:
+            self.plot_allan_cb.setChecked(allan)
         
     def add_plot_box(self):
 
@@ -251,11 +257,46 @@ class MainUI(QWidget):
         self.input_fields["plot_spectrum"] = self.plot_spectrum_cb
         self.plot_spectrum_cb.setChecked(True)
         self.plot_spectrum_cb.setToolTip("Plot spectrum diagram only if this is enabled. Disable for faster measurements.")
+        self.plot_spectrum_cb.toggled.connect(self.set_compute_psd)
         self.plot_layout.addWidget(self.plot_spectrum_cb, row, 1)
         self.plot_spectrum_button = QPushButton("Calculate PSD && plot")
         self.plot_spectrum_button.clicked.connect(self.calculate_psd_and_plot)
         self.plot_layout.addWidget(self.plot_spectrum_button, row, 2)
+
+        row += 1
+        self.plot_layout.addWidget(QLabel("Plot Allan Dev.: "), row, 0)
+        self.plot_allan_cb = QCheckBox(self)
+        self.input_fields["plot_allan"] = self.plot_allan_cb
+        self.plot_allan_cb.setChecked(False)
+        self.plot_allan_cb.setToolTip("Calculate and plot the Allan deviation (ADEV and MDEV) of the records.")
+        self.plot_allan_cb.toggled.connect(self.set_compute_allan)
+        self.plot_layout.addWidget(self.plot_allan_cb, row, 1)
+
+        row += 1
+        self.plot_layout.addWidget(QLabel("PSD Binning: "), row, 0)
+        self.psd_binning_dd = QComboBox(self)
+        self.input_fields["psd_binning"] = self.psd_binning_dd
+        for text, mode in (("Log Mean", "mean"), ("Log Max", "max"), ("Full Resolution", None)):
+            self.psd_binning_dd.addItem(text, mode)
+        self.psd_binning_dd.setToolTip("Reduce the displayed PSD to log-spaced bins. "
+                                       "Full resolution is shown when zoomed in.")
+        self.psd_binning_dd.currentIndexChanged.connect(
+            lambda: self.main_window.plots.set_psd_binning(self.psd_binning_dd.currentData()))
+        self.plot_layout.addWidget(self.psd_binning_dd, row, 1, 1, 2)
         
+    def set_compute_psd(self, checked:bool):
+        self.main_window.data_handler.compute_psd = checked
+
+    def set_compute_allan(self, checked:bool):
+        self.main_window.data_handler.compute_allan = checked
+        self.main_window.plots.set_allan_visible(checked)
+
+    def show_device_status(self, config:dict):
+        """Shows the values that were set by the device."""
+        self.sample_rate_status.setText(f"{config['sample_rate_real'].to(ureg.Hz).magnitude:6g}")
+        self.range_min_status.setText(f"{config['signal_range_min_real'].to(ureg.volt).magnitude:.6g}")
+        self.range_max_status.setText(f"{config['signal_range_max_real'].to(ureg.volt).magnitude:.6g}")
+
     def calculate_psd_and_plot(self):
         self.main_window.statusBar().showMessage("Calculating PSD")
         plot_worker = Worker(self.main_window.data_handler.calculate_data, None, ignore_check=True)
@@ -270,9 +311,7 @@ class MainUI(QWidget):
             self.main_window.raise_error("No data to plot")
             return
         
-        t = self.main_window.data_handler.time_seq
-        v = self.main_window.data_handler.voltage_data[-1]
-        self.main_window.plots.update_signal_plot(t, v, force_draw=True)
+        self.main_window.plots.show_signal(-1, force_draw=True)
         
     def set_config(self, config: dict):
         """Set the configuration dictionary to the UI
@@ -301,6 +340,7 @@ class MainUI(QWidget):
             # if it is something else, update the config
             else:
                 self.config[key] = value
+                self.extra_config[key] = value
     
     @property
     def config(self):
@@ -308,7 +348,8 @@ class MainUI(QWidget):
     
     def read_config(self):
 
-        output = DEFAULT_VALUES.copy()
+        output = settings.DEFAULT_VALUES.copy()
+        output.update(self.extra_config)
         if self.input_channel_dd.currentText():
             output["input_channel"] = self.input_channel_dd.currentText()
         if self.sample_rate_edit.text():
@@ -359,10 +400,8 @@ class MainUI(QWidget):
             self.properties_page.activateWindow()
     
     def stop_measurement(self):
-        self.main_window.threadpool.clear()
-        self.main_window.measurement_stopped = True
+        self.main_window.engine.stop()
         self.stop_button.setEnabled(False)
-        self.start_button.setEnabled(True)
 
     def start_measurement(self) -> None|str:
         """Function that is called, when one clicks on start measurement.
@@ -379,61 +418,58 @@ class MainUI(QWidget):
             self.main_window.raise_error("No device connected")
             return "No device connected"
         
-        self.main_window.measurement_stopped = False
         self.main_window.plots.clear_plots()
+        self.main_window.plots.scheduler.reset()
         
         config = self.read_config()
-        print(config)
-        self.main_window.data_handler.config = config
+        log.debug(config)
         
+        try:
+            self.main_window.engine.start(self.driver_instance, config)
+        except EngineBusyError as e:
+            # e.g. a job of the API is measuring
+            self.main_window.raise_error(e)
+            return str(e)
         self.start_button.setEnabled(False)
         self.stop_button.setEnabled(True)
-        worker = Worker(run_measurement, self.driver_instance, config, self.main_window)
-        worker.signals.progress.connect(self.get_data_and_plot)
-        worker.signals.error.connect(self.main_window.raise_error)
-        worker.signals.result.connect(self.finish_measurement)        
-        # Execute
-        self.main_window.threadpool.start(worker)
         
     def finish_measurement(self, length:int):
-        # TODO: stop all plotting and plot final data
-        self.stop_plotting = True
-        self.get_data_and_plot(None)
-        
         log.info("Measurement finished with {} averages".format(length))
         
-        # self.plot
         self.start_button.setEnabled(True)
         self.stop_button.setEnabled(False)
-        self.main_window.measurement_stopped = True
 
         # add to statusbar
         if self.main_window.statusBar().currentMessage() != "Measurement aborted":
             self.main_window.statusBar().showMessage("Ready for measurement")
-        
-    def get_data_and_plot(self, index:int):
-        """Collects data and calculates the PSD. Then plots it.
-        Computations are done in a separate thread.
-        
-        Args:
-            index (int): index of averages that was just collected
-            data (np.ndarray): array holding the voltage values
-        """
-        if self.main_window.measurement_stopped:
-            log.debug("Wanted to plot data at index {}, but measurement was stopped".format(index))
-            return
-        
-        plot_worker = Worker(self.main_window.data_handler.calculate_data, index, ignore_check=False)
-        plot_worker.signals.finished.connect(
-            lambda: self.main_window.plots.update_plots(index=index))
-        plot_worker.signals.error.connect(self.main_window.raise_error)
-        self.main_window.threadpool.start(plot_worker)
+
+    def measurement_failed(self, error:Exception):
+        self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        self.main_window.raise_error(error)
 
     def list_devices(self):
-        log.info("Looking for devices on {}".format(self.driver_dd.currentText()))
+        """Lists the devices of the selected driver in a separate thread,
+        as the discovery of hardware can take seconds."""
+        driver = self.driver_dd.currentText()
+        log.info("Looking for devices on {}".format(driver))
         driver_instance = DAQs[self.driver_dd.currentIndex()]()
         self.device_dd.clear()
-        self.device_dd.addItems(driver_instance.list_devices())
+        worker = Worker(lambda progress_callback: driver_instance.list_devices())
+        worker.signals.result.connect(lambda devices: self.show_devices(driver, devices))
+        worker.signals.error.connect(lambda error: log.error(
+            "Looking for devices on {} failed: {}".format(driver, error[1])))
+        QThreadPool.globalInstance().start(worker)
+
+    def show_devices(self, driver:str, devices:list[str]):
+        # the driver may have been changed in the meantime
+        if driver != self.driver_dd.currentText():
+            return
+        self.device_dd.clear()
+        self.device_dd.addItems(devices)
+        if self.driver_instance is not None and self.driver_instance.connected_device in devices:
+            self.device_dd.setCurrentText(self.driver_instance.connected_device)
+        log.info("Found {} devices on {}".format(len(devices), driver))
         
     def connect_device_manual(self, driver, device):
         driver = self.set_driver(driver)
@@ -3,29 +3,34 @@ This means that it contains the main layout and the menu bar.
 Everything displayed in the GUI is managed by .main_ui.py and .plots.py."""
 
 from PySide6.QtWidgets import (QApplication, QMainWindow, 
-QHBoxLayout, QWidget, QSplitter, QStyle, QMessageBox)
+QHBoxLayout, QWidget, QSplitter, QStyle, QMessageBox, QLabel, QFileDialog)
 from PySide6.QtCore import Qt, QThreadPool, QMetaObject, Q_ARG, Slot
 from PySide6.QtGui import QIcon, QAction, QPalette
 import sys
 
 from .plots import Plots
 from .main_ui import MainUI
-from .data_handler import DataHandler
+from .data_handler import SAVING_MODES, default_file_name
+from .engine import MeasurementEngine
+from .catalog import Catalog
 from .settings import Settings
-from .windows import AboutWindow, SettingsWindow, SaveWindow
+from .windows import AboutWindow, SettingsWindow, SaveWindow, DiagnosticsWindow
+from .measurement import Worker, EngineSignals
 from . import spectran_path, log
 
 class MainWindow(QMainWindow):
 
-    measurement_stopped = True # The status of the measurement
-
     def __init__(self):
         super(MainWindow, self).__init__()
 
+        # the measurement runs without the gui, its events are forwarded as signals
+        self.engine = MeasurementEngine()
+        self.data_handler = self.engine.data_handler
+        self.engine_signals = EngineSignals(self.engine, parent=self)
+
         # created gui
         self.plots = Plots(self)
         self.main_ui = MainUI(self)
-        self.data_handler = DataHandler(self)
         self.api_server = None
 
         # qt stuff
@@ -33,6 +38,8 @@ class MainWindow(QMainWindow):
         log.info("Multithreading with maximum %d threads" % self.threadpool.maxThreadCount())
         self.settings = Settings(self, "spectran", "Spectran")
         self.settings.load_settings()
+        self.data_handler.catalog = Catalog(self.settings.value("misc/catalog_path"))
+        self.plots.scheduler.set_max_fps(self.settings.value("graphics/max_fps"))
         # set style
         QApplication.setStyle(self.settings.value("graphics/style"))
 
@@ -44,6 +51,11 @@ class MainWindow(QMainWindow):
         self.setWindowIcon(QIcon(str(spectran_path / "data/osci_128.ico")))
         
         self.statusBar().showMessage("Ready for measurement")
+        # rendered and skipped frames of the plots
+        self.frames_label = QLabel()
+        self.statusBar().addPermanentWidget(self.frames_label)
+        self.plots.scheduler.frames_changed.connect(self.update_frames_label)
+        self.connect_engine()
 
         self.add_menu_bar()
 
@@ -72,6 +84,16 @@ class MainWindow(QMainWindow):
         saveAction.setStatusTip("Save Data")
         saveAction.triggered.connect(self.open_save_page)
 
+        # Open
+        openAction = QAction(
+            self.style().standardIcon(QStyle.StandardPixmap.SP_DialogOpenButton),
+            "Open File",
+            self,
+        )
+        openAction.setShortcut("Ctrl+O")
+        openAction.setStatusTip("Open saved data for re-analysis")
+        openAction.triggered.connect(self.open_file)
+
         # Settings
         settingsAction = QAction(
             QIcon(str(spectran_path / "data/gear_icon.png")), "Settings", self
@@ -88,6 +110,15 @@ class MainWindow(QMainWindow):
         resetSettingsAction.setStatusTip("Clear Settings")
         resetSettingsAction.triggered.connect(self.settings.clear)
 
+        # Diagnostics
+        diagnosticsAction = QAction(
+            self.style().standardIcon(QStyle.StandardPixmap.SP_ComputerIcon),
+            "Diagnostics",
+            self,
+        )
+        diagnosticsAction.setStatusTip("Show performance metrics")
+        diagnosticsAction.triggered.connect(self.open_diagnostics_page)
+
         # About
         aboutAction = QAction(
             self.style().standardIcon(QStyle.StandardPixmap.SP_MessageBoxInformation),
@@ -100,13 +131,33 @@ class MainWindow(QMainWindow):
         # menu bar
         menuBar = self.menuBar()
         fileMenu = menuBar.addMenu("&File")
+        fileMenu.addAction(openAction)
         fileMenu.addAction(saveAction)
         editMenu = menuBar.addMenu("&Edit")
         editMenu.addAction(settingsAction)
         editMenu.addAction(resetSettingsAction)
+        editMenu.addAction(diagnosticsAction)
         aboutMenu = menuBar.addMenu("&About")
         aboutMenu.addAction(aboutAction)
 
+    @property
+    def measurement_stopped(self) -> bool:
+        """The status of the measurement"""
+        return not self.engine.running
+
+    def connect_engine(self):
+        signals = self.engine_signals
+        signals.status.connect(self.statusBar().showMessage)
+        signals.device_status.connect(self.main_ui.show_device_status)
+        # the scheduler drops frames that would be outdated before they are drawn
+        signals.data_updated.connect(lambda index: self.plots.scheduler.request(index=index))
+        signals.finished.connect(self.main_ui.finish_measurement)
+        signals.aborted.connect(self.main_ui.finish_measurement)
+        signals.failed.connect(self.main_ui.measurement_failed)
+
+    def update_frames_label(self, rendered, skipped):
+        self.frames_label.setText(f"Frames: {rendered} rendered, {skipped} skipped")
+
     def update_style(self):
         log.info("Updating style to {} dark_mode = {}".format(
                 self.settings.value("graphics/style"), self.is_dark_mode()))
@@ -115,6 +166,7 @@ class MainWindow(QMainWindow):
     
     def closeEvent(self, event):
         # close all threads
+        self.engine.stop()
         self.threadpool.clear() # this simply raises an error when closing unexpectedly
         
         QApplication.closeAllWindows()
@@ -149,11 +201,53 @@ class MainWindow(QMainWindow):
         self.about_window.show()
         self.about_window.activateWindow()
 
+    def open_diagnostics_page(self):
+        self.diagnostics_window = DiagnosticsWindow(parent=self)
+        self.diagnostics_window.show()
+        self.diagnostics_window.activateWindow()
+
     def open_save_page(self):
         self.save_window = SaveWindow(parent=self)
         self.save_window.show()
         self.save_window.activateWindow()
 
+    def save_file_dialog(self, mode:SAVING_MODES=SAVING_MODES.PLAIN_TEXT, 
+                         extensions="Data-File (*.txt *.dat *.npy *.npz *.h5);;All Files (*)"):
+        filename, _ = QFileDialog.getSaveFileName(
+            self.main_ui, "Save", default_file_name(mode), extensions
+        )
+        if filename:
+            return filename
+
+    def load_file_dialog(self, extensions="Data-File (*.txt *.dat *.npy *.npz *.h5);;All Files (*)"):
+        filename, _ = QFileDialog.getOpenFileName(
+            self.main_ui, "Open", "", extensions
+        )
+        if filename:
+            return filename
+
+    def open_file(self):
+        """Loads a saved measurement in a separate thread and plots it."""
+        file_path = self.load_file_dialog()
+        if file_path is None:
+            return
+        
+        self.statusBar().showMessage(f"Loading {file_path}")
+        recalculate_psd = self.main_ui.plot_spectrum_cb.isChecked()
+        load_worker = Worker(self.data_handler.load_file, file_path, 
+                             recalculate_psd=recalculate_psd)
+        load_worker.signals.result.connect(self.file_loaded)
+        load_worker.signals.error.connect(self.raise_error)
+        self.threadpool.start(load_worker)
+        
+    def file_loaded(self, file_path):
+        # show the settings of the loaded measurement without touching the driver selection
+        keys = ("sample_rate", "duration", "averages", "signal_range_min", "signal_range_max")
+        self.main_ui.set_config({k: v for k, v in self.data_handler.config.items() if k in keys})
+        self.plots.clear_plots()
+        self.plots.update_plots(index=None, force_draw=True)
+        self.statusBar().showMessage(f"Loaded {file_path}")
+
     def get_bg_color(self):
         QApplication.processEvents()
         color = self.palette().color(QPalette.ColorRole.Window)
@@ -1,60 +1,78 @@
-"""This module contains a function to run the measurement. 
-But also the Worker class to run the measurement in a separate thread."""
-
-from . import log, ureg
-from .daq import DAQ
-from PySide6.QtCore import Signal, Slot, QObject
-from datetime import datetime
-
-def run_measurement(driver_instance:DAQ, 
-                    config:dict, 
-                    main_window, 
-                    progress_callback:Signal) -> int:
+"""This module contains the Qt bindings of the measurement.
+The measurement itself is run by .engine.MeasurementEngine, 
+EngineSignals forwards its events to the GUI thread. 
+The Dispatcher runs functions of other threads on the GUI thread and
+the Worker class runs other functions in a separate thread."""
+
+import asyncio
+from concurrent.futures import Future
+
+from PySide6.QtCore import Signal, Slot, QObject, QThread, Qt
+
+
+class EngineSignals(QObject):
+    """Forwards the events of a MeasurementEngine as Qt signals.
+    The engine emits its events on the measurement thread, 
+    connected slots are called on the thread of this object (usually the GUI thread).
+
+    Args:
+        engine (MeasurementEngine): the engine to listen to
     """
-    Start a measurement with the current configuration
-    and writes into voltage_data inplace.
+    started = Signal(object)
+    status = Signal(str)
+    device_status = Signal(object)
+    progress = Signal(int)
+    data_updated = Signal(object)
+    finished = Signal(int)
+    aborted = Signal(int)
+    failed = Signal(object)
+
+    def __init__(self, engine, parent=None):
+        super().__init__(parent)
+        for event in ("started", "status", "device_status", "progress",
+                      "data_updated", "finished", "aborted", "failed"):
+            engine.subscribe(event, getattr(self, event).emit)
+
+
+class Dispatcher(QObject):
+    """Runs functions on the thread of this object (usually the GUI thread), 
+    e.g. for the API server, whose endpoints must not touch widgets themselves.
+
+    Example:
+        result = await dispatcher.run(main_ui.start_measurement)
+
+    The functions are queued in the event loop of the thread, 
+    so they are called in the order in which they were submitted.
     """
-    log.info("Starting Measurement")
-    main_window.main_ui.stop_plotting = False
-    
-    duration = config["duration"].to(ureg.second).magnitude
-    sample_rate = config["sample_rate"].to(ureg.Hz).magnitude
-    averages = config["averages"]
-    config["start_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    device = config["device"]
-    log.info("Getting sequence from {} for {} s at {} Hz".format(device, duration, sample_rate))
-    main_window.statusBar().showMessage(f"Measurement in progress (0 / {averages})")
-
-    try:
-        assert int(duration * sample_rate) > 2, "Duration too short for the sample rate"
-        main_window.data_handler.initialize(averages, duration, sample_rate)
-
-        
-        for i in range(averages):
-            # voltage_data = np.empty(int(duration * sample_rate))
-            voltage_data = main_window.data_handler.voltage_data[i]
-            
-            if main_window.measurement_stopped:
-                log.info("Measurement stopped")
-                main_window.data_handler.cut_data(i)
-                main_window.statusBar().showMessage("Measurement aborted")
-                return i
-            
-            # normal operation
-            main_window.statusBar().showMessage(f"Measurement in progress ({i+1} / {averages})")
-            driver_instance.get_sequence(
-                voltage_data,
-                i,
-                config,
-                main_window,
-                plotting_signal=progress_callback)
-    
-    except Exception as e:
-        main_window.statusBar().showMessage("Measurement failed")
-        main_window.main_ui.stop_measurement()
-        raise e
-    
-    return averages
+    _call = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._call.connect(self._run, Qt.ConnectionType.QueuedConnection)
+
+    def submit(self, function, *args, **kwargs) -> Future:
+        """Queues function(*args, **kwargs) and returns a future of its result.
+        On the thread of the dispatcher, the function is called right away."""
+        future = Future()
+        if QThread.currentThread() is self.thread():
+            self._run((future, function, args, kwargs))
+        else:
+            self._call.emit((future, function, args, kwargs))
+        return future
+
+    async def run(self, function, *args, **kwargs):
+        """Awaitable version of submit for the event loop of asyncio."""
+        return await asyncio.wrap_future(self.submit(function, *args, **kwargs))
+
+    @Slot(object)
+    def _run(self, call):
+        future, function, args, kwargs = call
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
 
 
 class WorkerSignals(QObject):
@@ -81,8 +99,13 @@ class WorkerSignals(QObject):
     result = Signal(object)
     progress = Signal(int)
 
+    @Slot()
+    def release(self):
+        """Drops the reference that kept the signals alive while the worker was running."""
+        Worker.active_signals.discard(self)
+
 
-from PySide6.QtCore import QRunnable, Slot, Signal, QObject
+from PySide6.QtCore import QRunnable, Slot, Signal, QObject, QMetaObject, Qt
 
 import sys
 import traceback
@@ -100,6 +123,10 @@ class Worker(QRunnable):
     :param kwargs: Keywords to pass to the callback function
 
     '''
+    
+    # The thread pool deletes the runnable when it is done, which would also delete
+    # its signals before the queued emissions are delivered to the GUI thread
+    active_signals = set()
 
     def __init__(self, fn, *args, **kwargs):
         super(Worker, self).__init__()
@@ -109,6 +136,7 @@ class Worker(QRunnable):
         self.args = args
         self.kwargs = kwargs
         self.signals = WorkerSignals()
+        Worker.active_signals.add(self.signals)
 
         # Add the callback to our kwargs
         self.kwargs['progress_callback'] = self.signals.progress
@@ -129,4 +157,6 @@ class Worker(QRunnable):
         else:
             self.signals.result.emit(result)  # Return the result of the processing
         finally:
-            self.signals.finished.emit()  # Done
\ No newline at end of file
+            self.signals.finished.emit()  # Done
+            # queued behind the emissions above
+            QMetaObject.invokeMethod(self.signals, "release", Qt.ConnectionType.QueuedConnection)
\ No newline at end of file
@@ -0,0 +1,289 @@
+"""This module contains the performance metrics of Spectran.
+
+The metrics are recorded as counters, gauges and histograms and rendered in the
+Prometheus text format, which is served by the API at /metrics and shown
+in the diagnostics window of the GUI."""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+# upper bounds of the histogram buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Metric(ABC):
+    """Base class of all metrics. Metrics with label names hold one child per
+    combination of label values, see labels.
+
+    Args:
+        name (str): name of the metric, e.g. "spectran_psd_seconds"
+        documentation (str): description shown in the HELP line
+        labelnames (tuple[str], optional): names of the labels. Defaults to ().
+    """
+    type = None
+
+    def __init__(self, name:str, documentation:str, labelnames:tuple=(),
+                 registry:"Registry"=None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        self.reset()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, **labels) -> "Metric":
+        """Returns the child with the given label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            if key not in self._children:
+                self._children[key] = self._new_child()
+            return self._children[key]
+
+    def _new_child(self) -> "Metric":
+        return self.__class__(self.name, self.documentation)
+
+    def reset(self):
+        self._children = {}
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        """Returns (name, labels, value) of all samples of the metric."""
+        if not self.labelnames:
+            return self._samples()
+        with self._lock:
+            children = list(self._children.items())
+        samples = []
+        for key, child in children:
+            labels = dict(zip(self.labelnames, key))
+            samples += [(name, {**labels, **extra}, value)
+                        for name, extra, value in child._samples()]
+        return samples
+
+    @abstractmethod
+    def _samples(self) -> list[tuple[str, dict, float]]:
+        """Returns (name, labels, value) of the samples of a metric without label names."""
+
+
+class Counter(Metric):
+    """A value that only increases, e.g. the number of written bytes."""
+    type = "counter"
+
+    def reset(self):
+        super().reset()
+        self.value = 0.0
+
+    def inc(self, amount:float=1):
+        with self._lock:
+            self.value += amount
+
+    def _samples(self):
+        return [(self.name, {}, self.value)]
+
+
+class Gauge(Metric):
+    """A value that can go up and down, e.g. the depth of a queue."""
+    type = "gauge"
+
+    def reset(self):
+        super().reset()
+        self.value = 0.0
+
+    def set(self, value:float):
+        self.value = value
+
+    def inc(self, amount:float=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount:float=1):
+        self.inc(-amount)
+
+    def _samples(self):
+        return [(self.name, {}, self.value)]
+
+
+class Histogram(Metric):
+    """Distribution of durations in cumulative buckets.
+
+    Args:
+        buckets (tuple[float], optional): upper bounds of the buckets.
+            Defaults to DEFAULT_BUCKETS.
+    """
+    type = "histogram"
+
+    def __init__(self, name:str, documentation:str, labelnames:tuple=(),
+                 registry:"Registry"=None, buckets:tuple=DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def reset(self):
+        super().reset()
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.last = None
+
+    def observe(self, value:float):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.count += 1
+            self.sum += value
+            self.last = value
+
+    @contextmanager
+    def time(self):
+        """Observes the duration of the with block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def mean(self) -> float|None:
+        return self.sum / self.count if self.count else None
+
+    def _samples(self):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            samples.append((f"{self.name}_bucket", {"le": format_value(bound)}, cumulative))
+        samples.append((f"{self.name}_sum", {}, self.sum))
+        samples.append((f"{self.name}_count", {}, self.count))
+        return samples
+
+
+class Registry():
+    """Collection of metrics that are rendered together."""
+
+    def __init__(self) -> None:
+        self.metrics = {}
+
+    def register(self, metric:Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def children(self) -> list[tuple[str, Metric]]:
+        """Returns (name, metric) per metric and label values, e.g. "name{label}"."""
+        children = []
+        for metric in self.metrics.values():
+            if metric.labelnames:
+                with metric._lock:
+                    items = list(metric._children.items())
+                children += [(f"{metric.name}{{{','.join(key)}}}", child) for key, child in items]
+            else:
+                children.append((metric.name, metric))
+        return children
+
+    def snapshot(self) -> dict:
+        """Returns the values of the counters and the count and sum of the histograms,
+        which can be passed to summary to show the changes since the snapshot.
+        Unlike reset, it does not change the exported metrics."""
+        values = {}
+        for name, child in self.children():
+            if isinstance(child, Histogram):
+                values[name] = (child.count, child.sum)
+            elif isinstance(child, Counter):
+                values[name] = child.value
+        return values
+
+    def summary(self, baseline:dict=None) -> list[tuple[str, str]]:
+        """Returns a human readable (name, value) per metric and label values, 
+        histograms are summarized by their count, mean and last value.
+
+        Args:
+            baseline (dict, optional): snapshot whose counters and histograms
+                are subtracted. Defaults to None.
+        """
+        baseline = baseline or {}
+        rows = []
+        for name, child in self.children():
+            if isinstance(child, Histogram):
+                count, total = baseline.get(name, (0, 0.0))
+                count, total = child.count - count, child.sum - total
+                if count:
+                    value = (f"n = {count}, mean = {total/count*1e3:.3g} ms, "
+                             f"last = {child.last*1e3:.3g} ms")
+                else:
+                    value = "n = 0"
+            elif isinstance(child, Counter):
+                value = f"{child.value - baseline.get(name, 0.0):.6g}"
+            else:
+                value = f"{child.value:.6g}"
+            rows.append((name, value))
+        return rows
+
+    def render(self) -> str:
+        """Returns all metrics in the Prometheus text format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                if labels:
+                    label_text = ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+                    name = f"{name}{{{label_text}}}"
+                lines.append(f"{name} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def format_value(value:float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def escape(value:str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = Registry()
+
+ACQUISITION_SECONDS = Histogram("spectran_acquisition_seconds",
+                                "Duration of the acquisition of one average", registry=REGISTRY)
+SAMPLES_ACQUIRED = Counter("spectran_samples_acquired_total",
+                           "Number of acquired samples", registry=REGISTRY)
+SAMPLES_PER_SECOND = Gauge("spectran_samples_per_second",
+                           "Acquisition rate of the last average", registry=REGISTRY)
+PSD_SECONDS = Histogram("spectran_psd_seconds",
+                        "Duration of the psd calculation", registry=REGISTRY)
+FILTER_SECONDS = Histogram("spectran_filter_seconds",
+                           "Duration of filtering one average", registry=REGISTRY)
+PSD_QUEUE_DEPTH = Gauge("spectran_psd_queue_depth",
+                        "Number of averages waiting for the psd calculation", registry=REGISTRY)
+PLOT_SECONDS = Histogram("spectran_plot_seconds",
+                         "Duration of rendering the plots", registry=REGISTRY)
+FRAMES_RENDERED = Counter("spectran_frames_rendered_total",
+                          "Number of rendered plot frames", registry=REGISTRY)
+FRAMES_DROPPED = Counter("spectran_frames_dropped_total",
+                         "Number of plot frames dropped by the frame rate limit", registry=REGISTRY)
+SAVE_SECONDS = Histogram("spectran_save_seconds",
+                         "Duration of saving a file", labelnames=("mode",), registry=REGISTRY)
+BYTES_WRITTEN = Counter("spectran_bytes_written_total",
+                        "Number of bytes written to saved files", registry=REGISTRY)
+API_REQUEST_SECONDS = Histogram("spectran_api_request_seconds",
+                                "Duration of API requests", labelnames=("method", "path"),
+                                registry=REGISTRY)
+STREAM_CLIENTS = Gauge("spectran_stream_clients",
+                       "Number of connected live stream clients", registry=REGISTRY)
+STREAM_FRAMES_SENT = Counter("spectran_stream_frames_sent_total",
+                             "Number of frames sent to live stream clients", registry=REGISTRY)
+STREAM_FRAMES_DROPPED = Counter("spectran_stream_frames_dropped_total",
+                                "Number of frames dropped for slow live stream clients", registry=REGISTRY)
@@ -1,5 +1,120 @@
 import pyqtgraph as pg
+import numpy as np
+from PySide6.QtCore import QObject, QTimer, Signal
 from . import log
+from .metrics import PLOT_SECONDS, FRAMES_RENDERED, FRAMES_DROPPED
+from .profiling import span
+from .settings import DEFAULT_SETTINGS
+
+
+class LogBinner():
+    """Reduces a spectrum to log-spaced frequency bins for displaying it on log axes.
+    The bin edges are calculated once per frequency grid.
+
+    Args:
+        bins (int, optional): number of log-spaced bins. Defaults to 2000.
+    """
+    
+    def __init__(self, bins:int=2000) -> None:
+        self.bins = bins
+        self._grid = None
+        self._starts = None
+        self._counts = None
+        self._centers = None
+        
+    def prepare(self, frequencies:np.ndarray):
+        """Calculates the bin edges if the frequency grid changed."""
+        grid = (len(frequencies), frequencies[0], frequencies[-1])
+        if grid == self._grid:
+            return
+        edges = np.geomspace(frequencies[0], frequencies[-1], self.bins + 1)
+        # at low frequencies several log bins share one frequency, those are merged
+        self._starts = np.unique(np.searchsorted(frequencies, edges[:-1]))
+        self._counts = np.diff(np.append(self._starts, len(frequencies)))
+        self._centers = np.add.reduceat(frequencies, self._starts) / self._counts
+        self._grid = grid
+        
+    def reduce(self, frequencies:np.ndarray, psd:np.ndarray, mode:str="mean"):
+        """Aggregates the psd into the log-spaced bins.
+
+        Args:
+            frequencies (np.ndarray): frequencies without 0 Hz
+            psd (np.ndarray): psd at the frequencies
+            mode (str, optional): "mean" or "max" to preserve peaks. Defaults to "mean".
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: mean frequencies and psd of the bins
+        """
+        self.prepare(frequencies)
+        if mode == "max":
+            return self._centers, np.maximum.reduceat(psd, self._starts)
+        return self._centers, np.add.reduceat(psd, self._starts) / self._counts
+
+
+class PlotScheduler(QObject):
+    """Coalesces plot requests, so that the plots are redrawn at most 
+    max_fps times per second. Only the latest requested state is drawn, 
+    intermediate requests are skipped.
+    """
+    
+    frames_changed = Signal(int, int) # rendered, skipped
+
+    def __init__(self, plots, max_fps=DEFAULT_SETTINGS["graphics/max_fps"]) -> None:
+        super().__init__(plots)
+        self.plots = plots
+        self.rendered = 0
+        self.skipped = 0
+        self._pending = False
+        self._index = None
+        self._force_draw = False
+        
+        # the timer enforces the pause between two frames
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.render)
+        self.set_max_fps(max_fps)
+
+    def set_max_fps(self, max_fps):
+        self.timer.setInterval(int(1000 / max(int(max_fps), 1)))
+        
+    def reset(self):
+        self.rendered = 0
+        self.skipped = 0
+        self.frames_changed.emit(self.rendered, self.skipped)
+
+    def request(self, index=None, force_draw=False):
+        """Requests a redraw of the plots. Has to be called from the GUI thread.
+
+        Args:
+            index (int, optional): index of the average to plot. None plots the final data.
+            force_draw (bool, optional): plot even if plotting is disabled. Defaults to False.
+        """
+        if self._pending:
+            self.skipped += 1
+            FRAMES_DROPPED.inc()
+        # the final frame (index None) must not be replaced by a late intermediate one
+        if not (self._pending and self._index is None):
+            self._index = index
+        self._force_draw = self._force_draw or force_draw
+        self._pending = True
+        
+        # draw immediately if there was no frame recently
+        if not self.timer.isActive():
+            self.render()
+            self.timer.start()
+        
+    def render(self):
+        if not self._pending:
+            self.timer.stop()
+            return
+        index, force_draw = self._index, self._force_draw
+        self._pending = False
+        self._index = None
+        self._force_draw = False
+        with PLOT_SECONDS.time():
+            self.plots.update_plots(index=index, force_draw=force_draw)
+        self.rendered += 1
+        FRAMES_RENDERED.inc()
+        self.frames_changed.emit(self.rendered, self.skipped)
 
 
 class Plots(pg.GraphicsLayoutWidget):
@@ -20,6 +135,11 @@ class Plots(pg.GraphicsLayoutWidget):
         self.addItem(self.coords_plot2, col=0)
         self.nextRow()
         self.plot2 = self.addPlot()
+        self.nextRow()
+        self.allan_label = pg.LabelItem("Allan Deviation", justify="center", size="large")
+        self.addItem(self.allan_label, col=0)
+        self.nextRow()
+        self.plot3 = self.addPlot()
 
         # Add gridlines to the plots
         self.plot1.showGrid(x=True, y=True, alpha=0.3)
@@ -33,7 +153,41 @@ class Plots(pg.GraphicsLayoutWidget):
         self.plot2.setLogMode(x=True, y=True)
         self.plot2.getAxis("left").enableAutoSIPrefix(enable=False)
         self.plot2.getAxis("bottom").enableAutoSIPrefix(enable=False)
+        self.plot3.showGrid(x=True, y=True, alpha=0.3)
+        self.plot3.setLabel("left", "Deviation (V)")
+        self.plot3.setLabel("bottom", "Tau", units="s")
+        self.plot3.setLogMode(x=True, y=True)
+        self.plot3.getAxis("left").enableAutoSIPrefix(enable=False)
+        self.plot3.getAxis("bottom").enableAutoSIPrefix(enable=False)
+        self.plot3.addLegend(offset=(-10, 10))
 
+        # Persistent curves that are updated with setData.
+        # Only the visible part is drawn and it is reduced to 
+        # about one min/max pair per pixel, so the redraw cost 
+        # does not depend on the record length
+        for plot in (self.plot1, self.plot2):
+            plot.setClipToView(True)
+            plot.setDownsampling(auto=True, mode="peak")
+        self.signal_curve = self.plot1.plot(pen=pg.mkPen(width=.5, color="w"), 
+                                            skipFiniteCheck=True)
+        self.spectrum_curve = self.plot2.plot(pen=pg.mkPen(width=.5, color="w"), 
+                                              skipFiniteCheck=True)
+        self.adev_curve = self.plot3.plot(pen=pg.mkPen(width=1, color="w"), name="ADEV")
+        self.mdev_curve = self.plot3.plot(pen=pg.mkPen(width=1, color="c"), name="MDEV")
+        # the Allan deviation is only shown if it is calculated, see MainUI.set_compute_allan
+        self.set_allan_visible(False)
+
+        self.scheduler = PlotScheduler(self)
+        
+        # the signal is displayed from the envelope that matches the view range
+        self._signal_index = None
+        self.plot1.sigXRangeChanged.connect(self.refresh_signal_plot)
+        
+        # the spectrum is reduced to log-spaced bins unless it is zoomed in
+        self.psd_binning = "mean" # "mean", "max" or None for full resolution
+        self.log_binner = LogBinner()
+        self._spectrum = None
+        self.plot2.sigXRangeChanged.connect(self.refresh_spectrum_plot)
 
         self.proxy = pg.SignalProxy(self.plot2.scene().sigMouseMoved, rateLimit=60, slot=self.on_mouse_move)
 
@@ -50,26 +204,24 @@ class Plots(pg.GraphicsLayoutWidget):
             y = 10 ** mousePoint.y() if self.plot2.ctrl.logYCheck.isChecked() else mousePoint.y()
             self.coords_plot2.setText(f"x = {x:.3e}, y = {y:.3e}")
 
+    @span("update_plots")
     def update_plots(self, index=None, force_draw=False):
         
         log.debug("Updating plots to index {}".format(index))
         
         # check if we should stop plotting (this is done to close threads that are still running)
-        if self.main_window.main_ui.stop_plotting and index is not None:
+        if self.main_window.data_handler.stop_plotting and index is not None:
             log.debug("Stop plotting at index {}".format(index))
             return
         if self.main_window.data_handler.voltage_data is None:
             log.debug("Nothing to plot")
             return
         
-        if index is None:
+        # in the coherent mode, only the mean is stored
+        if index is None or self.main_window.data_handler.coherent is not None:
             index = -1
         
-        self.update_signal_plot(
-            self.main_window.data_handler.time_seq, 
-            self.main_window.data_handler.voltage_data[index,:],
-            force_draw=force_draw
-        )
+        self.show_signal(index, force_draw=force_draw)
         
         if (self.main_window.data_handler.psd is not None
             and self.main_window.data_handler.frequencies is not None):
@@ -79,24 +231,124 @@ class Plots(pg.GraphicsLayoutWidget):
                 self.main_window.data_handler.psd[1:],
                 force_draw=force_draw
             )
+        self.update_allan_plot()
 
     def update_signal_plot(self, x, y, force_draw=False):
-        # clear the plot
-        self.plot1.clear()
-        
         if force_draw or self.main_window.main_ui.plot_signal_cb.isChecked():        
             # plot the new data
-            self.plot1.plot(x, y,
-                            pen=pg.mkPen(width=.5, color="w"))
+            self.signal_curve.setData(x, y)
+        else:
+            self.signal_curve.clear()
+
+    def show_signal(self, index=-1, force_draw=False):
+        """Displays a record of the data handler in the signal plot.
+        Only the visible part is plotted, using the min/max envelope 
+        if there are many samples per pixel.
+
+        Args:
+            index (int, optional): index of the record. Defaults to -1.
+            force_draw (bool, optional): plot even if plotting is disabled. Defaults to False.
+        """
+        if force_draw or self.main_window.main_ui.plot_signal_cb.isChecked():
+            self._signal_index = index
+            self.refresh_signal_plot()
+        else:
+            self._signal_index = None
+            self.signal_curve.clear()
+            
+    def refresh_signal_plot(self):
+        """Replots the displayed record for the current view range."""
+        data_handler = self.main_window.data_handler
+        if self._signal_index is None or data_handler.voltage_data is None:
+            return
+        
+        time_seq = data_handler.time_seq
+        samples = len(time_seq)
+        dt = time_seq[1] - time_seq[0] if samples > 1 else 1
+        pixels = max(int(self.plot1.vb.width()), 1)
+        if self.plot1.vb.state["autoRange"][0]:
+            start, stop = 0, samples
+        else:
+            # one view width to each side is included for smooth panning
+            x_min, x_max = self.plot1.vb.viewRange()[0]
+            width = x_max - x_min
+            start = min(max(int((x_min - width - time_seq[0]) / dt), 0), samples)
+            stop = min(max(int((x_max + width - time_seq[0]) / dt) + 2, 0), samples)
+            pixels *= 3
+        
+        selection = data_handler.signal_envelope(self._signal_index, start, stop, pixels)
+        if selection is None:
+            x = time_seq[start:stop]
+            y = data_handler.voltage_data[self._signal_index, start:stop]
+        else:
+            positions, y = selection
+            x = time_seq[0] + positions * dt
+        self.signal_curve.setData(x, y)
 
     def update_spectrum_plot(self, x, y, force_draw=False):
-        # clear the plot
-        self.plot2.clear()
-        # plot the new data
         if force_draw or self.main_window.main_ui.plot_spectrum_cb.isChecked():
-            self.plot2.plot(x, y,
-                            pen=pg.mkPen(width=.5, color="w"))
+            # plot the new data
+            self._spectrum = x, y
+            self.refresh_spectrum_plot()
+        else:
+            self._spectrum = None
+            self.spectrum_curve.clear()
+            
+    def set_psd_binning(self, mode:str|None):
+        """Sets the display reduction of the spectrum.
+
+        Args:
+            mode (str|None): "mean", "max" or None for full resolution
+        """
+        self.psd_binning = mode
+        self.refresh_spectrum_plot()
+            
+    def refresh_spectrum_plot(self):
+        """Replots the spectrum, reduced to log-spaced bins if there are 
+        more frequencies visible than bins."""
+        if self._spectrum is None:
+            return
+        
+        x, y = self._spectrum
+        if self.psd_binning is None or len(x) <= self.log_binner.bins:
+            self.spectrum_curve.setData(x, y)
+            return
+        
+        if not self.plot2.vb.state["autoRange"][0]:
+            # the view range is in log10 units, one view width to each side is included
+            x_min, x_max = self.plot2.vb.viewRange()[0]
+            width = x_max - x_min
+            start, stop = np.searchsorted(x, (10**(x_min - width), 10**(x_max + width)))
+            if stop - start <= self.log_binner.bins:
+                self.spectrum_curve.setData(x[start:stop], y[start:stop])
+                return
+            
+        self.spectrum_curve.setData(*self.log_binner.reduce(x, y, mode=self.psd_binning))
                 
+    def set_allan_visible(self, visible:bool):
+        self.show_allan = visible
+        self.allan_label.setVisible(visible)
+        self.plot3.setVisible(visible)
+        if visible:
+            self.update_allan_plot()
+
+    def update_allan_plot(self):
+        """Plots the Allan deviations of the records that have been processed so far."""
+        allan = self.main_window.data_handler.allan if self.show_allan else None
+        if allan is None or not allan.done:
+            self.adev_curve.clear()
+            self.mdev_curve.clear()
+            return
+        taus, adev, mdev = allan.taus, allan.adev, allan.mdev
+        valid = np.isfinite(adev) & (adev > 0)
+        self.adev_curve.setData(taus[valid], adev[valid])
+        valid = np.isfinite(mdev) & (mdev > 0)
+        self.mdev_curve.setData(taus[valid], mdev[valid])
+
     def clear_plots(self):
-        self.plot1.clear()
-        self.plot2.clear()
+        self._signal_index = None
+        self._spectrum = None
+        self.signal_curve.clear()
+        self.spectrum_curve.clear()
+        self.adev_curve.clear()
+        self.mdev_curve.clear()
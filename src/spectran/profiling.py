@@ -0,0 +1,138 @@
+"""This module contains opt-in profiling and tracing of the main stages.
+
+Functions decorated with `span` are recorded when profiling is enabled via
+the environment variable SPECTRAN_PROFILE or the setting misc/profiling:
+
+- "cprofile": every thread is profiled with cProfile while it runs a span,
+  the statistics are written per thread to spectran_<thread>_<id>.prof (open with snakeviz)
+- "trace": the spans are written as Chrome trace events to spectran_trace.json
+  (open with https://ui.perfetto.dev or chrome://tracing)
+
+The files are written into SPECTRAN_PROFILE_DIR (default: working directory)
+when disable is called. When profiling is disabled, a span only costs one check.
+"""
+
+import cProfile
+import functools
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from . import log
+
+PROFILING_MODES = ("off", "cprofile", "trace")
+
+_mode = "off"
+_directory = Path(".")
+_lock = threading.Lock()
+_local = threading.local()
+_profilers = {} # cProfile.Profile by thread name and id
+_events = [] # chrome trace events
+
+
+def enable(mode:str = None, directory:str|Path = None):
+    """Enables profiling.
+
+    Args:
+        mode (str, optional): one of PROFILING_MODES. Defaults to SPECTRAN_PROFILE or "off".
+        directory (str|Path, optional): where the results are written.
+            Defaults to SPECTRAN_PROFILE_DIR or the working directory.
+    """
+    global _mode, _directory
+    mode = mode or os.getenv("SPECTRAN_PROFILE", "off")
+    if mode not in PROFILING_MODES:
+        raise ValueError(f"Unknown profiling mode {mode}, use one of {PROFILING_MODES}")
+    _directory = Path(directory or os.getenv("SPECTRAN_PROFILE_DIR", "."))
+    _mode = mode
+    if mode != "off":
+        log.info("Profiling enabled with {}, results are written to {}".format(mode, _directory.resolve()))
+
+
+def disable() -> list[Path]:
+    """Disables profiling and writes the results.
+
+    Returns:
+        list[Path]: written files
+    """
+    global _mode
+    mode, _mode = _mode, "off"
+    files = []
+    with _lock:
+        if mode == "cprofile":
+            _directory.mkdir(parents=True, exist_ok=True)
+            for (thread_name, thread_id), profiler in _profilers.items():
+                file_path = _directory / "spectran_{}_{}.prof".format(
+                    re.sub(r"\W", "_", thread_name), thread_id)
+                profiler.dump_stats(file_path)
+                files.append(file_path)
+        elif mode == "trace" and _events:
+            _directory.mkdir(parents=True, exist_ok=True)
+            file_path = _directory / "spectran_trace.json"
+            # name the threads in the viewer
+            threads = {(event["pid"], event["tid"]): event["args"]["thread"] for event in _events}
+            metadata = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, 
+                         "args": {"name": thread_name}}
+                        for (pid, tid), thread_name in threads.items()]
+            with open(file_path, "w") as f:
+                json.dump({"traceEvents": metadata + _events, "displayTimeUnit": "ms"}, f)
+            files.append(file_path)
+        _profilers.clear()
+        _events.clear()
+    for file_path in files:
+        log.info("Profile written to {}".format(file_path))
+    return files
+
+
+def is_enabled() -> bool:
+    return _mode != "off"
+
+
+def span(name:str):
+    """Decorator that records the decorated function as a span named name."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _mode == "off":
+                return function(*args, **kwargs)
+            if _mode == "cprofile":
+                return _profile(function, args, kwargs)
+            return _trace(name, function, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def _profile(function, args, kwargs):
+    # nested spans are covered by the outermost one
+    if getattr(_local, "active", False):
+        return function(*args, **kwargs)
+    thread = threading.current_thread()
+    with _lock:
+        profiler = _profilers.setdefault((thread.name, thread.ident), cProfile.Profile())
+    try:
+        profiler.enable()
+    except ValueError:
+        # since Python 3.12 only one profiler can be active at a time
+        return function(*args, **kwargs)
+    _local.active = True
+    try:
+        return function(*args, **kwargs)
+    finally:
+        profiler.disable()
+        _local.active = False
+
+
+def _trace(name, function, args, kwargs):
+    thread = threading.current_thread()
+    start = time.perf_counter_ns()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        end = time.perf_counter_ns()
+        event = {"name": name, "ph": "X", "pid": os.getpid(), "tid": thread.ident,
+                 "ts": start / 1e3, "dur": (end - start) / 1e3,
+                 "args": {"thread": thread.name}}
+        with _lock:
+            _events.append(event)
@@ -1,19 +1,42 @@
 from PySide6.QtCore import QSettings
 from . import log, ureg
+from .catalog import DEFAULT_CATALOG_PATH
 
-DEFAULT_VALUES = {
-    "input_channel": "",
-    "sample_rate": 100_000 * ureg.Hz,
-    "duration": 2 * ureg.second,
-    "averages": 1,
-    "signal_range_min": -5 * ureg.volt, 
-    "signal_range_max":  5 * ureg.volt,
-    "unit": "Volt",
+# defaults of the quantities in the units of the input fields, 
+# they are shown before the unit registry has been created
+DEFAULT_MAGNITUDES = {
+    "sample_rate": (100, "kHz"),
+    "duration": (2, "second"),
+    "signal_range_min": (-5, "volt"),
+    "signal_range_max": (5, "volt"),
 }
 
+
+def __getattr__(name:str):
+    """Creates DEFAULT_VALUES when it is used first (PEP 562), 
+    so that importing the GUI does not create the unit registry."""
+    global DEFAULT_VALUES
+    if name == "DEFAULT_VALUES":
+        quantities = {key: magnitude * getattr(ureg, unit) 
+                      for key, (magnitude, unit) in DEFAULT_MAGNITUDES.items()}
+        DEFAULT_VALUES = {
+            "input_channel": "",
+            "sample_rate": quantities["sample_rate"].to(ureg.Hz),
+            "duration": quantities["duration"],
+            "averages": 1,
+            "signal_range_min": quantities["signal_range_min"],
+            "signal_range_max": quantities["signal_range_max"],
+            "unit": "Volt",
+        }
+        return DEFAULT_VALUES
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 DEFAULT_SETTINGS = {
     "graphics/style": "Fusion",
+    "graphics/max_fps": 30,
     "misc/file_extensions": [".txt", ".csv"],
+    "misc/catalog_path": str(DEFAULT_CATALOG_PATH),
+    "misc/profiling": "off",
     "api/host": "127.0.0.1",
     "api/port": 8111,    
 }
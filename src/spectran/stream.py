@@ -0,0 +1,156 @@
+"""This module contains the live stream of a running measurement.
+
+Every processed average is sent to the connected clients as a binary frame:
+a little-endian uint32 with the length of a JSON header, the header and
+the running PSD as float64. The header contains the index of the average,
+a summary of it (rms, min, max, mean) and the frequency grid of the PSD
+(f_start, f_step). Frames of the final PSD have index None and final True.
+
+Each client only holds the latest frame. If it is not sent yet when the next
+one arrives, the older one is dropped, so slow clients never stall the measurement.
+"""
+
+import asyncio
+import json
+import struct
+import threading
+import numpy as np
+
+from . import log
+from .metrics import STREAM_CLIENTS, STREAM_FRAMES_DROPPED
+
+
+def encode_frame(header:dict, psd:np.ndarray) -> bytes:
+    header_bytes = json.dumps(header).encode()
+    return (struct.pack("<I", len(header_bytes)) + header_bytes
+            + np.ascontiguousarray(psd, dtype="<f8").tobytes())
+
+
+def decode_frame(frame:bytes) -> dict:
+    """Decodes a frame of the live stream.
+
+    Returns:
+        dict: the header with the additional arrays "frequencies" and "psd"
+    """
+    length, = struct.unpack_from("<I", frame)
+    header = json.loads(frame[4:4+length])
+    psd = np.frombuffer(frame, dtype="<f8", offset=4+length)
+    header["psd"] = psd
+    header["frequencies"] = header["f_start"] + header["f_step"] * np.arange(len(psd))
+    return header
+
+
+def reduce_psd(frequencies:np.ndarray, psd:np.ndarray, max_points:int|None):
+    """Averages blocks of neighboring bins, so that at most max_points remain.
+
+    Returns:
+        tuple[float, float, np.ndarray]: first frequency, frequency step and the psd
+    """
+    f_step = frequencies[1] - frequencies[0] if len(frequencies) > 1 else 0.0
+    if max_points is None or len(psd) <= max_points:
+        return float(frequencies[0]), float(f_step), psd
+    block = -(-len(psd) // max_points)
+    points = len(psd) // block
+    reduced = psd[:points * block].reshape(points, block).mean(axis=1)
+    f_start = frequencies[0] + f_step * (block - 1) / 2
+    return float(f_start), float(f_step * block), reduced
+
+
+class StreamClient():
+    """A connected client of the live stream.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): event loop of the connection
+        decimation (int, optional): send only every n-th average. Defaults to 1.
+        max_points (int, optional): maximal number of PSD bins. Defaults to None (all).
+    """
+
+    def __init__(self, loop, decimation:int=1, max_points:int=None) -> None:
+        self.loop = loop
+        self.decimation = max(1, decimation)
+        self.max_points = max_points
+        self.dropped = 0
+        self._frame = None
+        self._event = asyncio.Event()
+
+    def offer(self, frame:bytes):
+        """Replaces the pending frame. Has to be called on the event loop."""
+        if self._frame is not None:
+            self.dropped += 1
+            STREAM_FRAMES_DROPPED.inc()
+        self._frame = frame
+        self._event.set()
+
+    async def get(self) -> bytes:
+        """Waits for the next frame."""
+        await self._event.wait()
+        self._event.clear()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+class LiveStream():
+    """Sends the averages and the running PSD of the engine to all clients.
+
+    Args:
+        engine (MeasurementEngine): engine to listen to
+    """
+
+    def __init__(self, engine) -> None:
+        self.engine = engine
+        self.clients = set()
+        self._lock = threading.Lock()
+        engine.subscribe("data_updated", self.data_updated)
+
+    def connect(self, loop, decimation:int=1, max_points:int=None) -> StreamClient:
+        client = StreamClient(loop, decimation, max_points)
+        with self._lock:
+            self.clients.add(client)
+        STREAM_CLIENTS.inc()
+        return client
+
+    def disconnect(self, client:StreamClient):
+        with self._lock:
+            if client not in self.clients:
+                return
+            self.clients.discard(client)
+        STREAM_CLIENTS.dec()
+        log.debug("Stream client disconnected, {} frames dropped".format(client.dropped))
+
+    def data_updated(self, index:int|None):
+        """Called by the engine on the thread that processed the data."""
+        with self._lock:
+            clients = [c for c in self.clients if index is None or index % c.decimation == 0]
+        if not clients:
+            return
+        data_handler = self.engine.data_handler
+        if data_handler.voltage_data is None:
+            return
+
+        if index is None and data_handler.coherent is None:
+            averages = data_handler.voltage_data.shape[0]
+        else:
+            averages = len(data_handler.done_indices)
+        header = {"index": index, "final": index is None, "averages": averages}
+        if index is not None:
+            record = np.asarray(data_handler.record(index))
+            header.update(rms=float(np.sqrt(np.mean(record**2))), min=float(record.min()),
+                          max=float(record.max()), mean=float(record.mean()))
+
+        # the frames are encoded once per resolution and not per client
+        frames = {}
+        for client in clients:
+            if client.max_points not in frames:
+                if data_handler.frequencies is None:
+                    # the psd is not calculated, only the summary is sent
+                    f_start, f_step, psd = 0.0, 0.0, np.empty(0)
+                else:
+                    f_start, f_step, psd = reduce_psd(data_handler.frequencies,
+                                                      data_handler.psd, client.max_points)
+                frames[client.max_points] = encode_frame(
+                    {**header, "f_start": f_start, "f_step": f_step}, psd)
+            try:
+                client.loop.call_soon_threadsafe(client.offer, frames[client.max_points])
+            except RuntimeError:
+                # the event loop of the client has been closed
+                self.disconnect(client)
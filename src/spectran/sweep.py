@@ -0,0 +1,148 @@
+"""This module contains sweeps, which run measurements with a list of
+configuration changes back-to-back without a round trip per step.
+
+The data of each step is saved in the background while the next step is
+already configured and measured, see DataHandler.snapshot."""
+
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import log
+from .data_handler import SAVING_MODES, default_file_name
+
+# states of a sweep and of its steps
+PENDING = "pending"
+RUNNING = "running"
+SAVING = "saving"
+FINISHED = "finished"
+ABORTED = "aborted"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Sweep():
+    """Runs a measurement for each step with the base configuration updated by the step.
+
+    Example:
+        steps = [{"sample_rate": rate * ureg.Hz} for rate in (1e5, 2e5, 5e5)]
+        sweep = Sweep(engine, driver, config, steps, directory="data")
+        sweep.run()
+        sweep.results
+
+    Args:
+        engine (MeasurementEngine): engine that runs the measurements
+        driver_instance (DAQ): driver with a connected device
+        config (dict): base configuration, see settings.DEFAULT_VALUES
+        steps (list[dict]): configuration changes of each step
+        directory (str|Path, optional): where the data of each step is saved. 
+            Defaults to None (not saved).
+        file_name (str, optional): name of the files, formatted with step 
+            and the configuration of the step. Defaults to "sweep_{step}" and 
+            the suffix of the mode.
+        mode (SAVING_MODES, optional): how the files are saved. Defaults to HDF5.
+        save_kwargs (dict, optional): passed to DataHandler.save_file.
+
+    Raises:
+        ValueError: if a step changes "step", which is the index of the step in file_name
+    """
+
+    def __init__(self, engine, driver_instance, config:dict, steps:list[dict],
+                 directory:str|Path = None, file_name:str = None, 
+                 mode:SAVING_MODES = SAVING_MODES.HDF5, save_kwargs:dict = None) -> None:
+        for changes in steps:
+            if "step" in changes:
+                raise ValueError("A sweep cannot change \"step\", it is the index of the step in the file name")
+        self.id = uuid.uuid4().hex
+        self.engine = engine
+        self.driver_instance = driver_instance
+        self.config = config
+        self.steps = steps
+        self.directory = None if directory is None else Path(directory)
+        suffix = Path(default_file_name(mode)).suffix
+        self.file_name = file_name or "sweep_{step}" + suffix
+        self.mode = mode
+        self.save_kwargs = save_kwargs or {}
+        self.status = PENDING
+        self.results = [{"step": i, "status": PENDING, "averages": None, 
+                         "file_path": None, "error": None} for i in range(len(steps))]
+        self._cancel_event = threading.Event()
+        self.thread = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (FINISHED, FAILED, CANCELLED)
+
+    def start(self) -> threading.Thread:
+        """Runs the sweep in a separate thread. See run."""
+        self.thread = threading.Thread(target=self.run, name="spectran-sweep", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def cancel(self):
+        """Stops the running measurement and skips the remaining steps."""
+        self._cancel_event.set()
+        if self.status == RUNNING:
+            self.engine.stop()
+
+    def run(self) -> list[dict]:
+        """Runs all steps and blocks until the last file is saved.
+        A failed measurement ends the sweep, failed saving only the step.
+
+        Returns:
+            list[dict]: result of each step with the keys step, status, averages, 
+                file_path and error
+        """
+        self.status = RUNNING
+        # saving of the previous step overlaps with the measurement of the next one
+        saver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spectran-save")
+        try:
+            for step, changes in enumerate(self.steps):
+                if self._cancel_event.is_set():
+                    break
+                result = self.results[step]
+                result["status"] = RUNNING
+                config = {**self.config, **changes}
+                try:
+                    result["averages"] = self.engine.run(self.driver_instance, config)
+                except Exception as e:
+                    result.update(status=FAILED, error=str(e))
+                    self.status = FAILED
+                    break
+                status = self.engine.result["status"]
+
+                if self.directory is not None and result["averages"]:
+                    result["status"] = SAVING
+                    file_path = self.directory / self.file_name.format(step=step, **changes)
+                    saver.submit(self._save, result, self.engine.data_handler.snapshot(), 
+                                 file_path, status)
+                else:
+                    result["status"] = status
+        finally:
+            saver.shutdown(wait=True)
+
+        for result in self.results:
+            if result["status"] == PENDING:
+                result["status"] = CANCELLED
+        if self.status == RUNNING:
+            self.status = CANCELLED if self._cancel_event.is_set() else FINISHED
+        log.info("Sweep {} {}".format(self.id, self.status))
+        return self.results
+
+    def _save(self, result:dict, data_handler, file_path:Path, status:str):
+        try:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            result["file_path"] = str(data_handler.save_file(file_path, mode=self.mode, 
+                                                             **self.save_kwargs))
+            result["status"] = status
+        except Exception as e:
+            log.exception("Saving step {} of sweep {} failed".format(result["step"], self.id))
+            result.update(status=FAILED, error=str(e))
+
+    def summary(self) -> dict:
+        """Returns the id, status, number of done steps and the results."""
+        return {"id": self.id, "status": self.status, "steps": len(self.steps),
+                "done": sum(result["status"] not in (PENDING, RUNNING, SAVING) 
+                            for result in self.results),
+                "results": self.results}
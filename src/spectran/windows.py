@@ -19,7 +19,7 @@ from PySide6.QtWidgets import (
     QDialog,
 )
 from PySide6.QtGui import QIcon, QRegularExpressionValidator
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 
 # relative imports
 from . import __version__ as spectran_version
@@ -27,6 +27,8 @@ from . import spectran_path
 from .settings import Settings, DEFAULT_SETTINGS
 from . import log
 from .data_handler import SAVING_MODES
+from .metrics import REGISTRY
+from .profiling import PROFILING_MODES
 
 class Window(QWidget):
     """
@@ -125,6 +127,15 @@ class SaveWindow(Dialog):
         self.save_psd.setChecked(False)
         options_layout.addWidget(self.save_psd, row, 1)
 
+        # save envelope
+        row += 1
+        save_envelope_label = QLabel("Save Envelope", self)
+        options_layout.addWidget(save_envelope_label, row, 0)
+        self.save_envelope = QCheckBox(self)
+        self.save_envelope.setChecked(False)
+        self.save_envelope.setToolTip("Save min/max envelopes of the signal for fast previews when reloading.")
+        options_layout.addWidget(self.save_envelope, row, 1)
+
         # Save Button
         self.save_button = QPushButton("Save", self)
         self.save_button.clicked.connect(self.save)
@@ -144,6 +155,8 @@ class SaveWindow(Dialog):
         self.save_time_line.setChecked(False)
         self.save_psd.setEnabled(show)
         self.save_psd.setChecked(False)
+        self.save_envelope.setEnabled(show)
+        self.save_envelope.setChecked(False)
 
     def save(self):
         """Save the data to a file.
@@ -153,9 +166,24 @@ class SaveWindow(Dialog):
         mode = self.mode_dd.currentData()
         save_psds = self.save_psd.isChecked()
         save_time_line = self.save_time_line.isChecked()
-        path = self.parent().data_handler.save_file(mode=mode,
-                                                  save_psds=save_psds,
-                                                  save_time_line=save_time_line)
+        save_envelope = self.save_envelope.isChecked()
+        main_window = self.parent()
+        path = None
+        if not main_window.measurement_stopped:
+            main_window.raise_error("Measurement is still running. Stop it first.")
+        elif main_window.data_handler.voltage_data is None:
+            main_window.raise_error("No data to save")
+        else:
+            path = main_window.save_file_dialog(mode)
+        if path:
+            try:
+                path = main_window.data_handler.save_file(path, mode=mode,
+                                                          save_psds=save_psds,
+                                                          save_time_line=save_time_line,
+                                                          save_envelope=save_envelope)
+            except (RuntimeError, ValueError, OSError) as e:
+                main_window.raise_error(e)
+                path = None
         self.save_button.setEnabled(True) 
         if path:
             self.status_bar.showMessage(f"Data saved to {path}")
@@ -247,6 +275,30 @@ class SettingsWindow(Window):
         self.file_extensions_layout.addWidget(self.file_extensions)
         self.misc_layout.addLayout(self.file_extensions_layout)
 
+        self.catalog_path_layout = QHBoxLayout()
+        self.catalog_path_label = QLabel("Catalog Path", self)
+        self.catalog_path_layout.addWidget(self.catalog_path_label)
+        self.catalog_path = QLineEdit(self)
+        self.catalog_path.setToolTip("SQLite database in which all saved files are registered.\n"
+                                     "Spectran needs to restart for changes to take effect!")
+        self.catalog_path.setText(self.settings.value("misc/catalog_path"))
+        self.catalog_path.textChanged.connect(self.update_window)
+        self.catalog_path_layout.addWidget(self.catalog_path)
+        self.misc_layout.addLayout(self.catalog_path_layout)
+
+        self.profiling_layout = QHBoxLayout()
+        self.profiling_label = QLabel("Profiling", self)
+        self.profiling_layout.addWidget(self.profiling_label)
+        self.profiling_dd = QComboBox(self)
+        self.profiling_dd.addItems(PROFILING_MODES)
+        self.profiling_dd.setToolTip("Record cProfile statistics per thread or a trace of the main stages.\n"
+                                     "The results are written when Spectran is closed.\n"
+                                     "Spectran needs to restart for changes to take effect!")
+        self.profiling_dd.setCurrentText(self.settings.value("misc/profiling"))
+        self.profiling_dd.currentTextChanged.connect(self.update_window)
+        self.profiling_layout.addWidget(self.profiling_dd)
+        self.misc_layout.addLayout(self.profiling_layout)
+
         self.misc_layout.addStretch()
         
     def create_api_ui(self):
@@ -282,7 +334,11 @@ class SettingsWindow(Window):
         self.api_key = QLineEdit(self)
         self.api_key.setToolTip("The API Key can be changed in the environment variable API_KEY.")
         self.api_key.setReadOnly(True)
-        self.api_key.setText(self.parent.api_server.api_key)
+        if self.parent.api_server is not None:
+            self.api_key.setText(self.parent.api_server.api_key)
+        else:
+            # the server is started in the background after the startup
+            self.api_key.setPlaceholderText("API server not started yet")
         self.api_grid.addWidget(self.api_key, 2, 1)
         
         self.api_label = QLabel("Spectran needs to restart for\nthese changes to take effect!", self)
@@ -310,6 +366,19 @@ class SettingsWindow(Window):
         self.graphics_style_layout.addWidget(self.graphics_style_dd)
         self.graphics_layout.addLayout(self.graphics_style_layout)
 
+        # maximal redraw rate of the plots
+        self.max_fps_layout = QHBoxLayout()
+        self.max_fps_label = QLabel("Max. Plot FPS", self)
+        self.max_fps = QLineEdit(self)
+        self.max_fps.setValidator(QRegularExpressionValidator(r"^[1-9]\d{0,2}$", self))
+        self.max_fps.setPlaceholderText(str(DEFAULT_SETTINGS["graphics/max_fps"]))
+        self.max_fps.setToolTip("Plots are redrawn at most this often. Intermediate averages are skipped.")
+        self.max_fps.setText(str(self.settings.value("graphics/max_fps")))
+        self.max_fps.textChanged.connect(self.update_window)
+        self.max_fps_layout.addWidget(self.max_fps_label)
+        self.max_fps_layout.addWidget(self.max_fps)
+        self.graphics_layout.addLayout(self.max_fps_layout)
+
         self.graphics_layout.addStretch()
 
         self.graphics.setLayout(self.graphics_layout)
@@ -318,6 +387,7 @@ class SettingsWindow(Window):
         """Set Settings to a value."""
 
         self.graphics_style_dd.setCurrentText(settings.get("graphics/style"))
+        self.max_fps.setText(str(settings.get("graphics/max_fps")))
 
         host = settings.get("api/host")
         port = settings.get("api/port")
@@ -326,6 +396,8 @@ class SettingsWindow(Window):
         
         file_ext_string = ";".join(settings.get("misc/file_extensions"))
         self.file_extensions.setText(file_ext_string)
+        self.catalog_path.setText(settings.get("misc/catalog_path"))
+        self.profiling_dd.setCurrentText(settings.get("misc/profiling"))
         
         self.update_window()
 
@@ -345,7 +417,10 @@ class SettingsWindow(Window):
     def current_selection(self):
         return {
             "graphics/style": self.graphics_style_dd.currentText(),
+            "graphics/max_fps": int(self.max_fps.text()) if self.max_fps.text() else DEFAULT_SETTINGS["graphics/max_fps"],
             "misc/file_extensions": self.file_extensions.text().split(";"),
+            "misc/catalog_path": self.catalog_path.text() if self.catalog_path.text() else DEFAULT_SETTINGS["misc/catalog_path"],
+            "misc/profiling": self.profiling_dd.currentText(),
             "api/host": self.host.text() if self.host.text() else DEFAULT_SETTINGS["api/host"],
             "api/port": int(self.port.text()) if self.port.text() else DEFAULT_SETTINGS["api/port"],
         }
@@ -358,6 +433,7 @@ class SettingsWindow(Window):
 
         # update the window and the color palette
         self.parent.update_style()
+        self.parent.plots.scheduler.set_max_fps(self.settings.value("graphics/max_fps"))
 
         self.update_window()
        
@@ -405,3 +481,51 @@ class PropertiesWindow(Window):
         self.info_layout.addWidget(table)
         self.layout.addLayout(self.info_layout)
 
+
+class DiagnosticsWindow(Window):
+    """
+    The window displaying the performance metrics, see .metrics.
+    It is updated every second. Reset only changes the displayed values,
+    the counters exported at /metrics keep increasing.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(title="Diagnostics", *args, **kwargs)
+
+        self.setMinimumSize(600, 400)
+
+        self.layout.addWidget(QLabel("<b>Performance Metrics</b>"))
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(2)
+        self.table.setHorizontalHeaderLabels(["Metric", "Value"])
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.layout.addWidget(self.table)
+
+        self.baseline = None # snapshot of the metrics at the last reset
+        self.reset_button = QPushButton("Reset")
+        self.reset_button.clicked.connect(self.reset)
+        self.layout.addWidget(self.reset_button)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.update_table)
+        self.timer.start()
+        self.update_table()
+
+    def update_table(self):
+        rows = REGISTRY.summary(self.baseline)
+        self.table.setRowCount(len(rows))
+        for row, (name, value) in enumerate(rows):
+            self.table.setItem(row, 0, QTableWidgetItem(name))
+            self.table.setItem(row, 1, QTableWidgetItem(value))
+        self.table.resizeColumnToContents(0)
+
+    def reset(self):
+        self.baseline = REGISTRY.snapshot()
+        self.update_table()
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        super().closeEvent(event)
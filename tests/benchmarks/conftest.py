@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from spectran import ureg
+
+
+@pytest.fixture
+def make_data_handler(config):
+    """Returns a function that creates a DataHandler with random records
+    and the configuration of tests/conftest.py."""
+    from spectran.data_handler import DataHandler
+
+    def make_data_handler(samples, averages, sample_rate=100_000):
+        data_handler = DataHandler()
+        data_handler.config = {**config,
+                               "duration": samples / sample_rate * ureg.second,
+                               "sample_rate": sample_rate * ureg.Hz,
+                               "sample_rate_real": sample_rate * ureg.Hz,
+                               "averages": averages}
+        data_handler.initialize(averages, samples / sample_rate, sample_rate)
+        data_handler.voltage_data[:] = np.random.normal(size=data_handler.voltage_data.shape)
+        return data_handler
+    return make_data_handler
@@ -0,0 +1,12 @@
+import pytest
+
+from spectran.daq import DummyDAQ
+
+SAMPLE_RATE = 100_000
+DURATIONS = [0.01, 0.1, 1]
+
+@pytest.mark.parametrize("duration", DURATIONS)
+def test_acquire(benchmark, duration):
+    driver = DummyDAQ()
+    signal = benchmark(driver.acquire, duration, SAMPLE_RATE)
+    assert len(signal) == int(duration * SAMPLE_RATE)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from spectran import ureg
+from spectran.data_handler import DataHandler, SAVING_MODES, default_file_name
+
+SAMPLE_RATE = 100_000
+RECORD_SIZES = [10**3, 10**4, 10**5, 10**6]
+AVERAGES = [1, 10]
+SAVE_RECORD_SIZES = [10**4, 10**5]
+
+@pytest.mark.parametrize("averages", AVERAGES)
+@pytest.mark.parametrize("samples", RECORD_SIZES)
+def test_initialize(benchmark, samples, averages):
+    data_handler = DataHandler()
+    benchmark(data_handler.initialize, averages, samples / SAMPLE_RATE, SAMPLE_RATE)
+    assert data_handler.voltage_data.shape == (averages, samples)
+
+@pytest.mark.parametrize("samples", RECORD_SIZES)
+def test_calculate_psd(benchmark, samples, make_data_handler):
+    data_handler = make_data_handler(samples, 1)
+
+    def setup():
+        data_handler.done_indices = set()
+        data_handler.psd[:] = 0
+        return (0,), {}
+
+    benchmark.pedantic(data_handler.calculate_psd, setup=setup, rounds=10)
+    assert data_handler.psd.shape == (samples//2+1,)
+
+@pytest.mark.parametrize("averages", AVERAGES)
+@pytest.mark.parametrize("samples", RECORD_SIZES)
+def test_calculate_data(benchmark, samples, averages, make_data_handler):
+    """Calculation of all averages at the end of a measurement."""
+    data_handler = make_data_handler(samples, averages)
+    data_handler.stop_plotting = True
+
+    def setup():
+        data_handler.done_indices = set()
+        data_handler.envelope.done = set()
+        return (None,), {}
+
+    benchmark.pedantic(data_handler.calculate_data, setup=setup, rounds=5)
+    assert np.all(data_handler.psd >= 0)
+
+@pytest.mark.parametrize("mode", list(SAVING_MODES), ids=lambda mode: mode.name)
+@pytest.mark.parametrize("samples", SAVE_RECORD_SIZES)
+def test_save_file(benchmark, tmp_path, samples, mode, make_data_handler):
+    data_handler = make_data_handler(samples, 10)
+    file_path = benchmark.pedantic(data_handler.save_file, args=(tmp_path / default_file_name(mode),), 
+                                   kwargs={"mode": mode}, rounds=3)
+    assert file_path.exists()
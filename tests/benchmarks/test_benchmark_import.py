@@ -0,0 +1,38 @@
+import json
+import subprocess
+import sys
+
+# modules that scripts using the client must not pay for
+HEAVY_MODULES = ("PySide6", "pyqtgraph", "fastapi", "uvicorn", "scipy", "h5py", 
+                 "pint", "numpy", "requests", "httpx", "nidaqmx", "niscope")
+# generous limit, importing the client takes about 20 ms
+MAX_IMPORT_SECONDS = 0.2
+
+IMPORT_MODULE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+print(json.dumps({{"duration": duration, "modules": sorted(sys.modules)}}))
+"""
+
+def import_module(module:str) -> dict:
+    # a new interpreter, as the modules are cached in this one
+    output = subprocess.run([sys.executable, "-c", IMPORT_MODULE.format(module=module)], 
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+def import_client() -> dict:
+    return import_module("spectran.client")
+
+def test_import_client(benchmark):
+    result = benchmark(import_client)
+    heavy = {module.split(".")[0] for module in result["modules"]} & set(HEAVY_MODULES)
+    assert not heavy
+    assert result["duration"] < MAX_IMPORT_SECONDS
+
+def test_import_gui_without_pint():
+    # the unit registry is created in the background, see spectran.LazyUnitRegistry
+    modules = {module.split(".")[0] for module in import_module("spectran.app")["modules"]}
+    assert "PySide6" in modules
+    assert "pint" not in modules
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+RECORD_SIZES = [10**4, 10**5, 10**6, 10**7]
+
+def render(plots, x, y):
+    plots.update_signal_plot(x, y)
+    plots.update_spectrum_plot(x[1:], np.abs(y[1:]))
+    return plots.grab()
+
+@pytest.mark.parametrize("samples", RECORD_SIZES)
+def test_update_plots(benchmark, plots, samples):
+    x = np.linspace(0, 1, samples)
+    y = np.random.normal(size=samples)
+    benchmark(render, plots, x, y)
+
+@pytest.mark.parametrize("samples", RECORD_SIZES[:3])
+def test_update_plots_from_data_handler(benchmark, plots, samples, make_data_handler):
+    data_handler = make_data_handler(samples, 1)
+    data_handler.stop_plotting = True
+    data_handler.calculate_data(None)
+    plots.main_window.data_handler = data_handler
+
+    def update():
+        plots.update_plots(index=None, force_draw=True)
+        return plots.grab()
+
+    benchmark(update)
+
+@pytest.mark.parametrize("samples", RECORD_SIZES)
+def test_drawn_points_independent_of_record_length(plots, samples):
+    x = np.linspace(0, 1, samples)
+    y = np.random.normal(size=samples)
+    render(plots, x, y)
+    
+    # the signal is reduced to the min and max of autoDownsampleFactor bins per pixel
+    factor = plots.signal_curve.opts["autoDownsampleFactor"]
+    step = max(int(samples / (plots.plot1.vb.width() * factor)), 1)
+    points = 2 * (samples // step) if step > 1 else samples
+    assert len(plots.signal_curve.getData()[0]) <= points
+    # the spectrum to the log-spaced bins
+    assert len(plots.spectrum_curve.getData()[0]) <= plots.log_binner.bins
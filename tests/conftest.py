@@ -0,0 +1,77 @@
+import os
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from spectran import ureg
+
+# render without a display server
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# configuration of a saved measurement with 3 averages of 100 samples
+CONFIG = {
+    "driver": "DummyDAQ",
+    "device": "Dev1",
+    "start_time": "2024-01-01 12:00:00",
+    "input_channel": "ai1",
+    "terminal_config": "Test.RED",
+    "duration": 0.01 * ureg.second,
+    "sample_rate": 10_000 * ureg.Hz,
+    "sample_rate_real": 10_000 * ureg.Hz,
+    "signal_range_min": -5 * ureg.volt,
+    "signal_range_max": 5 * ureg.volt,
+    "signal_range_min_real": -5 * ureg.volt,
+    "signal_range_max_real": 5 * ureg.volt,
+    "averages": 3,
+    "unit": "Volt",
+}
+
+@pytest.fixture
+def config():
+    return CONFIG.copy()
+
+@pytest.fixture
+def make_config():
+    """Returns a function that creates the configuration of a short measurement
+    with the DummyDAQ, updated by its keyword arguments."""
+    from spectran.settings import DEFAULT_VALUES
+
+    def make_config(**values):
+        config = DEFAULT_VALUES.copy()
+        config.update(sample_rate=10_000 * ureg.Hz, duration=0.01 * ureg.second,
+                      averages=4, input_channel="ai1")
+        config.update(values)
+        return config
+    return make_config
+
+@pytest.fixture
+def data_handler(config):
+    from spectran.data_handler import DataHandler
+    data_handler = DataHandler()
+    data_handler.config = config
+    data_handler.initialize(3, 0.01, 10_000)
+    data_handler.voltage_data[:] = np.random.normal(size=data_handler.voltage_data.shape)
+    return data_handler
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    yield app
+
+@pytest.fixture
+def plots(qapp):
+    from spectran.plots import Plots
+    checked = SimpleNamespace(isChecked=lambda: True)
+    main_window = SimpleNamespace(
+        main_ui=SimpleNamespace(plot_signal_cb=checked, 
+                                plot_spectrum_cb=checked),
+    )
+    plots = Plots(main_window)
+    plots.resize(800, 600)
+    plots.show()
+    qapp.processEvents()
+    yield plots
+    plots.close()
+    plots.deleteLater()
+    qapp.processEvents()
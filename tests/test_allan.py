@@ -0,0 +1,49 @@
+import numpy as np
+
+from spectran.allan import AllanDeviation, averaging_factors
+
+SAMPLE_RATE = 1_000
+
+
+def reference(records, m):
+    """Overlapping and modified Allan deviation by their definition (NIST SP 1065)."""
+    tau = m / SAMPLE_RATE
+    squares, count, modified_squares, modified_count = 0, 0, 0, 0
+    for record in records:
+        phase = np.concatenate(([0], np.cumsum(record) / SAMPLE_RATE))
+        differences = [phase[i+2*m] - 2*phase[i+m] + phase[i] for i in range(len(phase) - 2*m)]
+        squares += sum(d**2 for d in differences)
+        count += len(differences)
+        for j in range(len(differences) - m + 1):
+            modified_squares += sum(differences[j:j+m])**2
+            modified_count += 1
+    return (np.sqrt(squares / (2 * tau**2 * count)),
+            np.sqrt(modified_squares / (2 * m**2 * tau**2 * modified_count)))
+
+def test_matches_definition():
+    records = np.random.default_rng(0).normal(size=(3, 200)) + 5
+    allan = AllanDeviation(SAMPLE_RATE, 200)
+    for index, record in enumerate(records):
+        allan.update(index, record)
+    # records that were added before are skipped
+    allan.update(0, records[0])
+
+    for i, m in enumerate(allan.factors):
+        adev, mdev = reference(records, m)
+        assert np.isclose(allan.adev[i], adev)
+        assert np.isclose(allan.mdev[i], mdev)
+    assert np.allclose(allan.taus, allan.factors / SAMPLE_RATE)
+
+def test_white_noise():
+    # white frequency noise averages down with 1/sqrt(tau)
+    allan = AllanDeviation(SAMPLE_RATE, 100_000)
+    allan.update(0, np.random.default_rng(1).normal(scale=2, size=100_000))
+    small = allan.factors <= 100
+    assert np.allclose(allan.adev[small], 2 / np.sqrt(allan.factors[small]), rtol=0.1)
+
+def test_averaging_factors():
+    factors = averaging_factors(10_000, points_per_decade=10)
+    assert factors[0] == 1 and factors[-1] == 2_500
+    assert np.all(np.diff(factors) > 0)
+    assert list(averaging_factors(3)) == [1]
+    assert np.all(np.isnan(AllanDeviation(SAMPLE_RATE, 100).adev))
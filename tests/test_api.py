@@ -0,0 +1,285 @@
+import socket
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+import asyncio
+import h5py
+import numpy as np
+import pytest
+import uvicorn
+from PySide6.QtCore import QThread
+
+from spectran import ureg
+from spectran.api import FastAPIServer, API_Connection, AsyncAPIConnection
+from spectran.catalog import Catalog
+from spectran.daq import DummyDAQ
+from spectran.data_handler import SAVING_MODES
+from spectran.engine import MeasurementEngine
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def api(qapp, data_handler):
+    port = free_port()
+    settings = {"api/host": "127.0.0.1", "api/port": port}
+    main_window = SimpleNamespace(data_handler=data_handler, 
+                                  engine=MeasurementEngine(data_handler),
+                                  settings=SimpleNamespace(value=settings.get))
+    api_server = FastAPIServer(main_window)
+    # stands in for the GUI thread, which runs the dispatched functions
+    gui_thread = QThread()
+    gui_thread.start()
+    api_server.dispatcher.moveToThread(gui_thread)
+    server = uvicorn.Server(uvicorn.Config(api_server.create_app(),
+                                           host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    api = API_Connection(port=port)
+    api.main_window = main_window
+    api.server = api_server
+    api.gui_thread = gui_thread
+    yield api
+    server.should_exit = True
+    thread.join()
+    gui_thread.quit()
+    gui_thread.wait()
+
+def test_get_voltage_data(api, data_handler):
+    data = api.get_voltage_data()
+    assert np.array_equal(data, data_handler.voltage_data)
+
+    data = api.get_voltage_data(averages=slice(1, 3), samples=slice(10, -10))
+    assert np.array_equal(data, data_handler.voltage_data[1:3, 10:-10])
+
+def test_get_psd(api, data_handler):
+    data_handler.stop_plotting = True
+    data_handler.calculate_data(None)
+
+    frequencies = api.get_frequencies(f_min=1000, f_max=2000)
+    assert frequencies[0] == 1000 and frequencies[-1] == 2000
+    assert np.array_equal(api.get_psd(f_min=1000, f_max=2000), 
+                          data_handler.psd[(data_handler.frequencies >= 1000) 
+                                           & (data_handler.frequencies <= 2000)])
+    assert api.get_psds(averages=slice(0, 2)).shape == (2, 51)
+
+def test_stream(api, make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = api.main_window.engine
+
+    async def receive():
+        frames = []
+        async for frame in api.stream(max_rate=1000, max_points=10):
+            frames.append(frame)
+            if frame["final"]:
+                return frames
+
+    async def start_and_receive():
+        task = asyncio.create_task(receive())
+        while api.server.live_stream is None or not api.server.live_stream.clients:
+            await asyncio.sleep(0.01)
+        engine.start(driver, make_config(averages=5))
+        return await asyncio.wait_for(task, timeout=10)
+
+    frames = asyncio.run(start_and_receive())
+    assert frames[-1]["averages"] == 5
+    assert len(frames[-1]["psd"]) <= 10
+    assert np.isclose(frames[-1]["psd"].mean(), 
+                      api.main_window.data_handler.psd[:len(frames[-1]["psd"])*6].mean())
+    assert all("rms" in frame for frame in frames[:-1])
+
+@pytest.mark.parametrize("params", [{"max_rate": 0}, {"max_rate": -1}, {"decimation": 0}])
+def test_stream_invalid_parameters(api, params):
+    from websockets.exceptions import InvalidStatus
+
+    async def receive():
+        async for frame in api.stream(**params):
+            pass
+
+    with pytest.raises(InvalidStatus):
+        asyncio.run(receive())
+    assert api.server.live_stream is None
+
+def test_wait_for_measurement(api, make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = api.main_window.engine
+
+    engine.start(driver, make_config(duration=10 * ureg.second, averages=1))
+    # a long poll that times out returns the current state
+    r = api._get("/wait", params={"timeout": 0.1})
+    assert r.status_code == 200
+    assert api.response_handler(r)["running"]
+    with pytest.raises(TimeoutError):
+        api.wait_for_measurement(timeout=0.2)
+    threading.Timer(0.2, engine.stop).start()
+    start_time = time.perf_counter()
+    result = api.wait_for_measurement(timeout=5)
+    assert time.perf_counter() - start_time < 2
+    assert result["status"] == "aborted" and not result["running"]
+
+    engine.run(driver, make_config(averages=2))
+    assert api.wait_for_measurement() == {"running": False, "run": 2, "status": "finished",
+                                          "averages": 2, "error": None}
+
+def test_session_reuses_connection(api, data_handler):
+    api.get_voltage_data()
+    api.get_voltage_data(averages=slice(0, 1))
+    api.test_connection()
+    poolmanager = api.session.get_adapter(api.url).poolmanager
+    # the fixture has tested the connection already
+    assert [poolmanager.pools[key].num_connections for key in poolmanager.pools.keys()] == [1]
+
+def test_async_connection(api, data_handler, make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = api.main_window.engine
+
+    async def run():
+        async with AsyncAPIConnection(port=api.port) as async_api:
+            engine.start(driver, make_config(averages=3))
+            result = await async_api.wait_for_measurement(timeout=5)
+            data = await async_api.get_voltage_data(averages=slice(0, 2))
+        return result, data
+
+    result, data = asyncio.run(run())
+    assert result["status"] == "finished" and result["averages"] == 3
+    assert np.array_equal(data, data_handler.voltage_data[:2])
+
+def test_sweep(api, tmp_path, make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    api.main_window.measurement_stopped = True
+    api.main_window.main_ui = SimpleNamespace(driver_instance=driver, 
+                                              read_config=lambda: make_config(averages=2))
+
+    sweep_id = api.sweep([{"averages": 1}, {"sample_rate": 20_000 * ureg.Hz}], 
+                         directory=tmp_path, save_psds=True)
+    summary = api.wait_for_sweep(sweep_id)
+    assert summary["status"] == "finished" and summary["done"] == 2
+    assert [result["averages"] for result in summary["results"]] == [1, 2]
+    assert (tmp_path / "sweep_1.h5").exists()
+    r = api._post("/sweep", json={"steps": [{"averages": 1}], "mode": "CSV"})
+    assert r.status_code == 400 and "Unknown mode" in r.json()["detail"]
+    r = api._post("/sweep", json={"steps": [{"step": 1}]})
+    assert r.status_code == 400 and "step" in r.json()["detail"]
+
+def test_sweeps_are_forgotten(api, make_config, monkeypatch):
+    monkeypatch.setattr("spectran.api.MAX_SWEEPS", 1)
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    api.main_window.measurement_stopped = True
+    api.main_window.main_ui = SimpleNamespace(driver_instance=driver, 
+                                              read_config=lambda: make_config(averages=1))
+    first = api.sweep([{"averages": 1}])
+    api.wait_for_sweep(first)
+    second = api.sweep([{"averages": 1}])
+    # the oldest done sweep is forgotten
+    assert list(api.server.sweeps) == [second]
+    api.wait_for_sweep(second)
+    with pytest.raises(ConnectionError):
+        api.wait_for_sweep(first)
+
+def test_jobs(api):
+    config = {"sample_rate": 10_000 * ureg.Hz, "duration": 0.01 * ureg.second}
+    first = api.submit_job({**config, "averages": 2}, driver="DummyDAQ", device="Dev1")
+    second = api.submit_job({**config, "averages": 3}, driver="DummyDAQ", device="Dev1")
+    assert api.wait_for_job(second)["averages"] == 3
+    assert api.get_job(first)["status"] == "finished"
+    assert [job["id"] for job in api.list_jobs()] == [first, second]
+
+    assert api.get_voltage_data(job_id=first).shape == (2, 100)
+    assert np.array_equal(api.get_psd(job_id=second), 
+                          api.server.job_queue.result(second).psd)
+    with pytest.raises(ConnectionError):
+        api.get_job("unknown")
+    r = api._post("/jobs", json={"driver": "DummyDAQ", "device": "Dev1", "mode": "CSV"})
+    assert r.status_code == 400 and "Unknown mode" in r.json()["detail"]
+
+def test_dispatch_to_gui_thread(api):
+    threads = []
+    def start_measurement():
+        threads.append(QThread.currentThread())
+    def set_config(config):
+        threads.append(QThread.currentThread())
+        raise ValueError("Invalid config")
+    api.main_window.main_ui = SimpleNamespace(start_measurement=start_measurement,
+                                              set_config=set_config)
+
+    api.start_measurement()
+    with pytest.raises(ConnectionError, match="Invalid config"):
+        api.set_config({"averages": 2})
+    assert threads == [api.gui_thread, api.gui_thread]
+
+def test_get_allan_deviation(api, data_handler, tmp_path):
+    taus, adev, mdev = api.get_allan_deviation()
+    expected = data_handler.allan_deviation()
+    assert np.array_equal(taus, expected[0])
+    assert np.array_equal(adev, expected[1])
+    assert np.array_equal(mdev, expected[2])
+
+    api.save_file(tmp_path / "data.h5", mode="HDF5", save_allan=True)
+    with h5py.File(tmp_path / "data.h5") as f:
+        assert np.array_equal(f["allan/adev"][:], adev)
+
+def test_get_raw_psd(api, data_handler):
+    data_handler.set_calibration({"frequencies": [0, 5000], "gain": [2, 2]})
+    data_handler.stop_plotting = True
+    data_handler.calculate_data(None)
+    assert np.allclose(api.get_psd(), api.get_psd(raw=True) / 4)
+
+def test_load_file_errors(api, tmp_path):
+    assert api._post("/load_file", json={"file_path": str(tmp_path / "missing.h5")}).status_code == 404
+    assert api._post("/load_file", json={}).status_code == 400
+    (tmp_path / "data.xyz").write_text("no data")
+    assert api._post("/load_file", json={"file_path": str(tmp_path / "data.xyz")}).status_code == 400
+    assert api._post("/recalculate_psd", json={"nfft": "many"}).status_code == 400
+
+def test_rescan_catalog(api, data_handler, tmp_path):
+    data_handler.catalog = Catalog(tmp_path / "catalog.sqlite")
+    data_handler.save_file(tmp_path / "data.h5", mode=SAVING_MODES.HDF5)
+    r = api._post("/catalog/rescan", json={"directory": str(tmp_path)})
+    assert r.status_code == 200 and r.json()["message"] == "Registered 1 measurements"
+    r = api._post("/catalog/rescan", json={})
+    assert r.status_code == 400 and "directory" in r.json()["detail"]
+
+def test_set_nested_config(api):
+    configs = []
+    api.main_window.main_ui = SimpleNamespace(set_config=configs.append)
+    api.set_config({"averaging": {"mode": "exponential", "time_constant": 10 * ureg.second},
+                    "trigger": {"source": "software", "level": 0.5 * ureg.volt, "slope": "rising"},
+                    "filters": [{"type": "notch", "frequency": 50 * ureg.Hz}],
+                    "duration": 2 * ureg.second})
+    config, = configs
+    assert config["averaging"] == {"mode": "exponential", "time_constant": 10 * ureg.second}
+    assert config["trigger"]["level"] == 0.5 * ureg.volt
+    assert config["filters"][0]["frequency"] == 50 * ureg.Hz
+    assert config["duration"] == 2 * ureg.second
+
+def test_submit_job_connects_off_the_event_loop(api):
+    threads = []
+    def driver(name, device):
+        threads.append(threading.current_thread().name)
+        raise ValueError(f"Unknown driver {name}")
+    api.server.job_queue.driver = driver
+    r = api._post("/jobs", json={"driver": "SlowDAQ", "device": "Dev1"})
+    assert r.status_code == 400
+    # run by the default executor of asyncio.to_thread
+    assert threads[0].startswith("asyncio")
+
+def test_result_of_deleted_file(api, tmp_path):
+    api.server.job_queue.store.max_memory = 0
+    job_id = api.submit_job({"sample_rate": 10_000 * ureg.Hz, "duration": 0.01 * ureg.second, 
+                             "averages": 1}, driver="DummyDAQ", device="Dev1", directory=tmp_path)
+    file_path = api.wait_for_job(job_id)["file_path"]
+    # the result refers to the file saved by the job, which is deleted by someone else
+    Path(file_path).unlink()
+    assert api._get(f"/jobs/{job_id}/data/psd").status_code == 404
+    assert job_id not in api.server.job_queue.store
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from spectran import ureg
+from spectran.averaging import (Averager, ExponentialAverage, LinearAverage,
+                                PeakHold, StreamingQuantile, make_averager)
+from spectran.daq import DummyDAQ
+from spectran.engine import MeasurementEngine
+
+
+def feed(averager, psds):
+    for psd in psds:
+        result = averager.update(psd)
+    return result
+
+def test_linear_exponential_and_peak_hold():
+    psds = np.random.default_rng(0).exponential(size=(20, 8))
+    assert np.allclose(feed(LinearAverage(), psds), psds.mean(axis=0))
+    assert np.array_equal(feed(PeakHold("max"), psds), psds.max(axis=0))
+    assert np.array_equal(feed(PeakHold("min"), psds), psds.min(axis=0))
+
+    expected = psds[0].copy()
+    for psd in psds[1:]:
+        expected = 0.75 * expected + 0.25 * psd
+    assert np.allclose(feed(ExponentialAverage(0.25), psds), expected)
+
+def test_streaming_quantile():
+    rng = np.random.default_rng(1)
+    psds = rng.exponential(size=(2000, 50))
+    # transient glitches do not change the median
+    psds[::50] *= 1e3
+    median = feed(StreamingQuantile(0.5), psds)
+    assert np.allclose(median, np.median(psds, axis=0), rtol=0.1)
+    psds = rng.exponential(size=(2000, 50))
+    percentile = feed(StreamingQuantile(0.9), psds)
+    assert np.allclose(percentile, np.quantile(psds, 0.9, axis=0), rtol=0.1)
+    # exact for few averages
+    assert np.array_equal(feed(StreamingQuantile(0.5), psds[:3]), np.median(psds[:3], axis=0))
+
+def test_make_averager():
+    assert isinstance(make_averager(None), LinearAverage)
+    assert isinstance(make_averager("max"), PeakHold)
+    assert make_averager({"mode": "percentile", "percentile": 90}).quantile == 0.9
+    averager = make_averager({"mode": "exponential", "time_constant": 10 * ureg.second}, 0.1)
+    assert np.isclose(averager.alpha, 1 - np.exp(-0.01))
+    with pytest.raises(ValueError):
+        make_averager("mean")
+    with pytest.raises(ValueError):
+        make_averager({"mode": "exponential"})
+    # modes have to implement _update
+    with pytest.raises(TypeError):
+        Averager()
+
+def test_max_hold_measurement(make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = MeasurementEngine()
+    engine.run(driver, make_config(averaging="max"))
+
+    data_handler = engine.data_handler
+    psds = data_handler.psds.copy()
+    assert np.array_equal(data_handler.psd, psds.max(axis=0))
+    frequencies, psd = data_handler.recalculate_psd(averaging="min")
+    assert np.allclose(psd, psds.min(axis=0))
@@ -0,0 +1,78 @@
+import os
+import h5py
+import numpy as np
+import pytest
+
+from spectran.calibration import MAX_CACHED_FILES, Calibration, _load, from_config
+from spectran.daq import DummyDAQ
+from spectran.data_handler import SAVING_MODES
+from spectran.engine import MeasurementEngine
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    file_path = tmp_path / "sensor.csv"
+    file_path.write_text("frequency,gain\n0,1\n1000,2\n5000,4\n")
+    return file_path
+
+def test_load_and_interpolate(csv_file, tmp_path):
+    calibration = Calibration.load(csv_file)
+    assert calibration.name == "sensor.csv"
+    correction = calibration.correction(10, 10_000)
+    # frequencies 0, 1000, ..., 5000 Hz
+    assert np.allclose(correction, 1 / np.array([1, 2, 2.5, 3, 3.5, 4])**2)
+    # the interpolation is done once per grid
+    assert calibration.correction(10, 10_000) is correction
+    assert len(calibration.correction(20, 10_000)) == 11
+
+    with h5py.File(tmp_path / "sensor.h5", "w") as f:
+        f["frequencies"], f["gain"] = [0, 5000], [1, 4]
+    power = Calibration.load(tmp_path / "sensor.h5", quantity="power")
+    assert np.allclose(power.correction(10, 10_000)[-1], 1 / 4)
+
+def test_from_config(csv_file):
+    assert from_config(None) is None
+    # files are only read once
+    assert from_config(str(csv_file)) is from_config({"file": csv_file})
+    assert from_config({"frequencies": [0, 1], "gain": [2, 2]}).correction(4, 1)[0] == 0.25
+    with pytest.raises(ValueError):
+        from_config({"frequencies": [0, 1], "gain": [0, 1]})
+
+def test_modified_files_are_reloaded(csv_file):
+    for i in range(2 * MAX_CACHED_FILES):
+        csv_file.write_text(f"0,{i + 1}\n")
+        os.utime(csv_file, (i, i))
+        assert from_config(csv_file).gain[0] == i + 1
+    # old versions of the file are released
+    assert _load.cache_info().currsize <= MAX_CACHED_FILES
+
+def test_calibrated_measurement(csv_file, tmp_path, make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = MeasurementEngine()
+    engine.run(driver, make_config(calibration=str(csv_file)))
+
+    data_handler = engine.data_handler
+    correction = data_handler.calibration.correction(100, 10_000)
+    assert np.allclose(data_handler.psd, data_handler.psd_raw * correction)
+    assert np.allclose(data_handler.psd_raw, data_handler.psds.mean(axis=0))
+
+    file_path = data_handler.save_file(tmp_path / "data.h5", mode=SAVING_MODES.HDF5, save_psds=True)
+    psd, psd_raw = data_handler.psd.copy(), data_handler.psd_raw.copy()
+    data_handler.load_file(file_path)
+    assert np.array_equal(data_handler.psd, psd)
+    assert np.array_equal(data_handler.psd_raw, psd_raw)
+    assert data_handler.calibration.name == "sensor.csv"
+
+    data_handler.recalculate_psd()
+    assert np.allclose(data_handler.psd, psd)
+    # the correction is interpolated onto the frequencies of a shorter FFT
+    frequencies, psd_nfft = data_handler.recalculate_psd(nfft=64)
+    correction = data_handler.calibration.correction(64, 10_000)
+    assert len(frequencies) == len(correction) == 33
+    assert np.allclose(correction, 1 / np.interp(frequencies, [0, 1000, 5000], [1, 2, 4])**2)
+    assert np.allclose(psd_nfft, data_handler.psd_raw * correction)
+    data_handler.recalculate_psd()
+    data_handler.set_calibration(None)
+    assert np.allclose(data_handler.psd, psd_raw)
+    data_handler.close_file()
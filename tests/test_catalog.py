@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+import pytest
+
+from spectran import ureg
+from spectran.catalog import Catalog, band_powers
+from spectran.data_handler import DataHandler, SAVING_MODES
+
+
+def save_measurement(catalog, file_path, mode, config, **values):
+    data_handler = DataHandler()
+    data_handler.catalog = catalog
+    data_handler.config = {**config, **values}
+    data_handler.initialize(3, 0.01, 10_000)
+    data_handler.voltage_data[:] = 2.0
+    return data_handler.save_file(file_path, mode=mode)
+
+def test_register_and_query(tmp_path, config):
+    catalog = Catalog(tmp_path / "catalog.sqlite")
+    last_week = (datetime.now() - timedelta(days=3)).strftime("%Y-%m-%d %H:%M:%S")
+    save_measurement(catalog, tmp_path / "a.h5", SAVING_MODES.HDF5, config,
+                     start_time=last_week, sample_rate_real=2 * ureg.MHz)
+    save_measurement(catalog, tmp_path / "b.npy", SAVING_MODES.NP_BINARY, config, device="Dev2")
+
+    results = catalog.query(device="Dev1", min_sample_rate=1e6,
+                            since=datetime.now() - timedelta(days=7))
+    assert [r["path"] for r in results] == [str(tmp_path / "a.h5")]
+    assert results[0]["rms"] == 2.0
+    assert results[0]["averages"] == 3
+    assert len(catalog.query()) == 2
+
+def test_rescan(tmp_path, config):
+    save_measurement(None, tmp_path / "a.h5", SAVING_MODES.HDF5, config)
+    (tmp_path / "sub").mkdir()
+    save_measurement(None, tmp_path / "sub" / "b.npz", SAVING_MODES.NP_COMPRESSED, config)
+    (tmp_path / "notes.txt").write_text("not a measurement")
+
+    catalog = Catalog(tmp_path / "catalog.sqlite")
+    assert catalog.rescan(tmp_path) == 2
+    (tmp_path / "a.h5").unlink()
+    assert catalog.rescan(tmp_path) == 1
+    assert [r["device"] for r in catalog.query()] == ["Dev1"]
+
+def test_rescan_keeps_sibling_directories(tmp_path, config):
+    catalog = Catalog(tmp_path / "catalog.sqlite")
+    for name in ("run_1", "run_10", "run%1"):
+        (tmp_path / name).mkdir()
+        save_measurement(catalog, tmp_path / name / "a.h5", SAVING_MODES.HDF5, config)
+    (tmp_path / "run_1" / "a.h5").unlink()
+    (tmp_path / "run_10" / "a.h5").unlink()
+    (tmp_path / "run%1" / "a.h5").unlink()
+    # only the entry below run_1 is removed
+    assert catalog.rescan(tmp_path / "run_1") == 0
+    assert sorted(Path(r["path"]).parent.name for r in catalog.query()) == ["run%1", "run_10"]
+
+def test_rescan_uses_stored_psd(tmp_path, config):
+    data_handler = DataHandler()
+    data_handler.config = {**config, "averaging": "max"}
+    data_handler.initialize(3, 0.01, 10_000)
+    data_handler.voltage_data[:] = np.random.normal(size=data_handler.voltage_data.shape)
+    data_handler.stop_plotting = True
+    data_handler.calculate_data(None)
+    data_handler.save_file(tmp_path / "a.h5", mode=SAVING_MODES.HDF5, save_psds=True)
+
+    catalog = Catalog(tmp_path / "catalog.sqlite")
+    catalog.rescan(tmp_path)
+    expected = band_powers(data_handler.frequencies, data_handler.psds.max(axis=0))
+    assert catalog.query()[0]["band_powers"] == pytest.approx(expected)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from spectran import ureg
+from spectran.coherent import CoherentAverager, find_trigger
+from spectran.daq import DummyDAQ
+from spectran.daq.daq import hardware_trigger
+from spectran.engine import MeasurementEngine
+
+SAMPLE_RATE = 10_000
+FREQUENCY = 500
+
+
+class LockedDAQ(DummyDAQ):
+    """Sine locked to a reference, the records start at random phases."""
+    rng = np.random.default_rng(0)
+
+    def acquire(self, duration, sample_rate):
+        t = np.arange(int(duration * sample_rate)) / sample_rate + self.rng.random() / FREQUENCY
+        return np.sin(2 * np.pi * FREQUENCY * t) + self.rng.normal(scale=0.1, size=len(t))
+
+
+def test_find_trigger():
+    record = np.array([-1.0, -0.5, 0.5, 1.0, 0.0, -1.0])
+    assert find_trigger(record, 0.0) == 1.5
+    assert find_trigger(record, 0.0, "falling") == 4.0
+    assert find_trigger(record, 2.0) is None
+
+def test_software_trigger_aligns_records():
+    averager = CoherentAverager(1_000, SAMPLE_RATE, {"source": "software", "window": 0.0025 * ureg.second})
+    assert averager.window == 25 and averager.length == 975
+    mean = np.zeros(averager.length)
+    t = np.arange(1_000) / SAMPLE_RATE
+    for index, offset in enumerate(np.linspace(0, 1, 7, endpoint=False) / FREQUENCY):
+        averager.buffer(index)[:] = np.sin(2 * np.pi * FREQUENCY * (t + offset))
+        assert averager.accumulate(index, mean)
+    # the sine starts at the crossing of 0 in all records
+    expected = np.sin(2 * np.pi * FREQUENCY * t[:975])
+    assert np.allclose(mean, expected, atol=0.02)
+
+    averager.buffer(7)[:] = 2
+    assert not averager.accumulate(7, mean)
+    assert averager.count == 7 and averager.rejected == 1
+
+def test_coherent_measurement(make_config):
+    driver = LockedDAQ()
+    driver.connect_device("Dev1")
+    engine = MeasurementEngine()
+    config = make_config(averages=50, coherent_averaging=True,
+                         trigger={"source": "software", "level": 0.0, "window": 0.002})
+    assert engine.run(driver, config) == 50
+
+    data_handler = engine.data_handler
+    assert data_handler.voltage_data.shape == (1, 80)
+    assert len(data_handler.time_seq) == 80
+    assert data_handler.config["coherent_records"] == len(data_handler.done_indices) > 40
+    # the noise of the records is averaged out
+    t = np.arange(80) / SAMPLE_RATE
+    residual = data_handler.voltage_data[0] - np.sin(2 * np.pi * FREQUENCY * t)
+    assert np.std(residual) < 0.1 / 3
+    assert data_handler.frequencies[np.argmax(data_handler.psd)] == FREQUENCY
+
+def test_abort_without_records(make_config):
+    driver = LockedDAQ()
+    driver.connect_device("Dev1")
+    engine = MeasurementEngine()
+    engine.subscribe("started", lambda config: engine.stop())
+    assert engine.run(driver, make_config(coherent_averaging=True)) == 0
+    assert engine.data_handler.voltage_data.shape == (0, 100)
+
+def test_hardware_trigger():
+    assert hardware_trigger({}) is None
+    assert hardware_trigger({"trigger": {"source": "software"}}) is None
+    assert hardware_trigger({"trigger": {"source": "/Dev1/PFI0"}}) == {"source": "/Dev1/PFI0"}
+    with pytest.raises(ValueError):
+        CoherentAverager(100, SAMPLE_RATE, {"source": "software", "window": 1})
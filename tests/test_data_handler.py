@@ -0,0 +1,101 @@
+import h5py
+import numpy as np
+import pytest
+
+from spectran import ureg
+from spectran.data_handler import SAVING_MODES, averaged_psd
+
+@pytest.mark.parametrize("mode, suffix", [(SAVING_MODES.PLAIN_TEXT, ".txt"),
+                                          (SAVING_MODES.NP_BINARY, ".npy"),
+                                          (SAVING_MODES.NP_COMPRESSED, ".npz"),
+                                          (SAVING_MODES.HDF5, ".h5")])
+def test_save_and_load(data_handler, tmp_path, mode, suffix):
+    data = data_handler.voltage_data.copy()
+    file_path = data_handler.save_file(tmp_path / f"data{suffix}", mode=mode)
+
+    data_handler.load_file(file_path)
+    assert np.allclose(data_handler.voltage_data[:], data)
+    assert data_handler.config["averages"] == 3
+    assert data_handler.config["device"] == "Dev1"
+    assert data_handler.config["sample_rate_real"] == 10_000 * ureg.Hz
+    assert len(data_handler.time_seq) == data.shape[1]
+    data_handler.close_file()
+
+def test_recalculate_psd(data_handler, tmp_path):
+    file_path = data_handler.save_file(tmp_path / "data.npy", mode=SAVING_MODES.NP_BINARY)
+    data_handler.load_file(file_path)
+    assert isinstance(data_handler.voltage_data, np.memmap)
+
+    frequencies, psd = data_handler.recalculate_psd(window="hann")
+    assert len(frequencies) == len(psd) == 51
+    assert np.all(psd >= 0)
+
+def test_calculate_psd_of_loaded_file(data_handler, tmp_path):
+    data_handler.filters = object()
+    file_path = data_handler.save_file(tmp_path / "data.npy", mode=SAVING_MODES.NP_BINARY)
+    data_handler.load_file(file_path)
+    assert data_handler.filters is None and data_handler.averager.count == 0
+    assert data_handler.psd is None
+
+    data_handler.calculate_data(None)
+    frequencies, psd = data_handler.frequencies, data_handler.psd
+    assert len(frequencies) == len(psd) == 51
+    assert np.allclose(psd, averaged_psd(data_handler.voltage_data, 10_000)[1])
+
+def test_calculate_psd_of_stored_psds(data_handler, tmp_path):
+    data_handler.stop_plotting = True
+    data_handler.calculate_data(None)
+    psds = data_handler.psds.copy()
+    file_path = data_handler.save_file(tmp_path / "data.h5", mode=SAVING_MODES.HDF5, save_psds=True)
+    # files of earlier versions contain the psds without their average
+    with h5py.File(file_path, "a") as f:
+        del f["psd"]
+
+    data_handler.load_file(file_path)
+    assert data_handler.psd is None
+    frequencies, psd = data_handler.calculate_psd(None)
+    assert np.allclose(psd, psds.mean(axis=0))
+    data_handler.calculate_data(None)
+    assert np.allclose(data_handler.psd, psds.mean(axis=0))
+    data_handler.close_file()
+
+def test_save_and_load_envelope(data_handler, tmp_path):
+    file_path = data_handler.save_file(tmp_path / "data.h5", mode=SAVING_MODES.HDF5, 
+                                       save_envelope=True)
+    expected = data_handler.signal_envelope(2, 0, 100, 1)
+
+    data_handler.load_file(file_path)
+    positions, values = data_handler.signal_envelope(-1, 0, 100, 1)
+    assert np.array_equal(positions, expected[0])
+    assert np.array_equal(values, expected[1])
+    data_handler.close_file()
+
+def test_cut_data_keeps_partial_record(data_handler):
+    data = data_handler.voltage_data.copy()
+    data_handler.cut_data(1, samples=40)
+    assert data_handler.voltage_data.shape == (1, 100)
+    assert np.array_equal(data_handler.partial_record, data[1, :40])
+
+    data_handler.initialize(3, 0.01, 10_000)
+    data_handler.voltage_data[:] = data
+    data_handler.cut_data(0, samples=40)
+    assert data_handler.voltage_data.shape == (1, 40)
+    assert len(data_handler.time_seq) == 40
+    assert data_handler.config["duration"] == 0.004 * ureg.second
+
+def test_save_and_load_allan(data_handler, tmp_path):
+    data_handler.compute_allan = True
+    data_handler.calculate_data(0)
+    assert data_handler.allan.done == {0}
+    taus, adev, mdev = data_handler.allan_deviation()
+    assert data_handler.allan.done == {0, 1, 2}
+    file_path = data_handler.save_file(tmp_path / "data.h5", mode=SAVING_MODES.HDF5, 
+                                       save_allan=True)
+    npy_path = data_handler.save_file(tmp_path / "data.npy", mode=SAVING_MODES.NP_BINARY)
+
+    data_handler.load_file(file_path)
+    assert np.array_equal(data_handler.allan_deviation()[1], adev)
+    data_handler.close_file()
+    # without stored deviations, they are calculated from the loaded records
+    data_handler.load_file(npy_path)
+    assert np.allclose(data_handler.allan_deviation()[2], mdev)
@@ -0,0 +1,99 @@
+import time
+import numpy as np
+import pytest
+
+from spectran import ureg
+from spectran.daq import DummyDAQ
+from spectran.engine import MeasurementEngine
+
+
+def test_run_headless(make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = MeasurementEngine()
+    events = []
+    for event in ("started", "device_status", "progress", "data_updated", "finished"):
+        engine.subscribe(event, lambda *args, event=event: events.append(event))
+
+    assert engine.run(driver, make_config()) == 4
+    assert not engine.running
+    assert engine.data_handler.voltage_data.shape == (4, 100)
+    assert engine.data_handler.psd is not None
+    assert engine.data_handler.config["sample_rate_real"] == 10_000 * ureg.Hz
+    assert events[0] == "started"
+    assert events.count("progress") == 4
+    assert events[-2:] == ["data_updated", "finished"]
+
+def test_stop(make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = MeasurementEngine()
+    aborted = []
+    engine.subscribe("progress", lambda index: engine.stop() if index == 1 else None)
+    engine.subscribe("aborted", aborted.append)
+
+    assert engine.run(driver, make_config()) == 2
+    assert aborted == [2]
+    assert engine.data_handler.voltage_data.shape == (2, 100)
+
+def test_failed(make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = MeasurementEngine()
+    errors = []
+    engine.subscribe("failed", errors.append)
+
+    with pytest.raises(AssertionError):
+        engine.run(driver, make_config(duration=0.0001 * ureg.second))
+    assert len(errors) == 1
+    assert not engine.running
+
+def test_stop_during_record(make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = MeasurementEngine()
+    engine.start(driver, make_config(duration=10 * ureg.second, averages=1))
+    time.sleep(0.5)
+    stop_time = time.time()
+    engine.stop()
+    engine.thread.join(timeout=5)
+
+    assert not engine.running
+    assert time.time() - stop_time < 2 * driver.chunk_duration + 0.5
+    data_handler = engine.data_handler
+    samples = data_handler.voltage_data.shape[1]
+    assert data_handler.voltage_data.shape[0] == 1
+    assert 0 < samples < 100_000
+    assert len(data_handler.time_seq) == samples
+    assert data_handler.psd.shape == (samples//2+1,)
+
+def test_wait(make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = MeasurementEngine()
+    assert engine.wait() is None
+
+    engine.start(driver, make_config(duration=10 * ureg.second, averages=1))
+    assert engine.wait(timeout=0.1) is None and engine.running
+    engine.stop()
+    result = engine.wait(timeout=5)
+    assert not engine.running
+    assert result == {"run": 1, "status": "aborted", "averages": 0, "error": None}
+
+def test_filters(make_config):
+    from spectran.filters import FilterChain
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = MeasurementEngine()
+    raw = []
+    engine.subscribe("progress", lambda index: raw.append(engine.data_handler.voltage_data[index].copy()))
+    filters = [{"type": "highpass", "frequency": 100}]
+
+    engine.run(driver, make_config(filters=filters))
+    expected = np.concatenate(raw)
+    FilterChain.from_config(filters, 10_000).apply(expected)
+    np.testing.assert_allclose(engine.data_handler.voltage_data.ravel(), expected)
+
+    with pytest.raises(ValueError):
+        engine.run(driver, make_config(filters=[{"type": "comb"}]))
+    assert engine.result["status"] == "failed"
@@ -0,0 +1,32 @@
+import numpy as np
+
+from spectran.envelope import EnvelopePyramid
+
+
+def test_levels_and_selection():
+    record = np.random.normal(size=1_000_000)
+    envelope = EnvelopePyramid(2, len(record))
+    envelope.update(1, record)
+    assert envelope.done == {1}
+    
+    # the full view uses a coarse level with about one bin per pixel
+    positions, values = envelope.select(1, 0, len(record), 800)
+    assert 2 * 800 <= len(values) <= 2 * 4 * 800
+    assert values.max() == record.max()
+    assert values.min() == record.min()
+    assert np.all(np.diff(positions) >= 0)
+    
+    # a zoomed view has the same number of points
+    positions, values = envelope.select(1, 500_000, 700_000, 800)
+    assert len(values) <= 2 * 4 * 800 + 4
+    assert values.max() >= record[500_000:700_000].max()
+    
+    # when zoomed in further the raw samples are plotted
+    assert envelope.select(1, 1000, 2000, 800) is None
+
+def test_partial_bins():
+    record = np.arange(1000.)
+    envelope = EnvelopePyramid(1, len(record), base=64, min_bins=4)
+    envelope.update(0, record)
+    assert envelope.maxs[0][0, -1] == 999
+    assert envelope.mins[-1][0, 0] == 0
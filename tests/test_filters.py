@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from scipy import signal
+
+from spectran import ureg
+from spectran.filters import FilterChain, SOSStage, FIRStage
+
+SAMPLE_RATE = 10_000
+
+
+def stream_reference(specs, data):
+    """Filters the whole stream at once with the steady state of the first sample."""
+    chain = FilterChain.from_config(specs, SAMPLE_RATE)
+    output = data.copy()
+    for stage in chain.stages:
+        if isinstance(stage, SOSStage):
+            output, _ = signal.sosfilt(stage.sos, output, zi=signal.sosfilt_zi(stage.sos) * output[0])
+        else:
+            output, _ = signal.lfilter(stage.taps, 1.0, output, zi=signal.lfilter_zi(stage.taps, 1.0) * output[0])
+    return output
+
+@pytest.mark.parametrize("block_size", [7, 100, 2**16])
+def test_state_is_carried_across_records(block_size):
+    specs = [{"type": "highpass", "frequency": 10}, {"type": "notch", "frequency": 50 * ureg.Hz},
+             {"type": "fir", "numtaps": 31, "frequency": 2_000}]
+    data = np.random.default_rng(0).normal(size=(4, 250)) + 3
+    expected = stream_reference(specs, data.ravel())
+
+    chain = FilterChain.from_config(specs, SAMPLE_RATE, block_size=block_size)
+    for record in data:
+        chain.apply(record)
+    np.testing.assert_allclose(data.ravel(), expected, atol=1e-10)
+
+def test_notch_removes_hum():
+    t = np.arange(20_000) / SAMPLE_RATE
+    record = 2 + np.sin(2 * np.pi * 50 * t) + 0.5 * np.sin(2 * np.pi * 1_000 * t)
+    FilterChain.from_config({"type": "notch", "frequency": 50, "q": 5}, SAMPLE_RATE).apply(record)
+
+    # no edge transient of the offset
+    assert abs(record[0] - 2) < 1e-9
+    frequencies, psd = signal.periodogram(record[5_000:], fs=SAMPLE_RATE)
+    assert psd[np.argmin(abs(frequencies - 50))] < 1e-3 * psd[np.argmin(abs(frequencies - 1_000))]
+
+def test_iir_stages_are_combined():
+    chain = FilterChain.from_config([{"type": "lowpass", "frequency": 1_000, "order": 4},
+                                     {"type": "notch", "frequency": 50},
+                                     {"type": "fir", "taps": [0.5, 0.5]},
+                                     {"type": "sos", "sos": [[1, 0, 0, 1, 0, 0]]}], SAMPLE_RATE)
+    assert [type(stage) for stage in chain.stages] == [SOSStage, FIRStage, SOSStage]
+    assert chain.stages[0].sos.shape == (3, 6)
+    assert chain.stages[0].name == "lowpass+notch"
+
+@pytest.mark.parametrize("spec", [{"type": "comb"}, {"type": "lowpass"},
+                                  {"type": "lowpass", "frequency": 6_000},
+                                  {"type": "sos", "sos": [1, 2, 3]}])
+def test_invalid_filters(spec):
+    with pytest.raises(ValueError):
+        FilterChain.from_config([spec], SAMPLE_RATE)
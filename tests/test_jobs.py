@@ -0,0 +1,94 @@
+import time
+import numpy as np
+import pytest
+from spectran import ureg
+from spectran.daq import DummyDAQ
+from spectran.data_handler import SAVING_MODES
+from spectran.engine import MeasurementEngine
+from spectran.jobs import Job, JobQueue, ResultStore
+
+
+def make_result(engine, config):
+    engine.run(engine.driver, config)
+    return engine.data_handler.snapshot()
+
+def make_engine():
+    engine = MeasurementEngine()
+    engine.driver = DummyDAQ()
+    engine.driver.connect_device("Dev1")
+    return engine
+
+def test_result_store_lru(tmp_path, make_config):
+    engine = make_engine()
+    results = [make_result(engine, make_config(averages=averages)) for averages in (1, 2, 3)]
+    # voltage_data and psds of one average have 800 + 408 bytes
+    store = ResultStore(tmp_path, max_memory=4000, max_disk=2500)
+    store.put("a", results[0])
+    store.put("b", results[1])
+    assert store.get("a") is results[0]
+    # b is the least recently used result
+    store.put("c", results[2])
+    assert list(store._memory) == ["c"]
+    assert list(store._disk) == ["a"]
+    assert not (tmp_path / "b.npy").exists()
+    assert "b" not in store
+
+    loaded = store.get("a")
+    assert np.array_equal(loaded.voltage_data, results[0].voltage_data)
+    assert loaded.config["averages"] == 1
+    # the loaded result is reused until it is removed
+    assert store.get("a") is loaded
+    store.remove("a")
+    assert not store._loaded
+
+def test_result_store_closes_files(tmp_path, make_config):
+    engine = make_engine()
+    result = make_result(engine, make_config(averages=1))
+    file_path = result.save_file(tmp_path / "a.h5", mode=SAVING_MODES.HDF5)
+    store = ResultStore(tmp_path, max_memory=0)
+    store.put("a", result, file_path)
+    loaded = store.get("a")
+    assert loaded._h5_file is not None
+    for _ in range(3):
+        assert store.get("a") is loaded
+    store.remove("a")
+    assert loaded._h5_file is None
+    # files saved by the job are kept
+    assert file_path.exists()
+
+def test_result_store_deleted_file(tmp_path, make_config):
+    engine = make_engine()
+    result = make_result(engine, make_config(averages=1))
+    file_path = result.save_file(tmp_path / "a.h5", mode=SAVING_MODES.HDF5)
+    store = ResultStore(tmp_path, max_memory=0)
+    store.put("a", result, file_path)
+    file_path.unlink()
+    with pytest.raises(KeyError):
+        store.get("a")
+    assert "a" not in store
+
+def test_job_queue(tmp_path, make_config):
+    engine = make_engine()
+    queue = JobQueue(engine, ResultStore(tmp_path / "results"))
+    jobs = [queue.submit(Job(engine.driver, make_config(averages=averages), 
+                             directory=tmp_path if averages == 2 else None))
+            for averages in (1, 2, 3)]
+    blocking = queue.submit(Job(engine.driver, make_config(duration=10 * ureg.second, averages=1)))
+    cancelled = queue.submit(Job(engine.driver, make_config()))
+    queue.cancel(cancelled.id)
+    for job in jobs:
+        assert job.wait(timeout=5)
+    while blocking.status != "running":
+        time.sleep(0.01)
+    time.sleep(0.5)
+    queue.cancel(blocking.id)
+    assert blocking.wait(timeout=5)
+
+    assert [job.status for job in jobs] == ["finished"] * 3
+    assert [job.averages for job in jobs] == [1, 2, 3]
+    assert jobs[1].file_path.exists() and jobs[0].file_path is None
+    # each job keeps its own data
+    assert [queue.result(job.id).voltage_data.shape[0] for job in jobs] == [1, 2, 3]
+    assert blocking.status == "cancelled" and queue.result(blocking.id).voltage_data.shape[0] == 1
+    assert cancelled.status == "cancelled" and cancelled.id not in queue.store
+    assert [job["id"] for job in queue.list()] == [job.id for job in jobs + [blocking, cancelled]]
@@ -0,0 +1,66 @@
+from spectran.metrics import Registry, Counter, Gauge, Histogram, REGISTRY, SAMPLES_ACQUIRED
+
+
+def test_render():
+    registry = Registry()
+    counter = Counter("test_bytes_total", "Written bytes", registry=registry)
+    gauge = Gauge("test_depth", "Queue depth", registry=registry)
+    histogram = Histogram("test_seconds", "Duration", labelnames=("mode",),
+                          registry=registry, buckets=(0.1, 1.0))
+    counter.inc(10)
+    gauge.set(3)
+    histogram.labels(mode="HDF5").observe(0.05)
+    histogram.labels(mode="HDF5").observe(0.5)
+    histogram.labels(mode="HDF5").observe(5)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_bytes_total counter" in lines
+    assert "test_bytes_total 10" in lines
+    assert "test_depth 3" in lines
+    assert 'test_seconds_bucket{mode="HDF5",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{mode="HDF5",le="1"} 2' in lines
+    assert 'test_seconds_bucket{mode="HDF5",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{mode="HDF5"} 3' in lines
+    assert 'test_seconds_sum{mode="HDF5"} 5.55' in lines
+
+    registry.reset()
+    assert "test_bytes_total 0" in registry.render().splitlines()
+
+def test_summary_since_snapshot():
+    registry = Registry()
+    counter = Counter("test_bytes_total", "Written bytes", registry=registry)
+    histogram = Histogram("test_seconds", "Duration", labelnames=("mode",), registry=registry)
+    counter.inc(10)
+    histogram.labels(mode="HDF5").observe(1.0)
+    baseline = registry.snapshot()
+    counter.inc(5)
+    histogram.labels(mode="HDF5").observe(0.002)
+    histogram.labels(mode="NPY").observe(0.004)
+
+    summary = dict(registry.summary(baseline))
+    assert summary["test_bytes_total"] == "5"
+    assert summary["test_seconds{HDF5}"] == "n = 1, mean = 2 ms, last = 2 ms"
+    assert summary["test_seconds{NPY}"] == "n = 1, mean = 4 ms, last = 4 ms"
+    # the exported counters are not reset
+    assert "test_bytes_total 15" in registry.render().splitlines()
+
+def test_diagnostics_reset_keeps_counters(qapp):
+    from spectran.windows import DiagnosticsWindow
+    SAMPLES_ACQUIRED.inc(100)
+    before = SAMPLES_ACQUIRED.value
+    window = DiagnosticsWindow(None)
+    window.reset()
+    assert SAMPLES_ACQUIRED.value == before
+    assert dict(REGISTRY.summary(window.baseline))["spectran_samples_acquired_total"] == "0"
+    window.close()
+
+def test_engine_records_samples(make_config):
+    from spectran.daq import DummyDAQ
+    from spectran.engine import MeasurementEngine
+
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    before = SAMPLES_ACQUIRED.value
+    MeasurementEngine().run(driver, make_config())
+    assert SAMPLES_ACQUIRED.value - before == 400
+    assert dict(REGISTRY.summary())["spectran_psd_queue_depth"] == "0"
@@ -0,0 +1,63 @@
+import time
+import numpy as np
+
+
+def test_scheduler_coalesces_frames(plots, qapp):
+    calls = []
+    plots.update_plots = lambda index=None, force_draw=False: calls.append(index)
+    scheduler = plots.scheduler
+    scheduler.set_max_fps(20)
+
+    for i in range(5):
+        scheduler.request(index=i)
+    # the first request is drawn immediately, the rest is coalesced
+    assert calls == [0]
+    
+    time.sleep(0.1)
+    qapp.processEvents()
+    assert calls == [0, 4]
+    assert (scheduler.rendered, scheduler.skipped) == (2, 3)
+
+def test_scheduler_keeps_final_frame(plots, qapp):
+    calls = []
+    plots.update_plots = lambda index=None, force_draw=False: calls.append(index)
+    scheduler = plots.scheduler
+    
+    scheduler.request(index=0)
+    scheduler.request(index=None)
+    # a late intermediate frame does not replace the final one
+    scheduler.request(index=1)
+    time.sleep(0.1)
+    qapp.processEvents()
+    assert calls == [0, None]
+
+def test_log_binner():
+    from spectran.plots import LogBinner
+    frequencies = np.arange(1, 1_000_001, dtype=float)
+    psd = np.ones_like(frequencies)
+    psd[500_000] = 100
+    binner = LogBinner(bins=1000)
+    
+    x, y = binner.reduce(frequencies, psd, mode="mean")
+    assert len(x) <= 1000
+    assert np.all(np.diff(x) > 0)
+    assert y.max() < 100
+    x, y = binner.reduce(frequencies, psd, mode="max")
+    assert y.max() == 100
+    
+    # the edges are only calculated once per grid
+    starts = binner._starts
+    binner.reduce(frequencies, 2 * psd)
+    assert binner._starts is starts
+
+def test_spectrum_full_resolution_when_zoomed(plots, qapp):
+    frequencies = np.linspace(0, 1e6, 10**6 + 1)[1:]
+    psd = np.random.random(10**6)
+    plots.update_spectrum_plot(frequencies, psd)
+    qapp.processEvents()
+    assert len(plots.spectrum_curve.xData) <= plots.log_binner.bins
+    
+    plots.plot2.setXRange(5, 5.0001, padding=0)
+    qapp.processEvents()
+    x = plots.spectrum_curve.xData
+    assert np.allclose(np.diff(x), frequencies[1] - frequencies[0])
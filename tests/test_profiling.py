@@ -0,0 +1,34 @@
+import json
+import pstats
+
+from spectran import profiling
+
+
+@profiling.span("work")
+def work(n):
+    return sum(range(n))
+
+def test_disabled():
+    assert not profiling.is_enabled()
+    assert work(10) == 45
+    assert profiling.disable() == []
+
+def test_trace(tmp_path):
+    profiling.enable("trace", tmp_path)
+    work(10)
+    work(10)
+    files = profiling.disable()
+
+    assert files == [tmp_path / "spectran_trace.json"]
+    events = json.loads(files[0].read_text())["traceEvents"]
+    assert [e["name"] for e in events if e["ph"] == "X"] == ["work", "work"]
+    assert any(e["ph"] == "M" for e in events)
+
+def test_cprofile(tmp_path):
+    profiling.enable("cprofile", tmp_path)
+    work(1000)
+    files = profiling.disable()
+
+    assert len(files) == 1
+    stats = pstats.Stats(str(files[0]))
+    assert any(function == "work" for _, _, function in stats.stats)
@@ -0,0 +1,38 @@
+import threading
+from spectran import ureg
+from spectran.daq import DummyDAQ
+from spectran.data_handler import SAVING_MODES, open_measurement
+from spectran.engine import MeasurementEngine
+from spectran.sweep import Sweep
+
+
+def test_sweep(tmp_path, make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = MeasurementEngine()
+    steps = [{"sample_rate": rate * ureg.Hz} for rate in (10_000, 20_000, 40_000)]
+    sweep = Sweep(engine, driver, make_config(averages=2), steps, directory=tmp_path,
+                  file_name="rate_{sample_rate.magnitude:.0f}.npy", mode=SAVING_MODES.NP_BINARY)
+    results = sweep.run()
+
+    assert sweep.status == "finished"
+    assert [result["status"] for result in results] == ["finished"] * 3
+    for result, rate in zip(results, (10_000, 20_000, 40_000)):
+        voltage_data, config, _ = open_measurement(result["file_path"])
+        assert result["file_path"].endswith(f"rate_{rate}.npy")
+        # each file holds the data of its own step
+        assert voltage_data.shape == (2, rate // 100)
+    assert sweep.summary()["done"] == 3
+
+def test_cancel_sweep(make_config):
+    driver = DummyDAQ()
+    driver.connect_device("Dev1")
+    engine = MeasurementEngine()
+    steps = [{"averages": 1}, {"duration": 10 * ureg.second}, {"averages": 2}]
+    sweep = Sweep(engine, driver, make_config(averages=1), steps)
+    engine.subscribe("started", lambda config: threading.Timer(0.2, sweep.cancel).start()
+                     if config["duration"] == 10 * ureg.second else None)
+    results = sweep.run()
+
+    assert sweep.status == "cancelled"
+    assert [result["status"] for result in results] == ["finished", "aborted", "cancelled"]